@@ -0,0 +1,62 @@
+"""
+check the recipe tables of a database migrated past core.0015
+
+run with `python manage.py shell < ...` after populate_recipes.py and
+`migrate`: the row counts are unchanged, the tables are partitioned when
+RECIPE_PARTITIONING is set, keep their constraints, and new rows get ids
+past the copied ones.
+"""
+
+import json
+import os
+
+from django.conf import settings
+from django.db import connection
+
+from core import partitioning
+from core.models import Recipe, Tag
+
+with open(os.environ["MIGRATION_COUNTS"]) as f:
+    expected = json.load(f)
+
+with connection.cursor() as cursor:
+    for table, count in expected.items():
+        cursor.execute(f'SELECT count(*) FROM "{table}"')
+        assert cursor.fetchone()[0] == count, f"{table} lost rows"
+
+        partitioned = partitioning.is_partitioned(cursor, table)
+        assert partitioned == settings.RECIPE_PARTITIONING, f"{table} partitioning"
+        if partitioned:
+            cursor.execute(
+                "SELECT count(*) FROM pg_inherits WHERE inhparent = %s::regclass",
+                [table],
+            )
+            assert cursor.fetchone()[0] == settings.RECIPE_PARTITIONS, table
+
+        cursor.execute(
+            "SELECT contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        kinds = [kind for kind, _ in constraints]
+        assert kinds.count("p") == 1, f"{table} has no primary key"
+        references = " ".join(d for kind, d in constraints if kind == "f")
+        assert "REFERENCES core_user(id)" in references, f"{table} user fk"
+        if table in partitioning.LINK_TABLES:
+            assert "u" in kinds, f"{table} lost its unique constraint"
+            target = "core_tag" if table == "core_recipe_tags" else "core_ingredient"
+            assert f"REFERENCES {target}(id)" in references, f"{table} {target} fk"
+            if not partitioned:
+                assert "REFERENCES core_recipe(id)" in references, f"{table} fk"
+
+last_id = Recipe.objects.order_by("-id").values_list("id", flat=True).first()
+recipe = Recipe.objects.create(
+    user_id=Recipe.objects.values_list("user_id", flat=True).first(),
+    title="after the migration",
+    price="1.00",
+    time_minutes=1,
+)
+assert recipe.id > last_id, "the id sequence restarted"
+recipe.tags.add(Tag.objects.filter(user_id=recipe.user_id).first())
+print("recipe tables ok:", expected)
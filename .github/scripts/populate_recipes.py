@@ -0,0 +1,68 @@
+"""
+fill a database migrated to core.0014 with users, recipes and their links
+
+run with `python manage.py shell < ...`, writes the row counts to
+$MIGRATION_COUNTS for check_migrated_recipes.py
+"""
+
+import json
+import os
+
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+USERS = 40
+RECIPES_PER_USER = 25
+TAGS_PER_USER = 5
+INGREDIENTS_PER_USER = 8
+
+apps = MigrationLoader(connection).project_state(("core", "0014_recipe_links")).apps
+User = apps.get_model("core", "User")
+Recipe = apps.get_model("core", "Recipe")
+Tag = apps.get_model("core", "Tag")
+Ingredient = apps.get_model("core", "Ingredient")
+RecipeTag = Recipe.tags.through
+RecipeIngredient = Recipe.ingredients.through
+
+users = User.objects.bulk_create(
+    User(email=f"user{i}@example.com", name=f"user {i}", password="!")
+    for i in range(USERS)
+)
+for user in users:
+    tags = Tag.objects.bulk_create(
+        Tag(user=user, name=f"tag {i}") for i in range(TAGS_PER_USER)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f"ingredient {user.pk}-{i}")
+        for i in range(INGREDIENTS_PER_USER)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(user=user, title=f"recipe {i}", price="2.50", time_minutes=i)
+        for i in range(RECIPES_PER_USER)
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(user=user, recipe=recipe, tag=tags[(i + j) % TAGS_PER_USER])
+        for i, recipe in enumerate(recipes)
+        for j in range(2)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            user=user,
+            recipe=recipe,
+            ingredient=ingredients[(i + j) % INGREDIENTS_PER_USER],
+        )
+        for i, recipe in enumerate(recipes)
+        for j in range(3)
+    )
+
+counts = {
+    table: model.objects.count()
+    for table, model in (
+        ("core_recipe", Recipe),
+        ("core_recipe_tags", RecipeTag),
+        ("core_recipe_ingredients", RecipeIngredient),
+    )
+}
+with open(os.environ["MIGRATION_COUNTS"], "w") as f:
+    json.dump(counts, f)
+print(counts)
@@ -1,21 +1,151 @@
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django import forms
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 
-from core import models
+from core import jobs, models, rollups
+
+# tables smaller than this are counted exactly
+ESTIMATE_COUNT_THRESHOLD = 10000
+
+
+# the rows of a partitioned table (relkind 'p') are in its leaf partitions,
+# reltuples is -1 for a table that was never analyzed
+ESTIMATE_SQL = """
+WITH RECURSIVE parts AS (
+    SELECT oid, relkind, reltuples FROM pg_class WHERE oid = %s::regclass
+    UNION ALL
+    SELECT c.oid, c.relkind, c.reltuples
+    FROM pg_inherits i
+    JOIN parts p ON i.inhparent = p.oid
+    JOIN pg_class c ON c.oid = i.inhrelid
+)
+SELECT sum(reltuples), bool_or(reltuples < 0) FROM parts WHERE relkind <> 'p'
+"""
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    paginator using the planner's row estimate from pg_class for
+    unfiltered changelists of big tables instead of a full COUNT(*)
+    """
+
+    def estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql" or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(ESTIMATE_SQL, [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] is None or row[1]:
+            # no partitions or not analyzed yet, unknown
+            return None
+        return int(row[0])
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is not None and estimate >= ESTIMATE_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """changelist settings for tables with millions of rows"""
+
+    paginator = EstimatedCountPaginator
+    # skip the second, unfiltered COUNT(*) next to the search results
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """inline formset editing one page of the related objects"""
+
+    per_page = 20
+    page_number = 1
+    page_param = "page"
+
+    def get_queryset(self):
+        if not hasattr(self, "_page"):
+            queryset = super().get_queryset()
+            self._page = Paginator(queryset, self.per_page).get_page(self.page_number)
+            self._queryset = self._page.object_list
+        return self._queryset
+
+    @property
+    def page(self):
+        self.get_queryset()
+        return self._page
+
 
-# admin.TabularInline
 class RecipeInline(admin.StackedInline):
-    '''Tabular Inline View for Recipe'''
+    '''Stacked Inline View for Recipe, one page at a time'''
 
     model = models.Recipe
+    formset = PaginatedInlineFormSet
+    template = "admin/core/edit_inline/paginated_stacked.html"
+    page_param = "recipes_page"
     min_num = 1
     max_num = 20
     extra = 0
     raw_id_fields = ("user",)
     fields = ("title", "price", "time_minutes")
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        return type(
+            formset.__name__,
+            (formset,),
+            {
+                "page_number": request.GET.get(self.page_param, 1),
+                "page_param": self.page_param,
+            },
+        )
+
+
+class RecipeTagInline(admin.TabularInline):
+    """tags of a recipe, the link gets the recipe's user on save"""
+
+    model = models.RecipeTag
+    fields = ("tag",)
+    autocomplete_fields = ("tag",)
+    extra = 0
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = models.RecipeIngredient
+    fields = ("ingredient",)
+    autocomplete_fields = ("ingredient",)
+    extra = 0
+
+
+class JobActionForm(ActionForm):
+    """action form with the target user of `reassign_content`"""
+
+    target_user = forms.IntegerField(
+        required=False, label=_("Target user id"), min_value=1
+    )
+
+
+def enqueue_action(modeladmin, request, name, queryset, **payload):
+    """enqueue a job for the selected objects instead of running it inline"""
+    ids = list(queryset.values_list("pk", flat=True))
+    job = jobs.enqueue(name, {"ids": ids, **payload}, user=request.user)
+    modeladmin.message_user(
+        request,
+        _("Queued job #%(id)s for %(count)s objects, see Jobs for its progress")
+        % {"id": job.pk, "count": len(ids)},
+        messages.SUCCESS,
+    )
+
 
 class UserAdmin(BaseUserAdmin):
     ordering = ["id", "name"]
@@ -40,10 +170,127 @@ class UserAdmin(BaseUserAdmin):
             {"classes": ("wide",), "fields": ("is_active", "is_staff", "is_superuser")},
         ),
     )
-    
+
     inlines = [RecipeInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ("email__startswith", "name__startswith")
+    action_form = JobActionForm
+    actions = ["delete_in_background", "reassign_content"]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # the cascade of a synchronous delete can be millions of rows
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(
+        permissions=["delete"], description=_("Delete selected users (background)")
+    )
+    def delete_in_background(self, request, queryset):
+        enqueue_action(self, request, "delete_users", queryset)
+
+    @admin.action(
+        permissions=["change"],
+        description=_("Move recipes, tags and ingredients to the target user"),
+    )
+    def reassign_content(self, request, queryset):
+        target_id = request.POST.get("target_user")
+        if not target_id or not models.User.objects.filter(pk=target_id).exists():
+            self.message_user(
+                request, _("Enter the id of an existing target user."), messages.ERROR
+            )
+            return
+        enqueue_action(self, request, "reassign_content", queryset, to=int(target_id))
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ["title", "user", "price", "time_minutes"]
+    list_select_related = ["user"]
+    ordering = ["-id"]
+    raw_id_fields = ["user"]
+    # tags and ingredients have explicit link models, edited inline
+    inlines = [RecipeTagInline, RecipeIngredientInline]
+    # prefix and exact lookups use the indexes, `icontains` would scan
+    search_fields = ["title__startswith", "user__email__exact"]
+    search_help_text = _("Title prefix (case sensitive) or exact owner email")
+    readonly_fields = rollups.RECIPE_FIELDS
+    actions = ["delete_in_background"]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # the inlines save link rows one by one, without m2m_changed
+        rollups.refresh_recipe(form.instance)
+
+    @admin.action(
+        permissions=["delete"], description=_("Delete selected recipes (background)")
+    )
+    def delete_in_background(self, request, queryset):
+        enqueue_action(self, request, "delete_recipes", queryset)
+
+
+class TagAdmin(LargeTableAdmin):
+    list_display = ["name", "user"]
+    list_select_related = ["user"]
+    ordering = ["-id"]
+    raw_id_fields = ["user"]
+    search_fields = ["name__startswith"]
+
+
+class IngredientAdmin(LargeTableAdmin):
+    list_display = ["name"]
+    ordering = ["-id"]
+    readonly_fields = ["normalized_name"]
+    search_fields = ["name__startswith"]
+
+
+class IngredientAliasAdmin(LargeTableAdmin):
+    list_display = ["name", "ingredient", "user"]
+    list_select_related = ["ingredient", "user"]
+    ordering = ["-id"]
+    raw_id_fields = ["user", "ingredient"]
+    readonly_fields = ["normalized_name"]
+    search_fields = ["normalized_name__startswith"]
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        "__str__",
+        "queue",
+        "status",
+        "attempts",
+        "progress_display",
+        "created_by",
+        "created",
+        "started",
+        "finished",
+    ]
+    list_filter = ["status", "queue", "name"]
+    list_select_related = ["created_by"]
+    ordering = ["-id"]
+    readonly_fields = [f.name for f in models.Job._meta.fields]
+
+    @admin.display(description=_("progress"))
+    def progress_display(self, obj):
+        if not obj.total:
+            return obj.progress
+        return f"{obj.progress} / {obj.total} ({obj.progress * 100 // obj.total}%)"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
\ No newline at end of file
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.IngredientAlias, IngredientAliasAdmin)
+admin.site.register(models.Job, JobAdmin)
@@ -0,0 +1,69 @@
+"""
+token authentication with expiring tokens and a per-process cache
+
+a token is cached as (user id, expiry) and its user separately, so the
+expiry is checked on every request without a query and saving a user only
+has to drop one cache key (see `core.signals`)
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import metrics
+from core.models import AuthToken
+
+
+def token_cache_key(key):
+    return f"auth-token:{key}"
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """`Authorization: Token <key>` with core.models.AuthToken"""
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+        now = timezone.now()
+
+        entry = cache.get(token_cache_key(key))
+        metrics.record_cache("auth_token", entry is not None)
+        if entry is None:
+            tokens = AuthToken.objects.select_related("user")
+            token = tokens.filter(key=key).first()
+            if token is None and router.db_for_read(AuthToken) != DEFAULT_DB_ALIAS:
+                # issued moments ago, the replica may not have it yet
+                token = tokens.using(DEFAULT_DB_ALIAS).filter(key=key).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            user, expires = token.user, token.expires
+            if expires > now:
+                # never keep a token cached past its expiry
+                ttl = min(timeout, (expires - now).total_seconds())
+                cache.set(token_cache_key(key), (user.pk, expires), ttl)
+                cache.set(user_cache_key(user.pk), user, timeout)
+        else:
+            user_id, expires = entry
+            user = cache.get(user_cache_key(user_id))
+            if user is None:
+                user = get_user_model().objects.filter(pk=user_id).first()
+                if user is None:
+                    raise exceptions.AuthenticationFailed(_("Invalid token."))
+                cache.set(user_cache_key(user_id), user, timeout)
+
+        if expires <= now:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return (user, key)
@@ -0,0 +1,464 @@
+"""
+helpers for the `seed_data` and `benchmark` management commands
+"""
+
+import io
+import json
+import math
+import re
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test import Client
+from PIL import Image
+
+from core.models import (
+    Ingredient,
+    IngredientAlias,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def seed(users, recipes, tags, ingredients, per_recipe, password, batch_size=1000):
+    """
+    bulk create users with recipes, tags and ingredients,
+    every recipe gets `per_recipe` tags and ingredients of its owner
+    """
+    User = get_user_model()
+    run = uuid.uuid4().hex[:8]
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        user_objs = User.objects.bulk_create(
+            [
+                User(
+                    email=f"bench-{run}-{i}@example.com",
+                    name=f"bench {i}",
+                    password=password_hash,
+                )
+                for i in range(users)
+            ],
+            batch_size=batch_size,
+        )
+        tag_objs = Tag.objects.bulk_create(
+            [Tag(user=u, name=f"tag {i}") for u in user_objs for i in range(tags)],
+            batch_size=batch_size,
+        )
+        # catalog ingredients and the alias of the user adding each
+        owners = [u for u in user_objs for _ in range(ingredients)]
+        ing_objs = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=f"ingredient {run} {u.pk} {i}")
+                for u in user_objs
+                for i in range(ingredients)
+            ],
+            batch_size=batch_size,
+        )
+        alias_objs = IngredientAlias.objects.bulk_create(
+            [
+                IngredientAlias(user=u, ingredient=ing, name=ing.name)
+                for u, ing in zip(owners, ing_objs)
+            ],
+            batch_size=batch_size,
+        )
+        recipe_objs = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    user=u,
+                    title=f"recipe {i}",
+                    price=Decimal(i % 5000) / 100,
+                    time_minutes=5 + i % 120,
+                )
+                for u in user_objs
+                for i in range(recipes)
+            ],
+            batch_size=batch_size,
+        )
+
+        tags_by_user = _group_by_user(tag_objs)
+        ings_by_user = _group_by_user(alias_objs)
+        tag_links, ing_links = [], []
+        for i, recipe in enumerate(recipe_objs):
+            user_tags = tags_by_user.get(recipe.user_id, [])
+            user_ings = ings_by_user.get(recipe.user_id, [])
+            for j in range(min(per_recipe, len(user_tags))):
+                tag = user_tags[(i + j) % len(user_tags)]
+                tag_links.append(
+                    RecipeTag(recipe=recipe, tag=tag, user_id=recipe.user_id)
+                )
+            for j in range(min(per_recipe, len(user_ings))):
+                alias = user_ings[(i + j) % len(user_ings)]
+                ing_links.append(
+                    RecipeIngredient(
+                        recipe=recipe,
+                        ingredient_id=alias.ingredient_id,
+                        user_id=recipe.user_id,
+                    )
+                )
+        RecipeTag.objects.bulk_create(tag_links, batch_size=batch_size)
+        RecipeIngredient.objects.bulk_create(ing_links, batch_size=batch_size)
+
+    return {
+        "users": len(user_objs),
+        "recipes": len(recipe_objs),
+        "tags": len(tag_objs),
+        "ingredients": len(ing_objs),
+        "links": len(tag_links) + len(ing_links),
+        "emails": [u.email for u in user_objs],
+    }
+
+
+def _group_by_user(objs):
+    grouped = {}
+    for obj in objs:
+        grouped.setdefault(obj.user_id, []).append(obj)
+    return grouped
+
+
+def percentile(values, pct):
+    """nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies, queries, allocations, elapsed):
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(ms),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "throughput_rps": round(len(ms) / elapsed, 2) if elapsed else None,
+        "queries_per_request": (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        "peak_alloc_kb": (round(max(allocations) / 1024, 1) if allocations else None),
+    }
+
+
+def sample_image():
+    """return a small jpeg as an in-memory file"""
+    image_file = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(image_file, format="JPEG")
+    image_file.name = "bench.jpg"
+    image_file.seek(0)
+    return image_file
+
+
+def allowed_host():
+    """
+    a host name ALLOWED_HOSTS accepts, the client's default `testserver`
+    is only allowed while the tests run
+    """
+    for host in filter(None, settings.ALLOWED_HOSTS):
+        host = host.lstrip(".")
+        if host and host != "*":
+            return host
+    # allowed for "*", and with DEBUG for an empty ALLOWED_HOSTS
+    return "localhost"
+
+
+class InProcessTransport:
+    """send requests straight to the WSGI handler with django's test client"""
+
+    name = "in-process"
+
+    def __init__(self, token):
+        self.client = Client(
+            HTTP_HOST=allowed_host(), HTTP_AUTHORIZATION=f"Token {token}"
+        )
+
+    def request(self, method, path, data=None, json_body=False):
+        kwargs = {}
+        if data is not None:
+            kwargs["data"] = json.dumps(data) if json_body else data
+            if json_body:
+                kwargs["content_type"] = "application/json"
+        response = getattr(self.client, method.lower())(path, **kwargs)
+        body = None
+        if response.get("Content-Type", "").startswith("application/json"):
+            body = json.loads(response.content or b"null")
+        return response.status_code, response.get("Server-Timing", ""), body
+
+
+class HttpTransport:
+    """send requests to a running server over HTTP"""
+
+    name = "http"
+
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+
+    def request(self, method, path, data=None, json_body=False):
+        headers = {"Authorization": f"Token {self.token}"}
+        body = None
+        if data is not None:
+            if json_body:
+                body = json.dumps(data).encode()
+                headers["Content-Type"] = "application/json"
+            else:
+                body, content_type = _multipart(data)
+                headers["Content-Type"] = content_type
+        req = urllib.request.Request(
+            self.base_url + path, data=body, method=method, headers=headers
+        )
+        try:
+            with urllib.request.urlopen(req) as response:
+                status, timing, content = (
+                    response.status,
+                    response.headers.get("Server-Timing", ""),
+                    response.read(),
+                )
+        except urllib.error.HTTPError as err:
+            status, timing, content = (
+                err.code,
+                err.headers.get("Server-Timing", ""),
+                b"",
+            )
+        try:
+            parsed = json.loads(content) if content else None
+        except ValueError:
+            parsed = None
+        return status, timing, parsed
+
+
+def _multipart(data):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in data.items():
+        lines.append(f"--{boundary}".encode())
+        if hasattr(value, "read"):
+            lines.append(
+                f'Content-Disposition: form-data; name="{name}"; '
+                f'filename="{value.name}"'.encode()
+            )
+            lines.append(b"Content-Type: application/octet-stream")
+            lines.append(b"")
+            lines.append(value.read())
+        else:
+            lines.append(f'Content-Disposition: form-data; name="{name}"'.encode())
+            lines.append(b"")
+            lines.append(str(value).encode())
+    lines.append(f"--{boundary}--".encode())
+    lines.append(b"")
+    return b"\r\n".join(lines), f"multipart/form-data; boundary={boundary}"
+
+
+class Scenario:
+    """one benchmarked request type"""
+
+    name = None
+
+    def setup(self, context):
+        """prepare data, run once before timing"""
+
+    def request(self, context, i):
+        """return (method, path, data, json_body) of the i-th request"""
+        raise NotImplementedError
+
+    def teardown(self, context):
+        """remove what the scenario created"""
+
+
+class ListScenario(Scenario):
+    name = "list"
+
+    def request(self, context, i):
+        return "GET", "/api/recipe/recipes/", None, False
+
+
+class FilteredListScenario(Scenario):
+    name = "list-filtered"
+
+    def setup(self, context):
+        tags = Tag.objects.filter(user=context["user"]).values_list("id", flat=True)[:3]
+        context["tag_ids"] = ",".join(str(tag_id) for tag_id in tags)
+
+    def request(self, context, i):
+        query = "price_max=40&time_max=60&ordering=price"
+        if context["tag_ids"]:
+            query += f"&tags={context['tag_ids']}"
+        return "GET", f"/api/recipe/recipes/?{query}", None, False
+
+
+class DetailScenario(Scenario):
+    name = "detail"
+
+    def setup(self, context):
+        context["recipe_ids"] = list(
+            Recipe.objects.filter(user=context["user"]).values_list("id", flat=True)[
+                :100
+            ]
+        )
+
+    def request(self, context, i):
+        recipe_ids = context["recipe_ids"]
+        if not recipe_ids:
+            return "GET", "/api/recipe/recipes/0/", None, False
+        return (
+            "GET",
+            f"/api/recipe/recipes/{recipe_ids[i % len(recipe_ids)]}/",
+            None,
+            False,
+        )
+
+
+class CreateScenario(Scenario):
+    """create recipes with 20 nested ingredients"""
+
+    name = "create"
+
+    def setup(self, context):
+        context["created"] = []
+
+    def request(self, context, i):
+        payload = {
+            "title": f"bench recipe {i}",
+            "price": "9.99",
+            "time_minutes": 30,
+            "tags": [{"name": "bench tag"}],
+            "ingredients": [{"name": f"bench ingredient {n}"} for n in range(20)],
+        }
+        return "POST", "/api/recipe/recipes/", payload, True
+
+    def response(self, context, status, body):
+        if status == 201 and body:
+            context["created"].append(body["id"])
+
+    def teardown(self, context):
+        Recipe.objects.filter(id__in=context["created"]).delete()
+
+
+class UploadImageScenario(Scenario):
+    name = "upload-image"
+
+    def setup(self, context):
+        context["upload_recipe"] = Recipe.objects.create(
+            user=context["user"], title="bench upload", price=1, time_minutes=1
+        )
+
+    def request(self, context, i):
+        recipe = context["upload_recipe"]
+        # remove the previous upload, the api keeps replaced files around
+        recipe.refresh_from_db()
+        recipe.image.delete(save=False)
+        path = f"/api/recipe/recipes/{recipe.id}/upload-image/"
+        return "POST", path, {"image": sample_image()}, False
+
+    def teardown(self, context):
+        recipe = context["upload_recipe"]
+        recipe.refresh_from_db()
+        recipe.image.delete(save=False)
+        recipe.delete()
+
+
+class LoginScenario(Scenario):
+    """obtain tokens, measures password verification throughput"""
+
+    name = "login"
+    password = "benchmark-login-123"
+
+    def setup(self, context):
+        context["login_user"] = get_user_model().objects.create_user(
+            email=f"bench-login-{uuid.uuid4().hex[:8]}@example.com",
+            password=self.password,
+        )
+
+    def request(self, context, i):
+        payload = {"email": context["login_user"].email, "password": self.password}
+        return "POST", "/api/user/token/", payload, True
+
+    def teardown(self, context):
+        context["login_user"].delete()
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        ListScenario,
+        FilteredListScenario,
+        DetailScenario,
+        CreateScenario,
+        UploadImageScenario,
+        LoginScenario,
+    )
+}
+
+
+def run_scenario(scenario, transport, context, requests, warmup=3, trace_alloc=False):
+    """time `requests` requests of the scenario and return their summary"""
+    scenario.setup(context)
+    try:
+        for i in range(warmup):
+            method, path, data, json_body = scenario.request(context, i)
+            status, _, body = transport.request(method, path, data, json_body)
+            if hasattr(scenario, "response"):
+                scenario.response(context, status, body)
+
+        latencies, queries, allocations, errors = [], [], [], 0
+        if trace_alloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for i in range(requests):
+            method, path, data, json_body = scenario.request(context, warmup + i)
+            if trace_alloc:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            status, timing, body = transport.request(method, path, data, json_body)
+            latencies.append(time.perf_counter() - start)
+            if trace_alloc:
+                allocations.append(tracemalloc.get_traced_memory()[1] - before)
+            if status >= 400:
+                errors += 1
+            match = SERVER_TIMING_QUERIES.search(timing)
+            if match:
+                queries.append(int(match.group(1)))
+            if hasattr(scenario, "response"):
+                scenario.response(context, status, body)
+        elapsed = time.perf_counter() - started
+        if trace_alloc:
+            tracemalloc.stop()
+    finally:
+        scenario.teardown(context)
+
+    result = summarize(latencies, queries, allocations, elapsed)
+    result["errors"] = errors
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    return [(scenario, metric, baseline, current, change %)] for
+    latency / query metrics that got worse by more than threshold percent
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if change > threshold:
+                regressions.append((name, metric, old, new, round(change, 1)))
+    return regressions
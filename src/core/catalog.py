@@ -0,0 +1,189 @@
+"""
+in-process catalog of ingredient names
+
+maps normalized ingredient names, and the aliases of users, to ingredient
+ids so resolving the ingredients of a new recipe usually needs no query.
+Only committed rows are learned, names read or written in a transaction
+are added when it commits. A renamed or deleted alias empties the aliases
+of its user in this process at once and, when it commits, sets a new
+version of that user in the INGREDIENT_CATALOG_CACHE cache; the other
+processes drop the user's aliases when they resolve names for a user
+whose version changed, the names of the other users stay. Catalog rows
+only change in the admin, that empties every process through a
+generation counter in the same cache. With several workers it has to be
+a shared cache (a deploy check, see `core.checks`). `warm()` loads up to
+INGREDIENT_CATALOG_SIZE names at startup (see `core.warmup`).
+"""
+
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import FilteredRelation, Q
+
+from core import metrics
+from core.models import Ingredient, IngredientAlias
+
+GENERATION_KEY = "ingredient-catalog:generation"
+
+
+def user_version_key(user_id):
+    return f"ingredient-catalog:user:{user_id}"
+
+
+class IngredientCatalog:
+    """normalized names {name: id} and user aliases {user id: {name: id}}"""
+
+    def __init__(self):
+        self._names = {}
+        self._aliases = {}
+        self._alias_count = 0
+        # {user id: version seen}, users missing here are at version None
+        self._user_versions = {}
+        self._generation = None
+
+    def max_size(self):
+        return getattr(settings, "INGREDIENT_CATALOG_SIZE", 100_000)
+
+    def _cache(self):
+        return caches[getattr(settings, "INGREDIENT_CATALOG_CACHE", "default")]
+
+    def clear(self):
+        self._names = {}
+        self._aliases = {}
+        self._alias_count = 0
+
+    def _forget_user(self, user_id):
+        self._alias_count -= len(self._aliases.pop(user_id, ()))
+
+    def _sync(self, user_id=None):
+        keys = [GENERATION_KEY]
+        if user_id is not None:
+            keys.append(user_version_key(user_id))
+        found = self._cache().get_many(keys)
+        generation = found.get(GENERATION_KEY, 0)
+        if generation != self._generation:
+            self.clear()
+            self._generation = generation
+        if user_id is not None:
+            version = found.get(user_version_key(user_id))
+            if version != self._user_versions.get(user_id):
+                self._forget_user(user_id)
+                self._user_versions[user_id] = version
+
+    def _store(self, names, aliases):
+        if len(self._names) + self._alias_count >= self.max_size():
+            self.clear()
+        self._names.update(names)
+        for (user_id, name), ingredient_id in aliases.items():
+            user_aliases = self._aliases.setdefault(user_id, {})
+            if name not in user_aliases:
+                self._alias_count += 1
+            user_aliases[name] = ingredient_id
+
+    def learn(self, names=None, aliases=None):
+        """
+        add entries, aliases keyed by (user id, name), once the current
+        transaction commits
+        """
+        transaction.on_commit(lambda: self._store(names or {}, aliases or {}))
+
+    def invalidate(self):
+        """forget every name here now, in the other processes on commit"""
+        self.clear()
+
+        def bump():
+            cache = self._cache()
+            cache.add(GENERATION_KEY, 0, None)
+            try:
+                self._generation = cache.incr(GENERATION_KEY)
+            except ValueError:
+                # evicted between add and incr
+                self._generation = None
+            self.clear()
+
+        transaction.on_commit(bump)
+
+    def invalidate_user(self, user_id):
+        """
+        forget the aliases of a user here now, in the other processes once
+        the current transaction commits
+        """
+        self._forget_user(user_id)
+
+        def bump():
+            # a new random version, a counter could repeat after an eviction
+            version = secrets.token_hex(8)
+            self._cache().set(user_version_key(user_id), version, None)
+            self._user_versions[user_id] = version
+            self._forget_user(user_id)
+
+        transaction.on_commit(bump)
+
+    def warm(self):
+        """load the names and aliases, return the number of entries"""
+        self._sync()
+        limit = self.max_size()
+        names = dict(Ingredient.objects.values_list("normalized_name", "id")[:limit])
+        aliases = {
+            (user_id, name): ingredient_id
+            for user_id, name, ingredient_id in IngredientAlias.objects.values_list(
+                "user_id", "normalized_name", "ingredient_id"
+            )[: max(limit - len(names), 0)]
+        }
+        self.clear()
+        self._store(names, aliases)
+        return len(names) + len(aliases)
+
+    def resolve(self, user_id, names, aliased=None):
+        """
+        {normalized name: ingredient id} of the known names, aliases of the
+        user first, with one query for the names not in memory. The names
+        found among the user's aliases are added to the set `aliased`
+        """
+        self._sync(user_id)
+        user_aliases = self._aliases.get(user_id, {})
+        if aliased is None:
+            aliased = set()
+        found, missing = {}, []
+        for name in names:
+            ingredient_id = user_aliases.get(name)
+            if ingredient_id is not None:
+                aliased.add(name)
+            else:
+                ingredient_id = self._names.get(name)
+            metrics.record_cache("ingredient_catalog", ingredient_id is not None)
+            if ingredient_id is None:
+                missing.append(name)
+            else:
+                found[name] = ingredient_id
+        if missing:
+            found.update(self._load(user_id, missing, aliased))
+        return found
+
+    def _load(self, user_id, names, aliased):
+        rows = (
+            Ingredient.objects.annotate(
+                user_alias=FilteredRelation(
+                    "aliases", condition=Q(aliases__user_id=user_id)
+                )
+            )
+            .filter(
+                Q(normalized_name__in=names) | Q(user_alias__normalized_name__in=names)
+            )
+            .values_list("id", "normalized_name", "user_alias__normalized_name")
+        )
+        names = set(names)
+        loaded, aliases = {}, {}
+        for ingredient_id, name, alias in rows:
+            if name in names:
+                loaded[name] = ingredient_id
+            if alias in names:
+                aliases[alias] = ingredient_id
+        self.learn(loaded, {(user_id, alias): pk for alias, pk in aliases.items()})
+        aliased.update(aliases)
+        return {**loaded, **aliases}
+
+
+catalog = IngredientCatalog()
@@ -0,0 +1,62 @@
+"""
+system checks of settings all web workers have to agree on
+
+state kept in a cache for every worker (the replica pins, the versions of
+the ingredient catalog) only works when the cache is shared.
+`check_shared_caches` is a deploy check, reported by `manage.py check
+--deploy` and by `fail_on_cache_errors()` when the wsgi application loads
+(gunicorn workers, runserver), not by the other management commands.
+"""
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import SystemCheckError
+
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def web_workers():
+    return getattr(settings, "WEB_CONCURRENCY", 1)
+
+
+def shared_cache_errors(setting, error_id):
+    """an error when the cache named by `setting` is local to several workers"""
+    alias = getattr(settings, setting, "default")
+    workers = web_workers()
+    if workers > 1 and isinstance(caches[alias], PROCESS_LOCAL_CACHES):
+        return [
+            checks.Error(
+                f"{setting} names the cache {alias!r}, which is local to each "
+                f"process, but {workers} workers run (WEB_CONCURRENCY).",
+                hint="Set CACHE_URL to a cache shared by the workers.",
+                id=error_id,
+            )
+        ]
+    return []
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_caches(app_configs=None, **kwargs):
+    errors = []
+    if getattr(settings, "DATABASE_REPLICAS", []):
+        errors += shared_cache_errors("REPLICA_PIN_CACHE", "core.E001")
+    # the other workers only forget renamed ingredients through it
+    errors += shared_cache_errors("INGREDIENT_CATALOG_CACHE", "core.E002")
+    return errors
+
+
+def fail_on_cache_errors():
+    """raise the errors of the deploy cache checks, for the web workers"""
+    errors = [
+        error
+        for error in checks.run_checks(
+            tags=[checks.Tags.caches], include_deployment_checks=True
+        )
+        if error.is_serious()
+    ]
+    if errors:
+        raise SystemCheckError("\n".join(str(error) for error in errors))
+
@@ -0,0 +1,170 @@
+"""
+gzip / brotli response compression
+
+brotli is used when the `brotli` package is installed and the client
+prefers it, gzip otherwise. Only responses of COMPRESSION_CONTENT_TYPES
+of at least COMPRESSION_MIN_SIZE bytes are compressed; streaming
+responses are compressed chunk by chunk and flushed after each chunk so
+clients still get them incrementally. Like django's GZipMiddleware, gzip
+output carries random padding in its header against BREACH.
+"""
+
+import secrets
+import zlib
+from gzip import GzipFile
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+DEFAULT_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/vnd.oai.openapi",
+    "image/svg+xml",
+)
+
+# random gzip header padding, see django.middleware.gzip
+MAX_RANDOM_BYTES = 100
+
+
+def accepted_encodings(header):
+    """{encoding: q} of an Accept-Encoding header"""
+    encodings = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header, available=None):
+    """the best of `available` accepted by the client, or None"""
+    if available is None:
+        available = ("br", "gzip") if brotli is not None else ("gzip",)
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, wildcard)
+        # ties keep the server preference, br first
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def brotli_quality():
+    return getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5)
+
+
+def compress_brotli(content):
+    return brotli.compress(content, quality=brotli_quality())
+
+
+def compress_brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=brotli_quality())
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_gzip_sequence(sequence):
+    """
+    like django's compress_sequence, but with a sync flush after every
+    chunk, the gzip stream would otherwise hold the output back
+    """
+    buf = BytesIO()
+    filename = b"a" * secrets.randbelow(MAX_RANDOM_BYTES)
+    with GzipFile(
+        filename=filename, mode="wb", compresslevel=6, fileobj=buf, mtime=0
+    ) as zfile:
+        for chunk in sequence:
+            zfile.write(chunk)
+            zfile.flush(zlib.Z_SYNC_FLUSH)
+            data = buf.getvalue()
+            if data:
+                yield data
+                buf.seek(0)
+                buf.truncate()
+    yield buf.getvalue()
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(";")[0].strip().lower()
+    types = getattr(settings, "COMPRESSION_CONTENT_TYPES", DEFAULT_CONTENT_TYPES)
+    return any(content_type.startswith(prefix) for prefix in types)
+
+
+class CompressionMiddleware:
+    """compress responses with brotli or gzip as negotiated"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if (
+            response.has_header("Content-Encoding")
+            or response.status_code in (204, 206, 304)
+            or request.method == "HEAD"
+            or not is_compressible(response.get("Content-Type", ""))
+        ):
+            return response
+        if not response.streaming:
+            if len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024):
+                return response
+        elif response.is_async:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == "br":
+                content = compress_brotli_sequence(response.streaming_content)
+            else:
+                content = compress_gzip_sequence(response.streaming_content)
+            response.streaming_content = content
+            # the compressed size is only known once streamed
+            response.headers.pop("Content-Length", None)
+        else:
+            if encoding == "br":
+                content = compress_brotli(response.content)
+            else:
+                content = compress_string(
+                    response.content, max_random_bytes=MAX_RANDOM_BYTES
+                )
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # a strong ETag names the uncompressed bytes
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
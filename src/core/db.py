@@ -0,0 +1,46 @@
+"""
+database helpers for large maintenance operations
+"""
+
+import time
+
+
+def delete_in_chunks(queryset, batch_size=1000, pause=0.0, progress=None):
+    """
+    delete the rows of queryset `batch_size` primary keys at a time, every
+    chunk is its own short statement (autocommit) so no lock is held over
+    the whole set, return the number of deleted rows.
+    `progress(rows)` is called after every chunk with its number of rows
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        count, _ = model._default_manager.filter(pk__in=pks).delete()
+        deleted += count
+        if progress is not None:
+            progress(len(pks))
+        if len(pks) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def update_in_chunks(queryset, values, batch_size=1000, progress=None):
+    """
+    update the rows of queryset with `values` in chunks of primary keys,
+    the queryset must stop matching updated rows, return the updated rows
+    """
+    model = queryset.model
+    updated = 0
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return updated
+        updated += model._default_manager.filter(pk__in=pks).update(**values)
+        if progress is not None:
+            progress(len(pks))
+        if len(pks) < batch_size:
+            return updated
@@ -0,0 +1,180 @@
+"""
+serving files from MEDIA_ROOT (or any directory) in production
+
+supports conditional requests (ETag / Last-Modified), single byte
+ranges for resumable downloads and video seeking, precompressed `.br` /
+`.gz` siblings written by `core.storage`, and can hand the transfer to
+the web server: with FILES_SENDFILE_HEADER = "X-Accel-Redirect" (nginx)
+or "X-Sendfile" (apache) django only checks the request and sets the
+headers, the proxy streams the file and handles ranges itself.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from core.compression import choose_encoding
+
+CHUNK_SIZE = 64 * 1024
+
+SIBLINGS = {"br": ".br", "gzip": ".gz"}
+
+range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive of a single range `Range` header, None to send
+    the whole file and ValueError when the range is not satisfiable
+    """
+    match = range_re.match(header.strip())
+    if not match:
+        # multiple ranges or other units, answered with the whole file
+        return None
+    first, last = match.groups()
+    if size == 0:
+        raise ValueError(header)
+    if not first:
+        if not last or int(last) == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        # weak comparison, compressed variants are sent with W/
+        tags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+        return etag in tags or if_none_match.strip() == "*"
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and int(mtime) <= since
+
+
+def range_allowed(request, etag, mtime):
+    """If-Range: only honour the range while the file is unchanged"""
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def serve_file(request, root, path, max_age=None, immutable=False, accel_prefix=None):
+    """
+    respond with the file `path` below `root`, 404 when it does not exist
+    or is outside of it
+    """
+    try:
+        fullpath = safe_join(root, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = file_etag(st)
+    content_type, _ = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    def finish(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(st.st_mtime)
+        response["Accept-Ranges"] = "bytes"
+        if max_age is not None:
+            patch_cache_control(
+                response, public=True, max_age=max_age, immutable=immutable or None
+            )
+        return response
+
+    if not_modified(request, etag, st.st_mtime):
+        return finish(HttpResponseNotModified())
+
+    sendfile = getattr(settings, "FILES_SENDFILE_HEADER", None)
+    if sendfile:
+        response = HttpResponse(content_type=content_type)
+        if sendfile == "X-Accel-Redirect":
+            response[sendfile] = (accel_prefix or "/") + path.lstrip("/")
+        else:
+            response[sendfile] = fullpath
+        return finish(response)
+
+    range_header = request.headers.get("Range")
+    if range_header and range_allowed(request, etag, st.st_mtime):
+        try:
+            byte_range = parse_range(range_header, st.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return finish(response)
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(fullpath, start, length),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Length"] = str(length)
+            response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+            return finish(response)
+
+    encoding = None
+    available = [enc for enc, ext in SIBLINGS.items() if os.path.isfile(fullpath + ext)]
+    if available:
+        encoding = choose_encoding(
+            request.headers.get("Accept-Encoding", ""), available
+        )
+    # the original name, not the one of the sibling, in Content-Disposition
+    filename = os.path.basename(fullpath)
+    if encoding:
+        sibling = fullpath + SIBLINGS[encoding]
+        response = FileResponse(
+            open(sibling, "rb"), content_type=content_type, filename=filename
+        )
+        response["Content-Encoding"] = encoding
+    else:
+        response = FileResponse(
+            open(fullpath, "rb"), content_type=content_type, filename=filename
+        )
+    if available:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    finish(response)
+    if encoding:
+        response["ETag"] = "W/" + etag
+    return response
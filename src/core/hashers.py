@@ -0,0 +1,159 @@
+"""
+password hashers tuned from the settings and a bounded pool running them
+
+hashing is cpu bound and intentionally slow, `HashingPool` runs it on at
+most PASSWORD_HASHING_WORKERS threads per process (hashlib and argon2
+release the GIL) so a burst of logins cannot take every core of a
+worker, requests waiting longer than PASSWORD_HASHING_TIMEOUT for a slot
+fail with `PasswordHashingBusy` (503).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """
+    scrypt with its cost read from PASSWORD_SCRYPT_*,
+    hashes made with other costs are upgraded on the next login
+    """
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "PASSWORD_SCRYPT_WORK_FACTOR", 2**14)
+
+    @property
+    def block_size(self):
+        return getattr(settings, "PASSWORD_SCRYPT_BLOCK_SIZE", 8)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_SCRYPT_PARALLELISM", 1)
+
+    @property
+    def maxmem(self):
+        # openssl refuses more than 32MB by default, leave room for the
+        # configured cost (scrypt needs ~128 * n * r bytes) and for
+        # verifying hashes made with a somewhat higher one
+        needed = 128 * self.work_factor * self.block_size * self.parallelism
+        return max(4 * needed, 64 * 1024 * 1024)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """argon2 with its cost read from PASSWORD_ARGON2_*, needs argon2-cffi"""
+
+    @property
+    def time_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_TIME_COST", 2)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_MEMORY_COST", 65536)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_ARGON2_PARALLELISM", 2)
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many logins, try again shortly.")
+    default_code = "password_hashing_busy"
+
+
+class HashingPool:
+    """
+    thread pool accepting at most `workers + queue` pending jobs,
+    `workers=0` runs the jobs on the calling thread
+    """
+
+    def __init__(self, workers, queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hashing"
+                )
+            return self._executor
+
+    def run(self, fn, *args):
+        """run fn(*args) on the pool and return its result"""
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHashingBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """return the process wide hashing pool, created from the settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                workers=getattr(settings, "PASSWORD_HASHING_WORKERS", 2),
+                queue=getattr(settings, "PASSWORD_HASHING_QUEUE", 16),
+                timeout=getattr(settings, "PASSWORD_HASHING_TIMEOUT", 5.0),
+            )
+        return _pool
+
+
+def reset_pool(**kwargs):
+    """drop the pool so it is rebuilt from the (changed) settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def make_password(raw_password):
+    """hash a password on the pool"""
+    return get_pool().run(hashers.make_password, raw_password)
+
+
+def _verify(raw_password, encoded):
+    outdated = []
+    valid = hashers.check_password(
+        raw_password, encoded, setter=lambda raw: outdated.append(True)
+    )
+    # rehash with the preferred hasher while still on the pool
+    new_encoded = hashers.make_password(raw_password) if valid and outdated else None
+    return valid, new_encoded
+
+
+def verify_password(raw_password, encoded):
+    """
+    check a password on the pool, return (valid, new hash) where the new
+    hash is set when the stored one uses an outdated hasher or cost
+    """
+    return get_pool().run(_verify, raw_password, encoded)
@@ -0,0 +1,111 @@
+"""
+database readiness probing shared by `wait_for_db` and `/readyz`
+
+`/readyz` answers from the last result for HEALTH_CHECK_INTERVAL seconds,
+so frequent probes of the orchestrator cost at most one `SELECT 1` per
+interval and process. Applied migrations are only checked until they
+were found complete once.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import OperationalError
+
+try:
+    from psycopg2 import OperationalError as Psycopg2OpError
+except ImportError:  # pragma: no cover
+    Psycopg2OpError = OperationalError
+
+CONNECTION_ERRORS = (OperationalError, Psycopg2OpError)
+
+logger = logging.getLogger("core.health")
+
+
+def probe_database(alias=DEFAULT_DB_ALIAS):
+    """open a real connection and run a query, raises when unavailable"""
+    connection = connections[alias]
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def reset_connection(alias=DEFAULT_DB_ALIAS):
+    """drop a broken connection so the next probe opens a new one"""
+    try:
+        connections[alias].close()
+    except CONNECTION_ERRORS:
+        pass
+
+
+def pending_migrations(alias=DEFAULT_DB_ALIAS):
+    """return the names of the migrations not applied yet"""
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f"{migration.app_label}.{migration.name}" for migration, _ in plan]
+
+
+def backoff_delays(base=0.1, max_delay=5.0):
+    """exponential backoff with full jitter: 0..min(max, base * 2^n)"""
+    attempt = 0
+    while True:
+        yield random.uniform(0, min(max_delay, base * 2**attempt))
+        attempt += 1
+
+
+class Readiness:
+    """cached readiness of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = None
+        self._state = {"ready": False, "database": "unknown", "migrations": "unknown"}
+        self._migrated = False
+
+    def interval(self):
+        return getattr(settings, "HEALTH_CHECK_INTERVAL", 10)
+
+    def check(self):
+        """probe the database now and return the state"""
+        state = {"database": "ok", "migrations": "ok"}
+        try:
+            probe_database()
+            if not self._migrated:
+                pending = pending_migrations()
+                self._migrated = not pending
+                if pending:
+                    state["migrations"] = f"{len(pending)} pending"
+        except CONNECTION_ERRORS:
+            # the error names hosts and users, it goes to the log only
+            logger.warning("database probe failed", exc_info=True)
+            state["database"] = "unavailable"
+            state["migrations"] = "unknown"
+            reset_connection()
+        state["ready"] = state["database"] == "ok" and state["migrations"] == "ok"
+        self._state = state
+        self._checked = time.monotonic()
+        return state
+
+    def get(self):
+        """
+        return the cached state, refreshed once it is older than the
+        interval, by one thread while the others keep the last answer
+        """
+        checked = self._checked
+        if checked is not None and time.monotonic() - checked < self.interval():
+            return self._state
+        if not self._lock.acquire(blocking=checked is None):
+            return self._state
+        try:
+            return self.check()
+        finally:
+            self._lock.release()
+
+
+readiness = Readiness()
@@ -0,0 +1,123 @@
+"""
+replay of retried POST requests sent with an `Idempotency-Key` header
+
+the first request with a key inserts its row, (user, key) is unique so of
+concurrent retries only one gets to run, and its response is stored in
+the same transaction as its writes. A retry gets the stored response back
+without running the view again, a retry arriving while the first request
+still runs gets 409 and reusing a key for a different request gets 422.
+Failed requests (exceptions and 5xx responses) release their key so they
+can be retried. Keys are kept IDEMPOTENCY_KEY_TTL seconds, expired ones
+are reused and deleted by `manage.py purge_idempotency_keys`; a key left
+running for IDEMPOTENCY_LOCK_SECONDS by a dead worker is taken over.
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def ttl():
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 3600)
+
+
+def lock_seconds():
+    return getattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 60)
+
+
+def request_hash(request):
+    """sha256 of the method, path with query and body"""
+    digest = hashlib.sha256(f"{request.method} {request.get_full_path()}\n".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _take_over(record, digest, now):
+    """reuse an expired key or one whose request died while running"""
+    stale = Q(expires__lte=now) | Q(
+        status_code__isnull=True, created__lte=now - timedelta(seconds=lock_seconds())
+    )
+    return bool(
+        IdempotencyKey.objects.filter(stale, pk=record.pk).update(
+            request_hash=digest,
+            status_code=None,
+            response=None,
+            created=now,
+            expires=now + timedelta(seconds=ttl()),
+        )
+    )
+
+
+def replay(record):
+    return Response(
+        record.response,
+        status=record.status_code,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def run(request, handler):
+    """
+    return `handler()`, or the response stored for the key of the request
+    when it is a retry
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{HEADER} must have 1 to {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    digest = request_hash(request)
+    now = timezone.now()
+    record, created = IdempotencyKey.objects.get_or_create(
+        user=request.user,
+        key=key,
+        defaults={
+            "request_hash": digest,
+            "created": now,
+            "expires": now + timedelta(seconds=ttl()),
+        },
+    )
+    if not created and not _take_over(record, digest, now):
+        if record.request_hash != digest:
+            return Response(
+                {"detail": f"{HEADER} was already used for another request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record.status_code is not None:
+            return replay(record)
+        return Response(
+            {"detail": f"A request with this {HEADER} is in progress."},
+            status=status.HTTP_409_CONFLICT,
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            if response.status_code < 500:
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code, response=response.data
+                )
+    except Exception:
+        record.delete()
+        raise
+    if response.status_code >= 500:
+        record.delete()
+    return response
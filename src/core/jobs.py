@@ -0,0 +1,414 @@
+"""
+database backed background jobs
+
+handlers are registered by name with `@register(name)` and receive the
+`Job`, `enqueue(name, payload)` stores a job that `manage.py runworker`
+picks up. Handlers of big operations work in chunks of JOBS_BATCH_SIZE
+rows and report their progress on the job.
+
+Workers claim jobs with `SELECT ... FOR UPDATE SKIP LOCKED` so any number
+of them can poll the same table, a claimed job is leased for
+JOBS_LEASE_SECONDS (extended on progress) and put back in the queue when
+its worker died. Failed jobs are retried with exponential backoff until
+they used up their attempts.
+"""
+
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import FIRST_COMPLETED
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import rollups
+from core.db import delete_in_chunks, update_in_chunks
+from core.models import (
+    AuthToken,
+    IdempotencyKey,
+    IngredientAlias,
+    Job,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+logger = logging.getLogger("core.jobs")
+
+# seconds between checks for jobs of dead workers
+REQUEUE_INTERVAL = 30
+
+handlers = {}
+
+
+def register(name, queue="default", max_attempts=None):
+    """decorator registering a job handler under `name`"""
+
+    def decorator(func):
+        func.queue = queue
+        func.max_attempts = max_attempts
+        handlers[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, queue=None, run_at=None):
+    """store a new job and return it"""
+    handler = handlers.get(name)
+    if handler is None:
+        raise ValueError(f"Unknown job {name}")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        created_by=user,
+        queue=queue or handler.queue,
+        max_attempts=handler.max_attempts or setting("MAX_ATTEMPTS"),
+        run_at=run_at or timezone.now(),
+    )
+
+
+JOB_DEFAULTS = {
+    "BATCH_SIZE": 1000,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF": 10,
+    "LEASE_SECONDS": 600,
+    "QUEUES": {"default": 4},
+}
+
+
+def setting(name):
+    return getattr(settings, f"JOBS_{name}", JOB_DEFAULTS[name])
+
+
+def batch_size():
+    return setting("BATCH_SIZE")
+
+
+def lease_expires():
+    return timezone.now() + timedelta(seconds=setting("LEASE_SECONDS"))
+
+
+def set_total(job, total):
+    job.total = total
+    Job.objects.filter(pk=job.pk).update(total=total)
+
+
+def advance(job, rows):
+    """add rows to the progress of job and extend its lease"""
+    job.progress += rows
+    Job.objects.filter(pk=job.pk).update(
+        progress=F("progress") + rows, lease_expires=lease_expires()
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next(queues=None):
+    """mark the next due job running and return it, None when idle"""
+    now = timezone.now()
+    jobs = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now)
+    if queues is not None:
+        jobs = jobs.filter(queue__in=queues)
+    with transaction.atomic():
+        job = jobs.select_for_update(skip_locked=True).order_by("run_at", "id").first()
+        if job is None:
+            return None
+        job.status = Job.Status.RUNNING
+        job.started = now
+        job.attempts += 1
+        job.lease_expires = lease_expires()
+        job.worker = worker_name()
+        # a retry runs the handler from the start again
+        job.progress = 0
+        job.save(
+            update_fields=[
+                "status",
+                "started",
+                "attempts",
+                "lease_expires",
+                "worker",
+                "progress",
+            ]
+        )
+    return job
+
+
+def requeue_expired():
+    """
+    put running jobs whose worker stopped renewing the lease back in the
+    queue, or fail them when that was their last attempt, return the
+    number of jobs requeued
+    """
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.Status.RUNNING, lease_expires__lt=now)
+    # a job that keeps killing its worker must not be retried forever
+    expired.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED,
+        error="The worker stopped during the last attempt.",
+        finished=now,
+        lease_expires=None,
+    )
+    return expired.update(status=Job.Status.QUEUED, run_at=now)
+
+
+def retry_delay(attempts):
+    """exponential backoff with up to 10% jitter"""
+    delay = setting("RETRY_BACKOFF") * 2 ** (attempts - 1)
+    return delay + random.uniform(0, delay / 10)
+
+
+def run(job):
+    """
+    run the handler of a claimed job and store the outcome, unless the
+    lease expired meanwhile and the job was requeued or claimed again
+    """
+    fields = ["status", "error", "finished", "lease_expires"]
+    try:
+        handlers[job.name](job)
+    except Exception:
+        logger.exception("job %s failed (attempt %s)", job, job.attempts)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            fields.append("run_at")
+        else:
+            job.status = Job.Status.FAILED
+    else:
+        job.status = Job.Status.DONE
+    job.finished = timezone.now() if job.status != Job.Status.QUEUED else None
+    job.lease_expires = None
+    stored = Job.objects.filter(
+        pk=job.pk,
+        worker=job.worker,
+        attempts=job.attempts,
+        status=Job.Status.RUNNING,
+    ).update(**{field: getattr(job, field) for field in fields})
+    if not stored:
+        logger.warning(
+            "dropped the outcome of job %s (attempt %s), its lease expired",
+            job,
+            job.attempts,
+        )
+    return job
+
+
+def execute(job_id):
+    """run a claimed job by id, used by the worker pools"""
+    close_old_connections()
+    try:
+        return run(Job.objects.get(pk=job_id)).status
+    finally:
+        connections.close_all()
+
+
+def _init_process():
+    # spawned processes start without the django setup of the worker
+    django.setup()
+
+
+class Worker:
+    """
+    claims jobs of `queues` ({queue: concurrency limit}) and runs at most
+    `concurrency` of them at once on a thread or process pool,
+    `pool="inline"` runs them one by one on the calling thread
+    """
+
+    def __init__(self, queues=None, concurrency=4, pool="thread"):
+        self.queues = queues or setting("QUEUES")
+        self.concurrency = concurrency
+        self.pool = pool
+        self.running = {}
+        self.processed = 0
+
+    def _executor(self):
+        if self.pool == "inline":
+            return None
+        if self.pool == "process":
+            # children must not share the parent's db sockets
+            connections.close_all()
+            return ProcessPoolExecutor(self.concurrency, initializer=_init_process)
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix="job")
+
+    def _free_queues(self):
+        busy = {}
+        for queue in self.running.values():
+            busy[queue] = busy.get(queue, 0) + 1
+        return [q for q, limit in self.queues.items() if busy.get(q, 0) < limit]
+
+    def _reap(self, timeout):
+        if not self.running:
+            return
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            self.running.pop(future)
+            self.processed += 1
+            try:
+                future.result()
+            except Exception:
+                # execute() stores handler errors, this is a pool failure
+                logger.exception("worker pool failed to run a job")
+
+    def run(self, burst=False, sleep=1.0, max_jobs=None):
+        """process jobs until stopped, with `burst` until the queue is empty"""
+        executor = self._executor()
+        last_requeue = 0.0
+        try:
+            while max_jobs is None or self.processed < max_jobs:
+                if time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+                    requeue_expired()
+                    last_requeue = time.monotonic()
+                claimed = None
+                if len(self.running) < self.concurrency:
+                    queues = self._free_queues()
+                    claimed = claim_next(queues) if queues else None
+                if claimed is not None:
+                    if executor is None:
+                        run(claimed)
+                        self.processed += 1
+                    else:
+                        future = executor.submit(execute, claimed.pk)
+                        self.running[future] = claimed.queue
+                    continue
+                if not self.running and burst:
+                    break
+                if self.running:
+                    self._reap(timeout=sleep)
+                else:
+                    time.sleep(sleep)
+        finally:
+            if executor is not None:
+                while self.running:
+                    self._reap(timeout=None)
+                executor.shutdown()
+        return self.processed
+
+
+def _user_content(user_ids):
+    # the recipe links carry the recipe's user and move along with it,
+    # the catalog ingredients belong to nobody and stay
+    return (
+        RecipeTag.objects.filter(user_id__in=user_ids),
+        RecipeIngredient.objects.filter(user_id__in=user_ids),
+        Recipe.objects.filter(user_id__in=user_ids),
+        Tag.objects.filter(user_id__in=user_ids),
+    )
+
+
+def _move_aliases(aliases, target, progress):
+    """
+    give target copies of the ingredient aliases, unless it has an alias of
+    the ingredient or name already, and delete them
+    """
+    while True:
+        chunk = list(aliases.order_by("pk")[: batch_size()])
+        if not chunk:
+            return
+        IngredientAlias.objects.bulk_create(
+            [
+                IngredientAlias(
+                    user=target,
+                    ingredient_id=alias.ingredient_id,
+                    name=alias.name,
+                    **{
+                        field: getattr(alias, field)
+                        for field in IngredientAlias.ROLLUP_FIELDS
+                    },
+                )
+                for alias in chunk
+            ],
+            ignore_conflicts=True,
+        )
+        IngredientAlias.objects.filter(pk__in=[alias.pk for alias in chunk]).delete()
+        progress(len(chunk))
+
+
+@register("delete_recipes")
+def delete_recipes(job):
+    """payload: {"ids": [recipe ids]}"""
+    recipes = Recipe.objects.filter(pk__in=job.payload["ids"])
+    set_total(job, recipes.count())
+    delete_in_chunks(recipes, batch_size(), progress=lambda rows: advance(job, rows))
+
+
+@register("delete_users")
+def delete_users(job):
+    """
+    payload: {"ids": [user ids]}, removes the recipes, tags, ingredient
+    aliases, tokens and idempotency keys in chunks first so deleting the
+    users cascades to nothing big
+    """
+    user_ids = job.payload["ids"]
+    querysets = [
+        *_user_content(user_ids),
+        IngredientAlias.objects.filter(user_id__in=user_ids),
+        AuthToken.objects.filter(user_id__in=user_ids),
+        IdempotencyKey.objects.filter(user_id__in=user_ids),
+    ]
+    users = get_user_model().objects.filter(pk__in=user_ids)
+    set_total(job, sum(qs.count() for qs in querysets) + users.count())
+    for queryset in [*querysets, users]:
+        delete_in_chunks(
+            queryset, batch_size(), progress=lambda rows: advance(job, rows)
+        )
+
+
+@register("reassign_content")
+def reassign_content(job):
+    """
+    payload: {"ids": [user ids], "to": user id}, moves their recipes,
+    tags and ingredient aliases to the user `to`
+    """
+    target = get_user_model().objects.get(pk=job.payload["to"])
+    user_ids = [pk for pk in job.payload["ids"] if pk != target.pk]
+    querysets = _user_content(user_ids)
+    aliases = IngredientAlias.objects.filter(user_id__in=user_ids)
+    set_total(job, sum(qs.count() for qs in querysets) + aliases.count())
+    for queryset in querysets:
+        update_in_chunks(
+            queryset,
+            {"user": target},
+            batch_size(),
+            progress=lambda rows: advance(job, rows),
+        )
+    _move_aliases(aliases, target, progress=lambda rows: advance(job, rows))
+    # the moved recipes add up the values of the target's aliases now
+    enqueue("refresh_rollups", {"user": target.pk})
+
+
+@register("refresh_rollups")
+def refresh_rollups(job):
+    """
+    payload: {"ingredient": id, "user": id}, {"user": id} or {"ids":
+    [recipe ids]}, recomputes the cost and nutrient totals of the user's
+    recipes using the ingredient, all the user's recipes or the listed ones
+    """
+    if "ingredient" in job.payload:
+        recipe_ids = rollups.recipes_using(
+            job.payload["ingredient"], job.payload.get("user")
+        )
+    elif "user" in job.payload:
+        recipe_ids = list(
+            Recipe.objects.filter(user_id=job.payload["user"])
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+    else:
+        recipe_ids = job.payload["ids"]
+    set_total(job, len(recipe_ids))
+    rollups.refresh_recipes(
+        recipe_ids, batch_size(), progress=lambda rows: advance(job, rows)
+    )
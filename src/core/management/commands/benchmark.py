@@ -0,0 +1,126 @@
+"""
+django command to benchmark the recipe api
+"""
+
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from core import benchmark
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Run benchmark scenarios against the api and report latency percentiles"""
+
+    help = (
+        "Run benchmark scenarios in-process (WSGI handler) or over HTTP and "
+        "report p50/p95/p99, throughput, queries and allocations per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(benchmark.SCENARIOS),
+            help="scenario to run, may be repeated (default: all)",
+        )
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--url", help="base url of a running server, runs in-process when omitted"
+        )
+        parser.add_argument(
+            "--email", help="user to benchmark as (default: user with most recipes)"
+        )
+        parser.add_argument("--save-baseline", metavar="PATH")
+        parser.add_argument("--compare", metavar="PATH", help="baseline json to diff")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="percent slowdown reported as a regression",
+        )
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def _user(self, email):
+        User = get_user_model()
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"User {email} does not exist")
+        user = (
+            User.objects.annotate(recipe_count=Count("recipes"))
+            .order_by("-recipe_count")
+            .first()
+        )
+        if user is None:
+            raise CommandError("No users found, run `manage.py seed_data` first")
+        return user
+
+    def handle(self, *args, **options):
+        user = self._user(options["email"])
+        token = AuthToken.objects.issue(user)
+        if options["url"]:
+            transport = benchmark.HttpTransport(options["url"], token.key)
+        else:
+            transport = benchmark.InProcessTransport(token.key)
+
+        names = options["scenario"] or list(benchmark.SCENARIOS)
+        results = {}
+        # a single user would hit its rate limits, measure the handler only
+        throttle = settings.THROTTLE_ENABLED and transport.name != "in-process"
+        with override_settings(THROTTLE_ENABLED=throttle):
+            for name in names:
+                scenario = benchmark.SCENARIOS[name]()
+                results[name] = benchmark.run_scenario(
+                    scenario,
+                    transport,
+                    {"user": user},
+                    requests=options["requests"],
+                    warmup=options["warmup"],
+                    trace_alloc=transport.name == "in-process",
+                )
+                self._report(name, results[name])
+
+        failed = {name: r["errors"] for name, r in results.items() if r["errors"]}
+        if failed:
+            # the timings of error responses say nothing about the api
+            raise CommandError(
+                "Requests failed, the results are not valid: "
+                + ", ".join(f"{name} {errors}" for name, errors in failed.items())
+            )
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump(
+                    {"transport": transport.name, "results": results}, f, indent=2
+                )
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)["results"]
+            regressions = benchmark.compare(results, baseline, options["threshold"])
+            for name, metric, old, new, change in regressions:
+                self.stdout.write(
+                    self.style.WARNING(f"{name} {metric}: {old} -> {new} (+{change}%)")
+                )
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} regression(s) found")
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def _report(self, name, result):
+        self.stdout.write(
+            f"{name:<14} n={result['requests']} errors={result['errors']} "
+            f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"p99={result['p99_ms']}ms rps={result['throughput_rps']} "
+            f"queries={result['queries_per_request']} "
+            f"peak_alloc={result['peak_alloc_kb']}KB"
+        )
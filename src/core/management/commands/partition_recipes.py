@@ -0,0 +1,40 @@
+"""
+django command to hash partition the recipe tables on postgres
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    """Partition core_recipe and its link tables by user, or undo it"""
+
+    help = (
+        "Rebuild the recipe tables as RECIPE_PARTITIONS hash partitions of "
+        "user_id (postgres only), locking them while the rows are copied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--partitions", type=int, default=settings.RECIPE_PARTITIONS
+        )
+        parser.add_argument(
+            "--undo", action="store_true", help="Turn them into plain tables."
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning needs postgres.")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options["undo"]:
+                partitioning.unpartition_recipe_tables(cursor)
+                message = "The recipe tables are plain tables"
+            else:
+                partitioning.partition_recipe_tables(cursor, options["partitions"])
+                message = "The recipe tables are partitioned"
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,89 @@
+"""
+django command to report the import time of the application
+"""
+
+import json
+import re
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# python -X importtime writes "import time: <self us> | <cumulative us> | <module>"
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - start
+from core.warmup import warm_up
+timings = warm_up(database=False)
+print(json.dumps({"django.setup": setup, **timings}))
+"""
+
+
+def parse_importtime(output):
+    """return [(module, self ms, cumulative ms, depth)] from -X importtime output"""
+    rows = []
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            depth = len(indent) // 2
+            rows.append((module, int(own) / 1000, int(cumulative) / 1000, depth))
+    return rows
+
+
+class Command(BaseCommand):
+    """Profile the imports and warm-up of a fresh worker"""
+
+    help = (
+        "Start a fresh interpreter with `python -X importtime`, load django and "
+        "run the warm-up, then report the slowest imports and warm-up steps."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25)
+        parser.add_argument(
+            "--sort", choices=["self", "cumulative"], default="cumulative"
+        )
+        parser.add_argument(
+            "--packages",
+            action="store_true",
+            help="sum the self time per top level package",
+        )
+
+    def handle(self, *args, **options):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode:
+            raise CommandError(f"Startup failed:\n{proc.stderr[-2000:]}")
+        rows = parse_importtime(proc.stderr)
+
+        if options["packages"]:
+            totals = {}
+            for module, own, _, _ in rows:
+                package = module.split(".")[0]
+                totals[package] = totals.get(package, 0) + own
+            self.stdout.write(f"{'self ms':>10}  package")
+            for package, own in sorted(totals.items(), key=lambda i: -i[1])[
+                : options["top"]
+            ]:
+                self.stdout.write(f"{own:>10.1f}  {package}")
+        else:
+            column = 1 if options["sort"] == "self" else 2
+            self.stdout.write(f"{'self ms':>10} {'cumul ms':>10}  module")
+            for row in sorted(rows, key=lambda r: -r[column])[: options["top"]]:
+                module, own, cumulative, _ = row
+                self.stdout.write(f"{own:>10.1f} {cumulative:>10.1f}  {module}")
+
+        total = sum(own for _, own, _, _ in rows)
+        self.stdout.write(f"\n{len(rows)} modules imported in {total:.1f}ms")
+        timings = json.loads(proc.stdout.strip().splitlines()[-1])
+        for step, seconds in timings.items():
+            self.stdout.write(f"{step:<14} {seconds * 1000:>8.1f}ms")
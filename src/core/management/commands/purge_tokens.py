@@ -0,0 +1,29 @@
+"""
+django command to delete expired auth tokens
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.db import delete_in_chunks
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Delete expired tokens in chunks"""
+
+    help = "Delete expired api tokens in small batches to avoid long locks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0.0, help="seconds to sleep between batches"
+        )
+
+    def handle(self, *args, **options):
+        deleted = delete_in_chunks(
+            AuthToken.objects.filter(expires__lte=timezone.now()),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens"))
@@ -0,0 +1,20 @@
+"""
+django command to recompute the cost and nutrient totals of all recipes
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    """Recompute recipe totals in batches"""
+
+    help = "Recompute the cost and nutrient totals of every recipe in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the totals of {count} recipes"))
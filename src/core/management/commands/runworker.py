@@ -0,0 +1,63 @@
+"""
+django command to run queued background jobs
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    """Run background jobs from the database queue"""
+
+    help = "Run queued background jobs (core.jobs) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue",
+            action="append",
+            metavar="NAME[=LIMIT]",
+            help="queue to work on with an optional concurrency limit, may be "
+            "repeated (default: JOBS_QUEUES)",
+        )
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--pool", choices=["thread", "process", "inline"], default="thread"
+        )
+        parser.add_argument(
+            "--burst", action="store_true", help="exit when the queue is empty"
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=1.0, help="seconds between polls when idle"
+        )
+        parser.add_argument("--max-jobs", type=int, help="exit after this many jobs")
+
+    def _queues(self, values, concurrency):
+        if not values:
+            return None
+        configured = jobs.setting("QUEUES")
+        queues = {}
+        for value in values:
+            name, _, limit = value.partition("=")
+            try:
+                queues[name] = (
+                    int(limit) if limit else configured.get(name, concurrency)
+                )
+            except ValueError:
+                raise CommandError(f"Invalid queue limit in {value}")
+        return queues
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(
+            queues=self._queues(options["queue"], options["concurrency"]),
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+        )
+        self.stdout.write(
+            f"Worker started, queues {worker.queues}, "
+            f"{worker.concurrency} {worker.pool} workers"
+        )
+        processed = worker.run(
+            burst=options["burst"], sleep=options["sleep"], max_jobs=options["max_jobs"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
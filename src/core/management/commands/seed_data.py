@@ -0,0 +1,46 @@
+"""
+django command to seed the database with benchmark data
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import seed
+
+
+class Command(BaseCommand):
+    """Bulk create users, recipes, tags and ingredients"""
+
+    help = "Seed users with recipes, tags and ingredients using bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--recipes", type=int, default=100, help="per user")
+        parser.add_argument("--tags", type=int, default=20, help="per user")
+        parser.add_argument("--ingredients", type=int, default=50, help="per user")
+        parser.add_argument(
+            "--per-recipe",
+            type=int,
+            default=5,
+            help="tags and ingredients linked to every recipe",
+        )
+        parser.add_argument("--password", default="benchmark123")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        result = seed(
+            users=options["users"],
+            recipes=options["recipes"],
+            tags=options["tags"],
+            ingredients=options["ingredients"],
+            per_recipe=options["per_recipe"],
+            password=options["password"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Seeded {users} users, {recipes} recipes, {tags} tags, "
+                "{ingredients} ingredients and {links} links".format(**result)
+            )
+        )
+        if result["emails"]:
+            self.stdout.write(f"First user: {result['emails'][0]}")
@@ -0,0 +1,40 @@
+"""
+django command to regenerate the committed OpenAPI schema
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.schema import render_schema
+
+
+class Command(BaseCommand):
+    """Write the schema to SCHEMA_FILE"""
+
+    help = "Generate the OpenAPI schema into SCHEMA_FILE, or check it is current."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="fail when the file differs from the code instead of writing it",
+        )
+
+    def handle(self, *args, **options):
+        path = settings.SCHEMA_FILE
+        content = render_schema()
+        current = path.read_bytes() if path.exists() else None
+
+        if options["check"]:
+            if content != current:
+                raise CommandError(
+                    f"{path} is out of date, run `python manage.py update_schema`"
+                )
+            self.stdout.write(self.style.SUCCESS(f"{path} is up to date"))
+            return
+
+        if content == current:
+            self.stdout.write(f"{path} is up to date")
+            return
+        path.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
@@ -1,47 +1,61 @@
 """
-    django command to wait for the database to be avaliable
+django command to wait for the database to be avaliable
 """
 
 import time
 
-from psycopg2 import OperationalError as psycopg2OpError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
 
-from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from core import health
 
-from django.db import connections
 
-
-        
 class Command(BaseCommand):
     """Django command to pause execution until database is available"""
 
+    help = (
+        "Wait until the database accepts connections, with exponential backoff "
+        "and jitter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--timeout", type=float, default=60.0, help="seconds before giving up"
+        )
+        parser.add_argument("--max-delay", type=float, default=5.0)
+        parser.add_argument(
+            "--wait-for-migrations",
+            action="store_true",
+            help="also wait until every migration is applied",
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        self.stdout.write("Waiting for database...")
+        deadline = time.monotonic() + options["timeout"]
+        delays = health.backoff_delays(max_delay=options["max_delay"])
+        pending = None
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
-
-        self.stdout.write(self.style.SUCCESS('Database available!'))
-        
-# class Command(BaseCommand):
-#     """Django command to wait for database"""
-    
-#     def handle(self, *args, **options):
-#         self.stdout.write("waiting for database...")
-#         db_up = False
-#         while db_up is False:
-#             try:
-#                 self.check(databases=['default'])
-#                 # print("**********************************")
-#                 # print(self.check(databases=['default']))
-#                 # print("**********************************")
-#                 db_up = True
-#             except (psycopg2OpError, OperationalError):
-#                 self.stdout.write("Database unavailable, waiting 1second...")
-#                 time.sleep(1)
-#         self.stdout.write(self.style.SUCCESS("Database available"))
+                health.probe_database(options["database"])
+                pending = health.pending_migrations(options["database"])
+                if not pending or not options["wait_for_migrations"]:
+                    break
+                reason = f"{len(pending)} migrations pending"
+            except health.CONNECTION_ERRORS as exc:
+                health.reset_connection(options["database"])
+                reason = "Database unavailable"
+                if options["verbosity"] > 1:
+                    reason += f" ({exc})"
+
+            delay = next(delays)
+            if time.monotonic() + delay > deadline:
+                raise CommandError(f"{reason}, giving up")
+            self.stdout.write(f"{reason}, waiting {delay:.2f}s...")
+            time.sleep(delay)
+
+        if pending:
+            self.stdout.write(
+                self.style.WARNING(f"{len(pending)} migrations are not applied")
+            )
+        self.stdout.write(self.style.SUCCESS("Database available!"))
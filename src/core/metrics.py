@@ -0,0 +1,328 @@
+"""
+in-process metrics registry exported in the prometheus text format
+
+with gunicorn every worker has its own registry, set METRICS_DIR to a
+directory shared by the workers and each of them periodically writes a
+snapshot file there, `/metrics` then adds the snapshots of the other
+workers to its own live values.
+snapshot files are named by pid and a random token, so a reused pid gets a
+new file, files of processes that are no longer running are removed.
+"""
+
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+UPLOAD_SIZE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT")
+)
+WORKER_FILE_RE = re.compile(r"^metrics_(\d+)-([0-9a-f]+)\.json$")
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running, owned by another user
+        pass
+    return True
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """base class for a metric with a fixed set of label names"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, values, other):
+        """add the values of another worker snapshot into values"""
+        raise NotImplementedError
+
+    def samples(self, values):
+        """yield (suffix, label values, extra labels, value) for exposition"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """monotonically increasing value"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values, other):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield "", key, (), value
+
+
+class Histogram(Metric):
+    """distribution of observed values over fixed buckets"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def merge(self, values, other):
+        for key, (counts, total, count) in other.items():
+            state = values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            state[0] = [a + b for a, b in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def samples(self, values):
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", key, (("le", _format_value(float(bound))),), cumulative
+            yield "_bucket", key, (("le", "+Inf"),), count
+            yield "_sum", key, (), total
+            yield "_count", key, (), count
+
+
+class Registry:
+    """collection of metrics, shared between workers through METRICS_DIR"""
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id
+        self._metrics = {}
+        self._last_flush = 0.0
+        self._pid = None
+        self._token = None
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    @property
+    def directory(self):
+        return getattr(settings, "METRICS_DIR", None)
+
+    def _worker_id(self):
+        if self.worker_id:
+            return self.worker_id
+        pid = os.getpid()
+        if pid != self._pid:
+            # first use or forked worker, never share the parent's file
+            self._pid, self._token = pid, secrets.token_hex(4)
+        return f"{pid}-{self._token}"
+
+    def _worker_file(self, directory):
+        return os.path.join(directory, f"metrics_{self._worker_id()}.json")
+
+    def _is_stale(self, filename):
+        """file left by a process that exited, or by an earlier owner of our pid"""
+        match = WORKER_FILE_RE.match(filename)
+        if match is None:
+            return False
+        pid = int(match.group(1))
+        if pid == os.getpid():
+            return True
+        return not _process_running(pid)
+
+    def flush(self, force=False):
+        """write this worker's snapshot to METRICS_DIR, at most once per interval"""
+        directory = self.directory
+        if not directory:
+            return
+        now = time.monotonic()
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0)
+        if not force and now - self._last_flush < interval:
+            return
+        self._last_flush = now
+
+        data = {
+            name: [[list(key), value] for key, value in metric.snapshot().items()]
+            for name, metric in self._metrics.items()
+        }
+        path = self._worker_file(directory)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _other_workers(self):
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return
+        own = os.path.basename(self._worker_file(directory))
+        for filename in os.listdir(directory):
+            if filename == own or not filename.endswith(".json"):
+                continue
+            path = os.path.join(directory, filename)
+            if self._is_stale(filename):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # already removed by another worker
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                # file removed or being replaced while listing
+                continue
+
+    def collect(self):
+        """return {metric: merged values} for this and the other workers"""
+        collected = {name: m.snapshot() for name, m in self._metrics.items()}
+        for data in self._other_workers():
+            for name, rows in data.items():
+                metric = self._metrics.get(name)
+                if metric is not None:
+                    other = {tuple(key): value for key, value in rows}
+                    metric.merge(collected[name], other)
+        return collected
+
+    def render(self):
+        """render all metrics in the prometheus text exposition format"""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self._metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for suffix, key, extra, value in metric.samples(values):
+                labels = _format_labels(metric.labelnames, key, extra)
+                lines.append(f"{name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    "http_requests_total", "Total HTTP requests.", ("view", "method", "status")
+)
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency in seconds.",
+    ("view", "method"),
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries",
+    "Database queries executed per HTTP request.",
+    ("view", "method"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = registry.histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per HTTP request.",
+    ("view", "method"),
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result.", ("cache", "result")
+)
+IMAGE_UPLOAD_BYTES = registry.histogram(
+    "recipe_image_upload_bytes",
+    "Size of uploaded recipe images in bytes.",
+    buckets=UPLOAD_SIZE_BUCKETS,
+)
+
+
+def view_label(request):
+    """url name of the resolved view, keeps label cardinality bounded"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.url_name or match.view_name or "unnamed"
+
+
+def method_label(request):
+    """http method, "other" for non standard methods sent by clients"""
+    method = request.method
+    return method if method in HTTP_METHODS else "other"
+
+
+def observe_request(request, stats):
+    """record the stats collected by PerformanceMiddleware"""
+    view = view_label(request)
+    method = method_label(request)
+    REQUESTS.inc(view=view, method=method, status=stats["status"])
+    REQUEST_LATENCY.observe(stats["total_ms"] / 1000, view=view, method=method)
+    REQUEST_DB_QUERIES.observe(stats["db_queries"], view=view, method=method)
+    REQUEST_DB_TIME.observe(stats["db_ms"] / 1000, view=view, method=method)
+    registry.flush()
+
+
+def record_cache(cache, hit):
+    """count a cache lookup, `hit` is True when the value was found"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,129 @@
+"""
+request level performance instrumentation
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+
+logger = logging.getLogger("core.performance")
+
+# max number of statements kept for the slow request sql dump
+MAX_RECORDED_QUERIES = 100
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper` that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((elapsed, sql))
+
+
+class PerformanceMiddleware:
+    """
+    measure db, view (python + serialization) and render time of a request,
+    report them in a `Server-Timing` header, the metrics registry and a
+    sampled json log line, requests slower than PERFORMANCE_SLOW_REQUEST_MS
+    are always logged together with their sql
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        request.performance = {"start": start}
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        stats = self._stats(request, response, recorder, time.perf_counter())
+        request.performance.update(stats)
+        metrics.observe_request(request, stats)
+
+        if getattr(settings, "PERFORMANCE_SERVER_TIMING", True):
+            response["Server-Timing"] = self._server_timing(stats)
+        self._log(request, stats, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        """mark the end of the view, DRF responses are rendered after this"""
+        request.performance["view_end"] = time.perf_counter()
+
+        def render_done(rendered):
+            request.performance["render_end"] = time.perf_counter()
+
+        response.add_post_render_callback(render_done)
+        return response
+
+    def _stats(self, request, response, recorder, end):
+        perf = request.performance
+        view_end = perf.get("view_end", end)
+        render_end = perf.get("render_end", view_end)
+        db_ms = recorder.duration * 1000
+        view_ms = (view_end - perf["start"]) * 1000
+        return {
+            "db_queries": recorder.count,
+            "db_ms": db_ms,
+            "app_ms": max(view_ms - db_ms, 0.0),
+            "render_ms": (render_end - view_end) * 1000,
+            "total_ms": (end - perf["start"]) * 1000,
+            "response_bytes": (None if response.streaming else len(response.content)),
+            "status": response.status_code,
+        }
+
+    def _server_timing(self, stats):
+        return ", ".join(
+            [
+                f'db;dur={stats["db_ms"]:.1f};desc="{stats["db_queries"]} queries"',
+                f'app;dur={stats["app_ms"]:.1f};desc="view and serialization"',
+                f'render;dur={stats["render_ms"]:.1f}',
+                f'total;dur={stats["total_ms"]:.1f}',
+            ]
+        )
+
+    def _log(self, request, stats, recorder):
+        slow_ms = getattr(settings, "PERFORMANCE_SLOW_REQUEST_MS", 500)
+        is_slow = slow_ms is not None and stats["total_ms"] >= slow_ms
+        sample_rate = getattr(settings, "PERFORMANCE_SAMPLE_RATE", 1.0)
+        if not is_slow and random.random() >= sample_rate:
+            return
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": getattr(request.resolver_match, "view_name", None),
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()},
+        }
+        if is_slow:
+            record["slow"] = True
+            record["sql"] = [
+                {"ms": round(elapsed * 1000, 2), "sql": sql}
+                for elapsed, sql in recorder.queries
+            ]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
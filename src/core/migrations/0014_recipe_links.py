@@ -0,0 +1,150 @@
+# Generated by Django 4.2.1 on 2026-10-19 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import core.models
+import django.db.models.deletion
+
+
+def copy_recipe_users(apps, schema_editor):
+    """fill the link user from the recipe"""
+    Recipe = apps.get_model("core", "Recipe")
+    user_id = Subquery(
+        Recipe.objects.filter(pk=OuterRef("recipe_id")).values("user_id")[:1]
+    )
+    for name in ("RecipeTag", "RecipeIngredient"):
+        apps.get_model("core", name).objects.update(user_id=user_id)
+
+
+def link_model(name, target, related_name):
+    """the auto created through table of recipe.<target>s, as a model"""
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            (
+                "id",
+                models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name="ID",
+                ),
+            ),
+            (
+                "recipe",
+                models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name=related_name,
+                    to="core.recipe",
+                ),
+            ),
+            (
+                target,
+                models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name="+",
+                    to=f"core.{target}",
+                ),
+            ),
+        ],
+        options={
+            "db_table": f"core_recipe_{target}s",
+            "unique_together": {("recipe", target)},
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_job_queue"),
+    ]
+
+    operations = [
+        # the tables exist already, only the state changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                link_model("RecipeTag", "tag", "tag_links"),
+                link_model("RecipeIngredient", "ingredient", "ingredient_links"),
+                migrations.AlterField(
+                    model_name="recipe",
+                    name="tags",
+                    field=core.models.RecipeLinksField(
+                        through="core.RecipeTag", to="core.tag"
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="recipe",
+                    name="ingredients",
+                    field=core.models.RecipeLinksField(
+                        through="core.RecipeIngredient", to="core.ingredient"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="recipetag",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipeingredient",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(copy_recipe_users, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="recipetag",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="recipetag",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="recipeingredient",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="recipetag",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe", "tag"), name="core_recipe_tags_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recipeingredient",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe", "ingredient"),
+                name="core_recipe_ingredients_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-19 11:20
+
+from django.conf import settings
+from django.db import migrations
+
+from core import partitioning
+
+
+def partition(apps, schema_editor):
+    """hash partition the recipe tables by user on postgres, when opted in"""
+    if schema_editor.connection.vendor != "postgresql" or not getattr(
+        settings, "RECIPE_PARTITIONING", False
+    ):
+        return
+    partitions = getattr(settings, "RECIPE_PARTITIONS", 16)
+    with schema_editor.connection.cursor() as cursor:
+        partitioning.partition_recipe_tables(cursor, partitions)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitioning.unpartition_recipe_tables(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_recipe_links"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-19 09:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_partition_recipes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="recipeingredient",
+            options={"ordering": ["position", "id"]},
+        ),
+        migrations.AddField(
+            model_name="recipeingredient",
+            name="position",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="recipeingredient",
+            name="quantity",
+            field=models.DecimalField(
+                blank=True, decimal_places=3, max_digits=9, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipeingredient",
+            name="unit",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="recipe",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="ingredient_links",
+                to="core.recipe",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipeingredient",
+            index=models.Index(
+                fields=["recipe", "position"],
+                include=("ingredient", "quantity", "unit"),
+                name="core_recipe_ing_position_idx",
+            ),
+        ),
+    ]
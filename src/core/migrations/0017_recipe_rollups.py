@@ -0,0 +1,73 @@
+# Generated by Django 4.2.1 on 2026-10-19 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_recipe_ingredient_lines"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="calories",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="carbohydrates",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="fat",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="protein",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="unit_cost",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="calories",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="carbohydrates",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="fat",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredient_cost",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="protein",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+    ]
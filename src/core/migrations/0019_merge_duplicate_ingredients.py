@@ -0,0 +1,91 @@
+# Generated by Django 4.2.1 on 2026-10-19 13:05
+
+from django.db import migrations
+
+NUTRITION_FIELDS = ["unit_cost", "calories", "protein", "fat", "carbohydrates"]
+
+
+def normalize_name(name):
+    # core.models.normalize_name at the time of this migration
+    return " ".join(name.casefold().split())
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    keep the oldest ingredient of every normalized name as the catalog
+    ingredient, move the recipe lines of the others to it and give every
+    owner an alias of it with the name and values of their own row, the
+    values never leave the user they belong to
+    """
+    db = schema_editor.connection.alias
+    Ingredient = apps.get_model("core", "Ingredient")
+    IngredientAlias = apps.get_model("core", "IngredientAlias")
+    RecipeIngredient = apps.get_model("core", "RecipeIngredient")
+
+    kept, aliases = {}, {}
+    for ingredient in Ingredient.objects.using(db).order_by("id").iterator():
+        ingredient.normalized_name = normalize_name(ingredient.name)
+        catalog = kept.setdefault(ingredient.normalized_name, ingredient)
+        key = (ingredient.user_id, catalog.pk)
+        alias = aliases.get(key)
+        if alias is None:
+            aliases[key] = IngredientAlias(
+                user_id=ingredient.user_id,
+                ingredient_id=catalog.pk,
+                name=ingredient.name,
+                normalized_name=ingredient.normalized_name,
+                **{field: getattr(ingredient, field) for field in NUTRITION_FIELDS},
+            )
+        else:
+            # a duplicate of the same user fills in what their first row lacks
+            for field in NUTRITION_FIELDS:
+                if getattr(alias, field) is None:
+                    setattr(alias, field, getattr(ingredient, field))
+        if catalog.pk == ingredient.pk:
+            continue
+
+        links = RecipeIngredient.objects.using(db).filter(ingredient=ingredient)
+        # a recipe with both keeps its line of the kept ingredient
+        links.filter(
+            recipe__in=RecipeIngredient.objects.filter(ingredient=catalog).values(
+                "recipe"
+            )
+        ).delete()
+        links.update(ingredient=catalog)
+        ingredient.delete(using=db)
+
+    Ingredient.objects.using(db).bulk_update(
+        kept.values(), ["normalized_name"], batch_size=1000
+    )
+    IngredientAlias.objects.using(db).bulk_create(aliases.values(), batch_size=1000)
+
+    # lines linking an ingredient of another user (added in the admin) get
+    # an alias of the catalog name, conflicting names keep the catalog one
+    IngredientAlias.objects.using(db).bulk_create(
+        [
+            IngredientAlias(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                name=name,
+                normalized_name=normalize_name(name),
+            )
+            for user_id, ingredient_id, name in RecipeIngredient.objects.using(db)
+            .values_list("user_id", "ingredient_id", "ingredient__name")
+            .order_by()
+            .distinct()
+            if (user_id, ingredient_id) not in aliases
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_ingredient_catalog"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
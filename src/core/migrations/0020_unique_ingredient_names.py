@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_merge_duplicate_ingredients"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingredient",
+            name="normalized_name",
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        # the owner and the values live on the aliases now
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="user",
+        ),
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="unit_cost",
+        ),
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="calories",
+        ),
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="protein",
+        ),
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="fat",
+        ),
+        migrations.RemoveField(
+            model_name="ingredient",
+            name="carbohydrates",
+        ),
+    ]
@@ -1,8 +1,23 @@
+import binascii
 import uuid
 import os
+from datetime import timedelta
 
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import (
+    F,
+    FilteredRelation,
+    Prefetch,
+    Q,
+    prefetch_related_objects,
+)
+from django.db.models.signals import m2m_changed
+from django.db.models.expressions import Col
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+from django.db.models.lookups import In
+from django.utils.functional import cached_property
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 
 from django.contrib.auth.models import (
@@ -13,6 +28,9 @@ from django.contrib.auth.models import (
 
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
+
+from core import hashers
 
 
 def recipe_image_file_path(instance, filename):
@@ -57,6 +75,140 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = "email"
 
+    class Meta:
+        # prefix (LIKE 'abc%') searches of the admin, postgres only uses an
+        # index for them with the pattern operator class
+        indexes = [
+            models.Index(
+                fields=["email"],
+                name="core_user_email_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["name"],
+                name="core_user_name_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def set_password(self, raw_password):
+        """hash the password on the bounded hashing pool"""
+        if raw_password is None:
+            return super().set_password(raw_password)
+        self.password = hashers.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """verify on the hashing pool and upgrade outdated hashes"""
+        valid, new_password = hashers.verify_password(raw_password, self.password)
+        if new_password:
+            self.password = new_password
+            self.save(update_fields=["password"])
+        return valid
+
+
+def filter_link_partitions(queryset, through, user_ids):
+    """
+    add `user_id IN (...)` on the joined link table to queryset, so
+    postgres only scans the partitions of these users
+    """
+    table = through._meta.db_table
+    aliases = [
+        alias
+        for alias, join in queryset.query.alias_map.items()
+        if join.table_name == table
+    ]
+    if len(aliases) == 1:
+        column = Col(aliases[0], through._meta.get_field("user"))
+        queryset.query.where.add(In(column, sorted(user_ids)), "AND")
+    return queryset
+
+
+class RecipeLinksDescriptor(ManyToManyDescriptor):
+    """
+    `recipe.tags` / `recipe.ingredients` manager storing the recipe's user
+    on new links and filtering on it, the link tables are partitioned by
+    user. The reverse side (`tag.recipe_set`) needs `through_defaults`.
+    """
+
+    @cached_property
+    def related_manager_cls(self):
+        manager_cls = super().related_manager_cls
+        if self.reverse:
+            return manager_cls
+
+        class RecipeLinksManager(manager_cls):
+            def _add_items(self, source, target, *objs, through_defaults=None):
+                through_defaults = {
+                    "user_id": self.instance.user_id,
+                    **(through_defaults or {}),
+                }
+                super()._add_items(
+                    source, target, *objs, through_defaults=through_defaults
+                )
+
+            def _build_remove_filters(self, removed_vals):
+                filters = super()._build_remove_filters(removed_vals)
+                return filters & Q(user_id=self.instance.user_id)
+
+            def _apply_rel_filters(self, queryset):
+                return filter_link_partitions(
+                    super()._apply_rel_filters(queryset),
+                    self.through,
+                    [self.instance.user_id],
+                )
+
+            def _remove_prefetched_objects(self):
+                super()._remove_prefetched_objects()
+                # the link rows (`recipe.ingredient_links`) are stale as well
+                links = self.through._meta.get_field(self.source_field_name)
+                cache = getattr(self.instance, "_prefetched_objects_cache", {})
+                cache.pop(links.remote_field.get_cache_name(), None)
+
+            def add_links(self, links):
+                """
+                insert unsaved link rows (with their extra columns) in one
+                query, sending the m2m_changed signals of add()
+                """
+                db = router.db_for_write(self.through, instance=self.instance)
+                for link in links:
+                    setattr(link, self.source_field_name, self.instance)
+                    link.user_id = self.instance.user_id
+                signal = {
+                    "sender": self.through,
+                    "instance": self.instance,
+                    "reverse": False,
+                    "model": self.model,
+                    "pk_set": {
+                        getattr(link, f"{self.target_field_name}_id") for link in links
+                    },
+                    "using": db,
+                }
+                self._remove_prefetched_objects()
+                with transaction.atomic(using=db, savepoint=False):
+                    m2m_changed.send(action="pre_add", **signal)
+                    self.through._default_manager.using(db).bulk_create(links)
+                    m2m_changed.send(action="post_add", **signal)
+                return links
+
+            def get_prefetch_queryset(self, instances, queryset=None):
+                queryset, *rest = super().get_prefetch_queryset(instances, queryset)
+                user_ids = {instance.user_id for instance in instances}
+                return (
+                    filter_link_partitions(queryset, self.through, user_ids),
+                    *rest,
+                )
+
+        return RecipeLinksManager
+
+
+class RecipeLinksField(models.ManyToManyField):
+    """many to many from Recipe through a link table carrying the user"""
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.name, RecipeLinksDescriptor(self.remote_field, reverse=False))
+
 
 class Recipe(models.Model):
     """Recipe object"""
@@ -72,12 +224,50 @@ class Recipe(models.Model):
 
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
-    tags = models.ManyToManyField(to="Tag")
-    ingredients = models.ManyToManyField(to="Ingredient")
+    tags = RecipeLinksField(to="Tag", through="RecipeTag")
+    ingredients = RecipeLinksField(to="Ingredient", through="RecipeIngredient")
+
+    # totals of the ingredient lines, kept up to date by `core.rollups`
+    ingredient_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    calories = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    protein = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fat = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    carbohydrates = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        # every list query is scoped by user, the trailing id keeps the
+        # sort stable so keyset pagination can seek on each order
+        indexes = [
+            models.Index(fields=["user", "id"], name="core_recipe_user_id_idx"),
+            models.Index(
+                fields=["user", "price", "id"], name="core_recipe_user_price_idx"
+            ),
+            models.Index(
+                fields=["user", "time_minutes", "id"], name="core_recipe_user_time_idx"
+            ),
+            models.Index(
+                fields=["title"],
+                name="core_recipe_title_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def ingredient_lines(self):
+        """the ingredient links in order, prefetched on first use"""
+        if "ingredient_links" not in getattr(self, "_prefetched_objects_cache", {}):
+            links = RecipeIngredient.objects.filter(user_id=self.user_id)
+            prefetch_related_objects(
+                [self],
+                Prefetch(
+                    "ingredient_links",
+                    links.with_aliases().select_related("ingredient"),
+                ),
+            )
+        return self.ingredient_links.all()
+
 
 class Tag(models.Model):
     """tag for filtering recipes"""
@@ -87,17 +277,426 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL, related_name="tags", on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name"],
+                name="core_tag_name_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
     def __str__(self):
         return str(self.name)
 
 
+def normalize_name(name):
+    """catalog form of an ingredient name, case folded with single spaces"""
+    return " ".join(name.casefold().split())
+
+
+class IngredientQuerySet(models.QuerySet):
+    def named_for(self, user):
+        """annotate `user_name`, the name of the user's alias of each ingredient"""
+        return self.annotate(
+            user_alias=FilteredRelation("aliases", condition=Q(aliases__user=user)),
+            user_name=F("user_alias__name"),
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalized_name = normalize_name(obj.name)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Ingredient(models.Model):
-    """Ingredients for a recipe"""
+    """
+    Ingredient of the catalog shared by all users, unique by normalized
+    name. It has no owner and users don't change it, what a user calls it
+    and its cost and nutrients for them are kept on their IngredientAlias
+    """
 
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name"],
+                name="core_ingredient_name_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    objects = IngredientQuerySet.as_manager()
+
+    def __str__(self):
+        return str(self.name)
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "normalized_name"}
+        super().save(*args, **kwargs)
+
+
+class IngredientAliasQuerySet(models.QuerySet):
+    def add(self, user, name, **values):
+        """
+        the user's ingredient called `name`: their alias of that name, or a
+        new alias with `values` of the catalog ingredient of the name, which
+        is added to the catalog when missing
+        """
+        normalized = normalize_name(name)
+        alias = self.filter(user=user, normalized_name=normalized).first()
+        if alias is not None:
+            return alias
+        ingredient, created = Ingredient.objects.get_or_create(
+            normalized_name=normalized, defaults={"name": name}
+        )
+        if created:
+            # nobody can have an alias of it before this transaction commits
+            return self.create(user=user, ingredient=ingredient, name=name, **values)
+        # a renamed alias of the same ingredient stays the user's entry
+        alias, _ = self.get_or_create(
+            user=user, ingredient=ingredient, defaults={"name": name, **values}
+        )
+        return alias
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalized_name = normalize_name(obj.name)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class IngredientAlias(models.Model):
+    """
+    a user's entry for a catalog ingredient: their name for it, listed as
+    their ingredient, and its cost and nutrients per unit for them
+    """
+
     user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, related_name="ingredients", on_delete=models.CASCADE
+        settings.AUTH_USER_MODEL,
+        related_name="ingredient_aliases",
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, related_name="aliases", on_delete=models.CASCADE
     )
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255)
+
+    # cost and nutrients per unit of the quantity recipes use
+    unit_cost = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True
+    )
+    calories = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True
+    )
+    protein = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True
+    )
+    fat = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    carbohydrates = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True
+    )
+
+    # {alias field: recipe total}
+    ROLLUP_FIELDS = {
+        "unit_cost": "ingredient_cost",
+        "calories": "calories",
+        "protein": "protein",
+        "fat": "fat",
+        "carbohydrates": "carbohydrates",
+    }
+
+    objects = IngredientAliasQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "ingredient aliases"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "normalized_name"], name="core_ingredientalias_uniq"
+            ),
+            # one entry per user and catalog ingredient
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="core_ingredientalias_ingredient_uniq",
+            ),
+        ]
 
     def __str__(self):
-        return str(self.name)
+        return f"{self.name} ({self.ingredient_id})"
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "normalized_name"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_values()
+        return instance
+
+    def remember_values(self):
+        """keep the loaded values the signals compare changes against"""
+        tracked = {"normalized_name", *self.ROLLUP_FIELDS}
+        self._loaded = {
+            name: value for name, value in self.__dict__.items() if name in tracked
+        }
+
+    def changed(self, names):
+        """whether any of the fields differ from the values loaded"""
+        loaded = getattr(self, "_loaded", {})
+        return any(
+            name not in loaded or loaded[name] != self.__dict__[name]
+            for name in names
+            if name in self.__dict__
+        )
+
+    def has_values(self):
+        return any(getattr(self, name) is not None for name in self.ROLLUP_FIELDS)
+
+
+class RecipeLink(models.Model):
+    """
+    base of the recipe link tables, `user` is the recipe's user, copied
+    so the tables can be hash partitioned by it like core_recipe (see
+    core/partitioning.py). On partitioned postgres tables the recipe_id
+    column has no foreign key constraint, the ORM cascades the deletes.
+    """
+
+    recipe = models.ForeignKey("Recipe", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        # leading column of the unique constraint
+        db_index=False,
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.recipe.user_id
+        super().save(*args, **kwargs)
+
+
+class RecipeTag(RecipeLink):
+    """tag of a recipe"""
+
+    recipe = models.ForeignKey(
+        "Recipe", on_delete=models.CASCADE, related_name="tag_links"
+    )
+    tag = models.ForeignKey("Tag", on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        db_table = "core_recipe_tags"
+        # unique constraints of partitioned tables include the partition key
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe", "tag"], name="core_recipe_tags_uniq"
+            ),
+        ]
+
+
+class RecipeIngredientQuerySet(models.QuerySet):
+    def with_aliases(self):
+        """
+        join the ingredient's alias of the line's user as `user_alias`, its
+        name annotated as `user_name`
+        """
+        return self.annotate(
+            user_alias=FilteredRelation(
+                "ingredient__aliases", condition=Q(ingredient__aliases__user=F("user"))
+            ),
+            user_name=F("user_alias__name"),
+        )
+
+
+class RecipeIngredient(RecipeLink):
+    """ingredient of a recipe, with its amount and place in the list"""
+
+    recipe = models.ForeignKey(
+        "Recipe",
+        on_delete=models.CASCADE,
+        related_name="ingredient_links",
+        # (recipe, position) serves the lookups by recipe
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        "Ingredient", on_delete=models.CASCADE, related_name="+"
+    )
+    quantity = models.DecimalField(
+        max_digits=9, decimal_places=3, null=True, blank=True
+    )
+    unit = models.CharField(max_length=32, blank=True)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    objects = RecipeIngredientQuerySet.as_manager()
+
+    class Meta:
+        db_table = "core_recipe_ingredients"
+        ordering = ["position", "id"]
+        indexes = [
+            # the ingredient list of a recipe is read from the index alone
+            models.Index(
+                fields=["recipe", "position"],
+                include=["ingredient", "quantity", "unit"],
+                name="core_recipe_ing_position_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe", "ingredient"],
+                name="core_recipe_ingredients_uniq",
+            ),
+        ]
+
+
+class AuthTokenManager(models.Manager):
+    """Manager for auth tokens"""
+
+    def issue(self, user):
+        """
+        return a valid token of the user, reusing one that is still valid
+        for at least half of AUTH_TOKEN_TTL instead of creating a row per login
+        """
+        ttl = timedelta(seconds=settings.AUTH_TOKEN_TTL)
+        now = timezone.now()
+        token = (
+            self.filter(user=user, expires__gt=now + ttl / 2)
+            .order_by("-expires")
+            .first()
+        )
+        if token is None:
+            token = self.create(user=user, expires=now + ttl)
+        return token
+
+
+class AuthToken(models.Model):
+    """Api token of a user, valid until `expires`"""
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="auth_tokens", on_delete=models.CASCADE
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    # indexed for the purge_tokens command
+    expires = models.DateTimeField(db_index=True)
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "expires"], name="core_authtoken_user_exp_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super().save(*args, **kwargs)
+
+    @staticmethod
+    def generate_key():
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @property
+    def is_expired(self):
+        return self.expires <= timezone.now()
+
+    def __str__(self):
+        return self.key
+
+
+class IdempotencyKey(models.Model):
+    """
+    response to a request sent with an `Idempotency-Key` header, replayed
+    when the client retries it, see core.idempotency
+    """
+
+    # (user, key) is unique, its index serves the user lookups
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="+",
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # empty while the first request runs
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(default=timezone.now)
+    # indexed for the purge_idempotency_keys command
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="core_idempotencykey_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class Job(models.Model):
+    """Background job run by `manage.py runworker`, see core.jobs"""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    name = models.CharField(max_length=100)
+    queue = models.CharField(max_length=50, default="default")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    # not picked up before run_at, pushed back after failed attempts
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveBigIntegerField(default=0)
+    total = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        related_name="+",
+        on_delete=models.SET_NULL,
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # workers pick the next due job of their queues
+        indexes = [
+            models.Index(
+                fields=["status", "queue", "run_at", "id"], name="core_job_claim_idx"
+            ),
+            models.Index(
+                fields=["status", "lease_expires"], name="core_job_lease_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
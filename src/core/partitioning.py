@@ -0,0 +1,137 @@
+"""
+postgres hash partitioning of the recipe tables by user_id
+
+every recipe query is scoped by user, so with core_recipe and its link
+tables split into RECIPE_PARTITIONS hash partitions of user_id the
+planner prunes a user's queries down to one partition of each, and
+vacuum and index maintenance work on tables of 1/n of the size.
+
+Partitioning is opt-in: migration core.0015 only partitions with
+RECIPE_PARTITIONING set, `manage.py partition_recipes` does it (or with
+`--undo` reverts it) on a migrated database. `partition_table` rebuilds a
+table as a partitioned one and copies the rows over, `unpartition_table`
+goes back. Both hold an exclusive lock on the table for the copy, run them
+in a maintenance window on big databases. Partitioned tables can't have
+unique constraints without the partition key, so the primary key becomes
+(id, user_id), the ids come from a plain sequence (identity columns need
+postgres 17 there) and the foreign keys of the link tables to core_recipe
+are dropped.
+"""
+
+RECIPE_TABLES = ("core_recipe", "core_recipe_tags", "core_recipe_ingredients")
+LINK_TABLES = RECIPE_TABLES[1:]
+PARTITION_KEY = "user_id"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def _definitions(cursor, table):
+    """(constraints, indexes) of table, except the primary key"""
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f', 'c')",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)",
+        [table],
+    )
+    return constraints, cursor.fetchall()
+
+
+def _rebuild(cursor, table, partitions=None, skip_foreign_keys_to=()):
+    old = f"{table}_unpartitioned" if partitions else f"{table}_partitioned"
+    constraints, indexes = _definitions(cursor, table)
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f"SELECT last_value FROM {sequence}")
+    last_id = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    if partitions:
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{old}") '
+            f"PARTITION BY HASH ({PARTITION_KEY})"
+        )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE "{table}_p{remainder}" PARTITION OF "{table}" '
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+    else:
+        cursor.execute(f'CREATE TABLE "{table}" (LIKE "{old}")')
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    # drops the old sequence and the foreign keys pointing at the old table
+    cursor.execute(f'DROP TABLE "{old}" CASCADE')
+
+    if partitions:
+        cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+        cursor.execute("SELECT setval(%s, %s)", [f"{table}_id_seq", last_id])
+        cursor.execute(
+            f"ALTER TABLE \"{table}\" ALTER id SET DEFAULT nextval('{table}_id_seq')"
+        )
+        primary_key = f"id, {PARTITION_KEY}"
+    else:
+        cursor.execute(
+            f'ALTER TABLE "{table}" ALTER id ADD GENERATED BY DEFAULT AS IDENTITY '
+            f"(START WITH {last_id + 1})"
+        )
+        primary_key = "id"
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" '
+        f"PRIMARY KEY ({primary_key})"
+    )
+
+    for name, kind, definition in constraints:
+        if kind == "f" and any(
+            f"REFERENCES {target}(" in definition for target in skip_foreign_keys_to
+        ):
+            continue
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        cursor.execute(definition)
+    cursor.execute(f'ANALYZE "{table}"')
+
+
+def partition_table(cursor, table, partitions):
+    """turn table into `partitions` hash partitions by user_id"""
+    if not is_partitioned(cursor, table):
+        _rebuild(cursor, table, partitions, skip_foreign_keys_to=RECIPE_TABLES)
+
+
+def unpartition_table(cursor, table):
+    """turn a partitioned table back into a plain one"""
+    if is_partitioned(cursor, table):
+        _rebuild(cursor, table)
+
+
+def restore_recipe_foreign_keys(cursor):
+    """the link tables' recipe_id foreign keys, once core_recipe is plain again"""
+    for table in LINK_TABLES:
+        cursor.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_recipe_id_fk" '
+            'FOREIGN KEY (recipe_id) REFERENCES "core_recipe" (id) '
+            "DEFERRABLE INITIALLY DEFERRED"
+        )
+
+
+def partition_recipe_tables(cursor, partitions):
+    for table in RECIPE_TABLES:
+        partition_table(cursor, table, partitions)
+
+
+def unpartition_recipe_tables(cursor):
+    if not is_partitioned(cursor, "core_recipe"):
+        return
+    for table in RECIPE_TABLES:
+        unpartition_table(cursor, table)
+    restore_recipe_foreign_keys(cursor)
@@ -0,0 +1,94 @@
+"""
+cost and nutrient totals of recipes
+
+a line of a recipe adds its `quantity` (1 when empty) times the value
+per unit its user set on their alias of the ingredient, values the alias
+does not have count as 0. The totals are stored on the recipe so the
+serializers read them with the row. `core.signals` refreshes a recipe
+when its lines change, a changed alias can be used by many recipes and is
+handled by the `refresh_rollups` job. `manage.py rebuild_rollups`
+recomputes everything.
+"""
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import IngredientAlias, Recipe, RecipeIngredient
+
+RECIPE_FIELDS = list(IngredientAlias.ROLLUP_FIELDS.values())
+ZERO = {field: Decimal(0) for field in RECIPE_FIELDS}
+
+
+def totals(links):
+    """{recipe id: {recipe field: total}} of a link queryset, one query"""
+    quantity = Coalesce("quantity", Value(Decimal(1)))
+    sums = {
+        recipe_field: Sum(
+            quantity * Coalesce(f"user_alias__{field}", Value(Decimal(0))),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        for field, recipe_field in IngredientAlias.ROLLUP_FIELDS.items()
+    }
+    rows = links.with_aliases().order_by().values("recipe_id").annotate(**sums)
+    return {
+        row.pop("recipe_id"): {field: value or 0 for field, value in row.items()}
+        for row in rows
+    }
+
+
+def store_totals(recipe, values):
+    """write {recipe field: total} to the recipe row and the instance"""
+    if all(getattr(recipe, field) == value for field, value in values.items()):
+        return
+    Recipe.objects.filter(pk=recipe.pk).update(**values)
+    for field, value in values.items():
+        setattr(recipe, field, value)
+
+
+def refresh_recipe(recipe):
+    """recompute the totals of one recipe and set them on the instance"""
+    links = RecipeIngredient.objects.filter(recipe_id=recipe.pk, user_id=recipe.user_id)
+    store_totals(recipe, totals(links).get(recipe.pk, ZERO))
+
+
+def refresh_recipes(recipe_ids, batch_size=1000, progress=None):
+    """
+    recompute the totals of many recipes, a grouped query and a bulk
+    update per `batch_size` recipes, return the number of recipes
+    """
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        batch_totals = totals(RecipeIngredient.objects.filter(recipe_id__in=batch))
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, **batch_totals.get(pk, ZERO)) for pk in batch],
+            RECIPE_FIELDS,
+        )
+        if progress is not None:
+            progress(len(batch))
+    return len(recipe_ids)
+
+
+def recipes_using(ingredient_id, user_id=None):
+    """ids of the recipes (of user_id) with a line of the ingredient"""
+    links = RecipeIngredient.objects.filter(ingredient_id=ingredient_id)
+    if user_id is not None:
+        links = links.filter(user_id=user_id)
+    return list(links.order_by().values_list("recipe_id", flat=True).distinct())
+
+
+def rebuild(batch_size=1000, progress=None):
+    """recompute the totals of every recipe, walking the ids in batches"""
+    last, count = 0, 0
+    while True:
+        ids = list(
+            Recipe.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return count
+        count += refresh_recipes(ids, batch_size, progress)
+        last = ids[-1]
@@ -0,0 +1,103 @@
+"""
+read replica routing
+
+`ReplicaMiddleware` lets GET / HEAD requests read from one of the
+DATABASE_REPLICAS, picked once per request so all its reads see the same
+replica, everything else (writes, transactions, management
+commands, jobs) uses the primary. After a client sent a write its reads
+stay on the primary for REPLICA_PIN_SECONDS, so it sees its own changes
+while the replicas catch up. Clients are told apart by their
+Authorization header, session cookie or address; the pins live in the
+REPLICA_PIN_CACHE cache, which has to be shared by all workers (checked
+at startup, see core/checks.py).
+"""
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# the replica the reads of the current request go to, None for the primary
+_replica = ContextVar("replica", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """route the reads of the block to one random replica (or not)"""
+    aliases = replicas()
+    token = _replica.set(random.choice(aliases) if enabled and aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def in_transaction():
+    """whether the primary is in an atomic block, other than a TestCase's"""
+    return any(
+        not block._from_testcase
+        for block in connections[DEFAULT_DB_ALIAS].atomic_blocks
+    )
+
+
+class ReplicaRouter:
+    """reads from the replica of the request while allowed, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or in_transaction():
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # also for objects that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def pin_cache():
+    return caches[getattr(settings, "REPLICA_PIN_CACHE", "default")]
+
+
+def pin_key(request):
+    credentials = request.headers.get("Authorization") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if credentials:
+        return "db-pin:" + hashlib.sha256(credentials.encode()).hexdigest()[:32]
+    return f"db-pin:ip:{request.META.get('REMOTE_ADDR')}"
+
+
+class ReplicaMiddleware:
+    """enable replica reads for safe requests of clients without recent writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        key = pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            pin_cache().set(key, True, getattr(settings, "REPLICA_PIN_SECONDS", 5))
+            return response
+
+        with replica_reads(not pin_cache().get(key)):
+            return self.get_response(request)
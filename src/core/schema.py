@@ -0,0 +1,84 @@
+"""
+OpenAPI schema generated once and served from memory
+
+introspecting every view takes hundreds of milliseconds, so the schema is
+rendered by `manage.py update_schema` into SCHEMA_FILE, which is committed
+and checked against the code by a test. Workers read the file once (or
+generate it when it is missing) and keep every format as raw and gzipped
+bytes with an ETag.
+"""
+
+import gzip
+import hashlib
+import threading
+
+import yaml
+from django.conf import settings
+
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+FORMATS = {
+    "yaml": "application/vnd.oai.openapi",
+    "json": "application/vnd.oai.openapi+json",
+}
+
+
+def generate_schema():
+    """introspect the urlconf into the OpenAPI dict"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema(schema=None):
+    """the schema as the yaml bytes stored in SCHEMA_FILE"""
+    return OpenApiYamlRenderer().render(schema or generate_schema())
+
+
+class SchemaDocument:
+    """one rendering of the schema: body, gzipped body and ETag"""
+
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+        self.gzipped = gzip.compress(content, mtime=0)
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class SchemaCache:
+    """the schema documents of this process, loaded on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = None
+
+    def clear(self):
+        self._documents = None
+
+    def _load(self):
+        try:
+            content = settings.SCHEMA_FILE.read_bytes()
+        except FileNotFoundError:
+            content = render_schema()
+        data = yaml.safe_load(content)
+        json_content = OpenApiJsonRenderer().render(
+            data, renderer_context={"indent": None}
+        )
+        return {
+            "yaml": SchemaDocument(content, FORMATS["yaml"]),
+            "json": SchemaDocument(json_content, FORMATS["json"]),
+        }
+
+    def get(self, fmt="yaml"):
+        documents = self._documents
+        if documents is None:
+            with self._lock:
+                if self._documents is None:
+                    self._documents = self._load()
+                documents = self._documents
+        return documents[fmt]
+
+
+schema_cache = SchemaCache()
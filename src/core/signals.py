@@ -0,0 +1,106 @@
+"""
+signal handlers of the core app
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import hashers, jobs, rollups
+from core.authentication import token_cache_key, user_cache_key
+from core.catalog import catalog
+from core.models import AuthToken, Ingredient, IngredientAlias, Recipe
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(sender, setting, **kwargs):
+    """rebuild the hashing pool when its settings change (tests)"""
+    if setting.startswith("PASSWORD_HASHING_"):
+        hashers.reset_pool()
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_token(sender, instance, **kwargs):
+    """drop a revoked token from the authentication cache"""
+    cache.delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    """make the cached tokens of a changed user load it again"""
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_recipe_rollup(sender, instance, action, reverse, pk_set, **kwargs):
+    """recompute the totals of recipes whose ingredient lines changed"""
+    if reverse:
+        # ingredient.recipe_set, the recipe ids are gone after a clear
+        if action == "pre_clear":
+            instance._rollup_recipes = rollups.recipes_using(instance.pk)
+        elif action == "post_clear":
+            rollups.refresh_recipes(instance.__dict__.pop("_rollup_recipes", ()))
+        elif action in ("post_add", "post_remove"):
+            rollups.refresh_recipes(sorted(pk_set))
+    elif action == "post_clear":
+        rollups.store_totals(instance, rollups.ZERO)
+    elif action in ("post_add", "post_remove"):
+        rollups.refresh_recipe(instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    """add new ingredients to the name catalog, forget it on renames"""
+    if created:
+        catalog.learn({instance.normalized_name: instance.pk})
+    else:
+        catalog.invalidate()
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    catalog.invalidate()
+
+
+@receiver(post_save, sender=IngredientAlias)
+def alias_saved(sender, instance, created, **kwargs):
+    """
+    add new aliases to the name catalog, forget the user's names on renames
+    and queue a refresh of the user's recipes using an alias whose values changed
+    """
+    if created:
+        key = (instance.user_id, instance.normalized_name)
+        catalog.learn(aliases={key: instance.ingredient_id})
+    elif instance.changed(["normalized_name"]):
+        catalog.invalidate_user(instance.user_id)
+    if instance.changed(IngredientAlias.ROLLUP_FIELDS) and (
+        not created or instance.has_values()
+    ):
+        jobs.enqueue(
+            "refresh_rollups",
+            {"ingredient": instance.ingredient_id, "user": instance.user_id},
+        )
+    instance.remember_values()
+
+
+@receiver(pre_delete, sender=IngredientAlias)
+def collect_alias_recipes(sender, instance, **kwargs):
+    if instance.has_values():
+        instance._rollup_recipes = rollups.recipes_using(
+            instance.ingredient_id, instance.user_id
+        )
+
+
+@receiver(post_delete, sender=IngredientAlias)
+def alias_deleted(sender, instance, **kwargs):
+    """
+    forget the user's names in the catalog and queue a refresh of the
+    recipes whose lines lost the values of the alias
+    """
+    catalog.invalidate_user(instance.user_id)
+    recipe_ids = instance.__dict__.pop("_rollup_recipes", None)
+    if recipe_ids:
+        jobs.enqueue("refresh_rollups", {"ids": recipe_ids})
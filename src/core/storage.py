@@ -0,0 +1,72 @@
+"""
+static files storage writing precompressed siblings
+
+`collectstatic` writes `<name>.gz` and, with the `brotli` package,
+`<name>.br` next to every text asset, so the web server (nginx
+`gzip_static` / `brotli_static`) or `core.files.serve_file` can send
+them without compressing on every request.
+"""
+
+import gzip
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+
+from core.compression import brotli
+
+DEFAULT_EXTENSIONS = (
+    ".css",
+    ".js",
+    ".mjs",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".html",
+    ".xml",
+    ".ico",
+)
+
+
+class CompressedFilesMixin:
+    """post-process collected files into .gz / .br siblings"""
+
+    def compressors(self):
+        yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            yield ".br", lambda data: brotli.compress(data, quality=11)
+
+    def should_compress(self, name):
+        extensions = getattr(settings, "STATIC_COMPRESS_EXTENSIONS", DEFAULT_EXTENSIONS)
+        return name.lower().endswith(tuple(extensions))
+
+    def compress(self, name):
+        """write the siblings of `name` that are smaller than it"""
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024):
+            return False
+        written = False
+        for ext, compress in self.compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                if self.exists(name + ext):
+                    self.delete(name + ext)
+                self._save(name + ext, ContentFile(compressed))
+                written = True
+        return written
+
+    def post_process(self, paths, dry_run=False, **options):
+        parent = getattr(super(), "post_process", None)
+        if parent is not None:
+            yield from parent(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in paths:
+            if self.should_compress(name) and self.compress(name):
+                yield name, name, True
+
+
+class CompressedStaticFilesStorage(CompressedFilesMixin, StaticFilesStorage):
+    """StaticFilesStorage with precompressed siblings"""
@@ -2,11 +2,23 @@
 tests for the django admin modifications.
 """
 
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.test import Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator
+from core.models import Recipe, Tag, IngredientAlias
+from core.tests.utils import QueryBudgetMixin
+
 class AdminSiteTests(TestCase):
     """Test Admin Site"""
     def setUp(self):
@@ -42,3 +54,128 @@ class AdminSiteTests(TestCase):
         url = reverse("admin:core_user_add")
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+
+
+class AdminChangelistTests(QueryBudgetMixin, TestCase):
+    """Test the changelists of the large tables"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com", password="example123"
+        )
+        self.client.force_login(self.admin_user)
+
+    def create_recipes(self, count):
+        offset = Recipe.objects.count()
+        for i in range(offset, offset + count):
+            user = get_user_model().objects.create_user(email=f"u{i}@example.com")
+            Recipe.objects.create(user=user, title=f"soup {i}", price=1, time_minutes=5)
+
+    def test_changelists_and_search(self):
+        """Test the recipe, tag and ingredient changelists and their search"""
+        self.create_recipes(2)
+        Tag.objects.create(user=self.admin_user, name="vegan")
+        IngredientAlias.objects.add(self.admin_user, "salt")
+        cases = (
+            ("admin:core_recipe_changelist", "soup 1", "soup 1"),
+            ("admin:core_recipe_changelist", "u0@example.com", "soup 0"),
+            ("admin:core_tag_changelist", "veg", "vegan"),
+            ("admin:core_ingredient_changelist", "sa", "salt"),
+            ("admin:core_user_changelist", "u1@", "u1@example.com"),
+        )
+        for url_name, query, expected in cases:
+            with self.subTest(url=url_name, q=query):
+                res = self.client.get(reverse(url_name), {"q": query})
+                self.assertContains(res, expected)
+
+    def test_recipe_changelist_queries_constant(self):
+        """Test owners are joined instead of fetched per row"""
+        self.assertQueriesConstant(
+            self.create_recipes,
+            lambda: self.client.get(reverse("admin:core_recipe_changelist")),
+        )
+
+    def test_estimated_count(self):
+        """Test big unfiltered tables use the estimate, others count"""
+        self.create_recipes(3)
+        paginator = EstimatedCountPaginator(Recipe.objects.all(), 10)
+        with patch.object(paginator, "estimate", return_value=5_000_000):
+            self.assertEqual(paginator.count, 5_000_000)
+
+        paginator = EstimatedCountPaginator(Recipe.objects.all(), 10)
+        with patch.object(paginator, "estimate", return_value=100):
+            self.assertEqual(paginator.count, 3)
+        # not postgres here, no estimate
+        self.assertIsNone(EstimatedCountPaginator(Recipe.objects.all(), 10).estimate())
+
+    def test_estimate_unknown_rows(self):
+        """Test summed partition estimates are used, unanalyzed ones are not"""
+        with patch("core.admin.connections") as connections:
+            connection = connections.__getitem__.return_value
+            connection.vendor = "postgresql"
+            cursor = connection.cursor.return_value.__enter__.return_value
+            paginator = EstimatedCountPaginator(Recipe.objects.all(), 10)
+
+            for row, expected in [
+                ((5_000_000.0, False), 5_000_000),
+                ((5_000_000.0, True), None),
+                ((None, None), None),
+            ]:
+                with self.subTest(row=row):
+                    cursor.fetchone.return_value = row
+                    self.assertEqual(paginator.estimate(), expected)
+
+    def test_recipe_tag_inline(self):
+        """Test tags added inline get the recipe's user"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        tag = Tag.objects.create(user=recipe.user, name="vegan")
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        data = {
+            "user": recipe.user_id,
+            "title": "soup",
+            "price": "1",
+            "time_minutes": "5",
+            "link": "",
+            "description": "",
+            "tag_links-TOTAL_FORMS": "1",
+            "tag_links-INITIAL_FORMS": "0",
+            "tag_links-0-tag": tag.id,
+            "ingredient_links-TOTAL_FORMS": "0",
+            "ingredient_links-INITIAL_FORMS": "0",
+        }
+
+        image = BytesIO()
+        Image.new("RGB", (10, 10)).save(image, format="JPEG")
+        # the admin form requires an image
+        data["image"] = SimpleUploadedFile("a.jpg", image.getvalue())
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            res = self.client.post(url, data)
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(recipe.tag_links.get().user, recipe.user)
+
+    def test_user_recipes_inline_paginated(self):
+        """Test the recipe inline edits one page of recipes"""
+        user = get_user_model().objects.create_user(email="cook@example.com")
+        Recipe.objects.bulk_create(
+            [
+                Recipe(user=user, title=f"recipe {i:02}", price=1, time_minutes=5)
+                for i in range(25)
+            ]
+        )
+        url = reverse("admin:core_user_change", args=[user.id])
+
+        res = self.client.get(url)
+        self.assertContains(res, "recipe 19")
+        self.assertNotContains(res, "recipe 20")
+        self.assertContains(res, "?recipes_page=2")
+
+        res = self.client.get(url, {"recipes_page": 2})
+        self.assertContains(res, "recipe 24")
+        self.assertNotContains(res, "recipe 19")
@@ -0,0 +1,87 @@
+"""
+tests for the expiring token authentication
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+
+ME_URL = reverse("user:me")
+
+
+class ExpiringTokenAuthenticationTests(TestCase):
+    """Test requests authenticated with AuthToken"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="test123"
+        )
+        self.token = AuthToken.objects.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_valid_token_cached(self):
+        """Test later requests authenticate without a query"""
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, 200)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(ctx), 0)
+
+    def test_expired_token_rejected(self):
+        """Test expired tokens fail, also when they are cached"""
+        self.client.get(ME_URL)
+        # the cached expiry is checked on every request
+        cached = cache.get(f"auth-token:{self.token.key}")
+        cache.set(f"auth-token:{self.token.key}", (cached[0], timezone.now()))
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, 401)
+
+        cache.clear()
+        self.token.expires = timezone.now() - timedelta(seconds=1)
+        self.token.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_revoked_token_and_inactive_user(self):
+        """Test deleting a token or deactivating its user takes effect at once"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        self.token.delete()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_issue_reuses_valid_token(self):
+        """Test logins reuse a token until half of its lifetime is left"""
+        self.assertEqual(AuthToken.objects.issue(self.user), self.token)
+
+        self.token.expires = timezone.now() + timedelta(seconds=10)
+        self.token.save()
+        new_token = AuthToken.objects.issue(self.user)
+
+        self.assertNotEqual(new_token, self.token)
+        self.assertFalse(new_token.is_expired)
@@ -0,0 +1,149 @@
+"""
+tests for the ingredient catalog and its in-process name cache
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from core.catalog import IngredientCatalog
+from core.checks import check_shared_caches
+from core.models import Ingredient, IngredientAlias, normalize_name
+
+
+class CatalogTests(TestCase):
+    """test ingredient names resolve through the catalog"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="catalog@example.com", password="test123"
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@example.com", password="test123"
+        )
+        self.catalog = IngredientCatalog()
+
+    def test_normalized_names_are_unique(self):
+        """test names are case folded and the catalog has each name once"""
+        salt = Ingredient.objects.create(name="  Sea   SALT ")
+        (pepper,) = Ingredient.objects.bulk_create([Ingredient(name="Black Pepper")])
+
+        self.assertEqual(salt.normalized_name, "sea salt")
+        self.assertEqual(pepper.normalized_name, normalize_name("black  pepper"))
+        with self.assertRaises(IntegrityError):
+            Ingredient.objects.create(name="sea salt")
+
+    def test_aliases_share_catalog_rows(self):
+        """test users adding a name get their own alias of one catalog row"""
+        mine = IngredientAlias.objects.add(self.user, "Salt", unit_cost=1)
+        theirs = IngredientAlias.objects.add(self.other, "salt ", unit_cost=2)
+
+        self.assertEqual(mine.ingredient_id, theirs.ingredient_id)
+        self.assertEqual(IngredientAlias.objects.add(self.user, "SALT"), mine)
+        self.assertEqual(Ingredient.objects.get().name, "Salt")
+        self.assertEqual(
+            sorted(IngredientAlias.objects.values_list("name", "unit_cost")),
+            [("Salt", 1), ("salt ", 2)],
+        )
+
+    def test_resolve_learns_committed_names(self):
+        """test names are served from memory once their transaction commits"""
+        salt = Ingredient.objects.create(name="salt")
+
+        # not committed yet, nothing is kept
+        self.assertEqual(
+            self.catalog.resolve(self.user.id, ["salt"]), {"salt": salt.pk}
+        )
+        with self.assertNumQueries(1):
+            self.catalog.resolve(self.user.id, ["salt"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog.resolve(self.user.id, ["salt", "sugar"])
+        with self.assertNumQueries(0):
+            found = self.catalog.resolve(self.user.id, ["salt"])
+        self.assertEqual(found, {"salt": salt.pk})
+
+    def test_aliases_resolve_for_their_user(self):
+        """test a user's alias wins over the catalog name"""
+        eggplant = Ingredient.objects.create(name="eggplant")
+        aubergine = Ingredient.objects.create(name="aubergine")
+        IngredientAlias.objects.create(
+            user=self.other, ingredient=eggplant, name="Aubergine"
+        )
+        aliased = set()
+
+        self.assertEqual(
+            self.catalog.resolve(self.other.id, ["aubergine"], aliased),
+            {"aubergine": eggplant.pk},
+        )
+        self.assertEqual(aliased, {"aubergine"})
+        self.assertEqual(
+            self.catalog.resolve(self.user.id, ["aubergine"]),
+            {"aubergine": aubergine.pk},
+        )
+
+    def test_warm_and_invalidate(self):
+        """test alias renames make every process forget the user's names"""
+        salt = IngredientAlias.objects.add(self.user, "salt")
+        other_process = IngredientCatalog()
+        self.assertEqual(self.catalog.warm(), 2)
+        other_process.warm()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            salt.name = "sea salt"
+            salt.save()
+
+        with self.assertNumQueries(1):
+            found = other_process.resolve(self.user.id, ["salt", "sea salt"])
+        self.assertEqual(
+            found, {"salt": salt.ingredient_id, "sea salt": salt.ingredient_id}
+        )
+
+    def test_renames_keep_other_users_names(self):
+        """test a rename only empties the catalog of its user"""
+        mine = IngredientAlias.objects.add(self.user, "salt")
+        IngredientAlias.objects.add(self.other, "pepper")
+        other_process = IngredientCatalog()
+        other_process.warm()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mine.name = "sea salt"
+            mine.save()
+            IngredientAlias.objects.add(self.user, "sugar").delete()
+
+        with self.assertNumQueries(0):
+            aliased = set()
+            found = other_process.resolve(self.other.id, ["pepper", "salt"], aliased)
+        self.assertEqual(aliased, {"pepper"})
+        self.assertEqual(set(found), {"pepper", "salt"})
+        with self.assertNumQueries(1):
+            aliased = set()
+            other_process.resolve(self.user.id, ["salt", "sea salt"], aliased)
+        self.assertEqual(aliased, {"sea salt"})
+
+
+class CatalogCacheCheckTests(TestCase):
+    """test the catalog generation needs a cache shared by the workers"""
+
+    @override_settings(WEB_CONCURRENCY=2)
+    def test_local_cache_with_workers(self):
+        """test the deploy check fails when workers would miss others' renames"""
+        errors = check_shared_caches()
+
+        self.assertEqual([error.id for error in errors], ["core.E002"])
+        self.assertIn("INGREDIENT_CATALOG_CACHE", errors[0].msg)
+
+    @override_settings(
+        WEB_CONCURRENCY=2,
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "shared": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": "/tmp/catalog-check-cache",
+            },
+        },
+        INGREDIENT_CATALOG_CACHE="shared",
+    )
+    def test_shared_cache_with_workers(self):
+        """test a cache shared between processes passes"""
+        self.assertEqual(check_shared_caches(), [])
@@ -1,25 +1,178 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import AuthToken, Recipe
 
 
 class CommandTests(TestCase):
 
-    def test_wait_for_db_ready(self):
+    @patch('core.health.pending_migrations', return_value=[])
+    @patch('core.health.probe_database')
+    def test_wait_for_db_ready(self, probe, pending):
         """Test waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        call_command('wait_for_db', stdout=StringIO())
+        self.assertEqual(probe.call_count, 1)
+        pending.assert_called_once()
 
     @patch('time.sleep', return_value=True)
-    def test_wait_for_db(self, ts):
+    @patch('core.health.pending_migrations', return_value=[])
+    @patch('core.health.probe_database')
+    def test_wait_for_db(self, probe, pending, ts):
         """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        probe.side_effect = [OperationalError] * 5 + [None]
+        call_command('wait_for_db', stdout=StringIO())
+        self.assertEqual(probe.call_count, 6)
+        # backoff with jitter, never longer than max delay
+        delays = [c.args[0] for c in ts.call_args_list]
+        self.assertEqual(len(delays), 5)
+        self.assertTrue(all(0 <= d <= 5 for d in delays))
+
+    @patch('time.sleep', return_value=True)
+    @patch('core.health.probe_database', side_effect=OperationalError)
+    def test_wait_for_db_timeout(self, probe, ts):
+        """Test giving up once the timeout is reached"""
+        with patch('time.monotonic', side_effect=range(0, 1000, 10)):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=30, stdout=StringIO())
+
+    @patch('time.sleep', return_value=True)
+    @patch('core.health.probe_database')
+    def test_wait_for_migrations(self, probe, ts):
+        """Test waiting until pending migrations are applied"""
+        with patch('core.health.pending_migrations') as pending:
+            pending.side_effect = [['core.0099_new']] * 2 + [[]]
+            call_command(
+                'wait_for_db',
+                wait_for_migrations=True,
+                stdout=StringIO(),
+            )
+            self.assertEqual(pending.call_count, 3)
+
+    def test_wait_for_db_real_connection(self):
+        """Test the probes run against the test database"""
+        out = StringIO()
+        call_command('wait_for_db', stdout=out)
+        self.assertIn('Database available!', out.getvalue())
+
+    def test_partition_recipes_needs_postgres(self):
+        """Test partitioning is refused on other databases"""
+        with self.assertRaisesMessage(CommandError, 'needs postgres'):
+            call_command('partition_recipes', stdout=StringIO())
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the seed_data and benchmark commands"""
+
+    def test_seed_data(self):
+        """Test seeding users, recipes and their links"""
+        out = StringIO()
+        call_command(
+            "seed_data",
+            users=2,
+            recipes=5,
+            tags=3,
+            ingredients=4,
+            per_recipe=2,
+            stdout=out,
+        )
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertEqual(Recipe.objects.count(), 10)
+        self.assertEqual(Recipe.tags.through.objects.count(), 20)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 20)
+        self.assertIn("Seeded 2 users", out.getvalue())
+
+    def test_benchmark_in_process_with_baseline(self):
+        """Test scenarios report percentiles and baselines can be diffed"""
+        call_command("seed_data", users=1, recipes=5, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            out = StringIO()
+            call_command(
+                "benchmark", requests=3, warmup=1, save_baseline=baseline, stdout=out
+            )
+            with open(baseline) as f:
+                results = json.load(f)["results"]
+
+            scenarios = (
+                "list",
+                "list-filtered",
+                "detail",
+                "create",
+                "upload-image",
+                "login",
+            )
+            for name in scenarios:
+                self.assertEqual(results[name]["requests"], 3)
+                self.assertEqual(results[name]["errors"], 0)
+                self.assertIsNotNone(results[name]["p99_ms"])
+                self.assertGreater(results[name]["queries_per_request"], 0)
+            # created recipes, uploads and login users are cleaned up
+            self.assertEqual(Recipe.objects.count(), 5)
+            self.assertEqual(get_user_model().objects.count(), 1)
+
+            for result in results.values():
+                result["p50_ms"] /= 1000
+            with open(baseline, "w") as f:
+                json.dump({"results": results}, f)
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command(
+                    "benchmark",
+                    requests=3,
+                    scenario=["list"],
+                    compare=baseline,
+                    fail_on_regression=True,
+                    stdout=out,
+                )
+            self.assertIn("list p50_ms", out.getvalue())
+
+    def test_benchmark_outside_test_hosts(self):
+        """Test requests use a host of ALLOWED_HOSTS, not `testserver`"""
+        call_command("seed_data", users=1, recipes=2, stdout=StringIO())
+        out = StringIO()
+        with override_settings(ALLOWED_HOSTS=[".api.example.com"], DEBUG=False):
+            call_command("benchmark", requests=2, scenario=["list"], stdout=out)
+        self.assertIn("errors=0", out.getvalue())
+
+    def test_benchmark_fails_on_errors(self):
+        """Test error responses make the results invalid"""
+        call_command("seed_data", users=1, recipes=2, stdout=StringIO())
+        out = StringIO()
+        with override_settings(ALLOWED_HOSTS=[], DEBUG=False):
+            with self.assertRaisesMessage(CommandError, "not valid: list 2"):
+                call_command("benchmark", requests=2, scenario=["list"], stdout=out)
+        self.assertIn("errors=2", out.getvalue())
+
+
+class PurgeTokensCommandTests(TestCase):
+    """Test the purge_tokens command"""
+
+    def test_purge_expired_tokens(self):
+        """Test expired tokens are deleted in batches and valid ones kept"""
+        user = get_user_model().objects.create_user(email="user@example.com")
+        now = timezone.now()
+        AuthToken.objects.bulk_create(
+            [
+                AuthToken(key=f"old{i}", user=user, expires=now - timedelta(hours=i))
+                for i in range(5)
+            ]
+            + [AuthToken(key="valid", user=user, expires=now + timedelta(hours=1))]
+        )
+        out = StringIO()
 
+        call_command("purge_tokens", batch_size=2, stdout=out)
 
+        keys = AuthToken.objects.values_list("key", flat=True)
+        self.assertEqual(list(keys), ["valid"])
+        self.assertIn("Deleted 5 expired tokens", out.getvalue())
@@ -0,0 +1,150 @@
+"""
+tests for response compression and precompressed static files
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import zlib
+from unittest import skipIf
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.compression import (
+    CompressionMiddleware,
+    brotli,
+    choose_encoding,
+)
+from core.storage import CompressedStaticFilesStorage
+
+BODY = json.dumps([{"title": f"recipe {i}", "price": "5.00"} for i in range(200)])
+
+
+def respond(response, accept_encoding="gzip"):
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+class NegotiationTests(SimpleTestCase):
+    """Test picking the encoding from Accept-Encoding"""
+
+    def test_choose_encoding(self):
+        """Test q-values, wildcards and the server preference"""
+        both = ("br", "gzip")
+        self.assertEqual(choose_encoding("gzip, deflate, br", both), "br")
+        self.assertEqual(choose_encoding("br;q=0.5, gzip", both), "gzip")
+        self.assertEqual(choose_encoding("gzip;q=0, *", both), "br")
+        self.assertEqual(choose_encoding("br;q=0, gzip;q=0", both), None)
+        self.assertEqual(choose_encoding("identity", both), None)
+        self.assertEqual(choose_encoding("gzip;q=oops, br", ("gzip",)), None)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test the compression middleware"""
+
+    def test_gzip_json(self):
+        """Test a large json response is gzipped with a weak ETag"""
+        response = HttpResponse(BODY, content_type="application/json")
+        response["ETag"] = '"abc"'
+
+        res = respond(response)
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(res.content).decode(), BODY)
+        self.assertEqual(res["Content-Length"], str(len(res.content)))
+        self.assertEqual(res["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        """Test brotli is preferred when available"""
+        res = respond(HttpResponse(BODY, content_type="application/json"), "gzip, br")
+
+        self.assertEqual(res["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(res.content).decode(), BODY)
+
+    def test_skipped(self):
+        """Test small, binary and already encoded responses are left alone"""
+        small = HttpResponse("{}", content_type="application/json")
+        image = HttpResponse(b"x" * 5000, content_type="image/png")
+        encoded = HttpResponse(BODY, content_type="application/json")
+        encoded["Content-Encoding"] = "br"
+
+        for response in (small, image, encoded):
+            res = respond(response)
+            self.assertNotEqual(res.get("Content-Encoding"), "gzip")
+
+    def test_not_accepted(self):
+        """Test clients without gzip get the plain body and Vary"""
+        res = respond(HttpResponse(BODY, content_type="application/json"), "")
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertEqual(res.content.decode(), BODY)
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    def test_streaming(self):
+        """Test streaming responses are compressed chunk by chunk"""
+        chunks = [BODY[:5000], BODY[5000:]]
+        response = StreamingHttpResponse(chunks, content_type="text/csv")
+        response["Content-Length"] = str(len(BODY))
+
+        res = respond(response)
+        parts = list(res.streaming_content)
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertFalse(res.has_header("Content-Length"))
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(gzip.decompress(b"".join(parts)).decode(), BODY)
+
+    def test_streaming_flushes_chunks(self):
+        """Test each chunk can be decompressed before the next one is sent"""
+
+        def chunks():
+            yield "first chunk"
+            raise AssertionError("read past the first chunk")
+
+        res = respond(StreamingHttpResponse(chunks(), content_type="text/csv"))
+        first = next(iter(res.streaming_content))
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(first), b"first chunk")
+
+
+class CompressedStaticFilesStorageTests(SimpleTestCase):
+    """Test collectstatic post-processing"""
+
+    def test_siblings(self):
+        """Test text assets get a .gz sibling, small and binary files do not"""
+        with tempfile.TemporaryDirectory() as root:
+            storage = CompressedStaticFilesStorage(location=root)
+            files = {
+                "app.js": BODY.encode(),
+                "tiny.css": b"a{}",
+                "logo.png": b"\x89PNG" + os.urandom(4000),
+            }
+            for name, content in files.items():
+                with open(os.path.join(root, name), "wb") as f:
+                    f.write(content)
+
+            processed = list(storage.post_process({name: None for name in files}))
+
+            self.assertEqual(processed, [("app.js", "app.js", True)])
+            with open(os.path.join(root, "app.js.gz"), "rb") as f:
+                self.assertEqual(gzip.decompress(f.read()), files["app.js"])
+            self.assertEqual(
+                sorted(os.listdir(root)),
+                sorted([*files, "app.js.gz"] + (["app.js.br"] if brotli else [])),
+            )
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_dry_run(self):
+        """Test nothing is written on a dry run"""
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "app.js"), "w") as f:
+                f.write(BODY)
+
+            storage = CompressedStaticFilesStorage(location=root)
+            self.assertEqual(list(storage.post_process({"app.js": None}, True)), [])
+            self.assertEqual(os.listdir(root), ["app.js"])
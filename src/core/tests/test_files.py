@@ -0,0 +1,138 @@
+"""
+tests for serving media files
+"""
+
+import gzip
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.files import parse_range
+
+CONTENT = bytes(range(256)) * 40
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Test Range header parsing"""
+
+    def test_ranges(self):
+        """Test first-last, open and suffix ranges"""
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=950-5000", 1000), (950, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+
+    def test_unsatisfiable(self):
+        """Test ranges outside the file raise ValueError"""
+        for header in ("bytes=1000-", "bytes=5-4", "bytes=-0"):
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+
+class MediaViewTests(SimpleTestCase):
+    """Test the media view"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(os.path.join(self.root, "uploads"))
+        with open(os.path.join(self.root, "uploads", "a.jpg"), "wb") as f:
+            f.write(CONTENT)
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = reverse("media", args=["uploads/a.jpg"])
+
+    def get(self, url=None, **headers):
+        res = self.client.get(url or self.url, **headers)
+        res.body = b"".join(res.streaming_content) if res.streaming else res.content
+        return res
+
+    def test_full(self):
+        """Test the whole file with validators and long caching"""
+        res = self.get()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, CONTENT)
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertEqual(res["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertTrue(res["ETag"] and res["Last-Modified"])
+
+    def test_not_modified(self):
+        """Test If-None-Match and If-Modified-Since answer 304"""
+        first = self.get()
+
+        by_etag = self.get(HTTP_IF_NONE_MATCH=first["ETag"])
+        by_date = self.get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_range(self):
+        """Test a byte range is answered with 206"""
+        res = self.get(HTTP_RANGE="bytes=100-199")
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.body, CONTENT[100:200])
+        self.assertEqual(res["Content-Length"], "100")
+        self.assertEqual(res["Content-Range"], f"bytes 100-199/{len(CONTENT)}")
+
+    def test_range_not_satisfiable(self):
+        """Test a range past the end is answered with 416"""
+        res = self.get(HTTP_RANGE=f"bytes={len(CONTENT)}-")
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res["Content-Range"], f"bytes */{len(CONTENT)}")
+
+    def test_if_range_changed(self):
+        """Test a stale If-Range gets the whole file"""
+        res = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, CONTENT)
+
+    def test_missing_and_outside(self):
+        """Test missing files, directories and traversal are 404"""
+        for path in ("uploads/b.jpg", "uploads", "../etc/passwd"):
+            res = self.client.get(reverse("media", args=[path]))
+            self.assertEqual(res.status_code, 404)
+
+    def test_precompressed_sibling(self):
+        """Test a .gz sibling is sent to clients accepting gzip"""
+        with open(os.path.join(self.root, "data.json"), "w") as f:
+            f.write('{"a": 1}')
+        with open(os.path.join(self.root, "data.json.gz"), "wb") as f:
+            f.write(gzip.compress(b'{"a": 1}'))
+        url = reverse("media", args=["data.json"])
+
+        res = self.get(url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertEqual(gzip.decompress(res.body), b'{"a": 1}')
+        self.assertTrue(res["ETag"].startswith("W/"))
+
+    @override_settings(FILES_SENDFILE_HEADER="X-Accel-Redirect")
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx"""
+        res = self.get()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.body, b"")
+        self.assertEqual(res["X-Accel-Redirect"], "/protected-media/uploads/a.jpg")
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+
+    @override_settings(FILES_SENDFILE_HEADER="X-Sendfile")
+    def test_sendfile(self):
+        """Test apache gets the absolute path"""
+        res = self.get()
+
+        self.assertEqual(res["X-Sendfile"], os.path.join(self.root, "uploads", "a.jpg"))
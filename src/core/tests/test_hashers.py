@@ -0,0 +1,120 @@
+"""
+tests for the password hashers and the hashing pool
+"""
+
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import hashers
+
+TOKEN_URL = reverse("user:token")
+
+
+@override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2**10)
+class PasswordHasherTests(TestCase):
+    """Test the tuned hashers and the rehash on login"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_scrypt_cost_from_settings(self):
+        """Test new passwords use scrypt with the configured cost"""
+        user = get_user_model().objects.create_user("user@example.com", "test123")
+
+        self.assertTrue(user.password.startswith("scrypt$1024$"))
+        self.assertTrue(user.check_password("test123"))
+        self.assertFalse(user.check_password("wrong"))
+
+    def test_login_rehashes_outdated_password(self):
+        """Test logging in upgrades pbkdf2 and outdated scrypt hashes"""
+        user = get_user_model().objects.create_user("user@example.com")
+        for old_hash in (
+            make_password("test123", hasher="pbkdf2_sha256"),
+            hashers.ScryptPasswordHasher().encode("test123", "somesalt", n=2**11),
+        ):
+            user.password = old_hash
+            user.save()
+
+            res = self.client.post(
+                TOKEN_URL, {"email": user.email, "password": "test123"}
+            )
+
+            self.assertEqual(res.status_code, 200)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith("scrypt$1024$"))
+            self.assertTrue(user.check_password("test123"))
+
+    def test_wrong_password_not_rehashed(self):
+        """Test a failed login leaves the stored hash alone"""
+        old_hash = make_password("test123", hasher="pbkdf2_sha256")
+        user = get_user_model().objects.create_user("user@example.com")
+        user.password = old_hash
+        user.save()
+
+        res = self.client.post(TOKEN_URL, {"email": user.email, "password": "wrong"})
+
+        self.assertEqual(res.status_code, 400)
+        user.refresh_from_db()
+        self.assertEqual(user.password, old_hash)
+        self.assertEqual(identify_hasher(user.password).algorithm, "pbkdf2_sha256")
+
+    def test_pool_busy_returns_503(self):
+        """Test logins fail fast when the hashing pool is saturated"""
+        get_user_model().objects.create_user("user@example.com", "test123")
+
+        with mock.patch(
+            "core.hashers.verify_password", side_effect=hashers.PasswordHashingBusy
+        ):
+            res = self.client.post(
+                TOKEN_URL, {"email": "user@example.com", "password": "test123"}
+            )
+
+        self.assertEqual(res.status_code, 503)
+
+
+class HashingPoolTests(SimpleTestCase):
+    """Test the bounded hashing pool"""
+
+    def test_runs_on_pool_thread(self):
+        """Test jobs run on the pool threads"""
+        pool = hashers.HashingPool(workers=1, queue=0, timeout=1)
+        self.addCleanup(pool.shutdown)
+
+        name = pool.run(lambda: threading.current_thread().name)
+
+        self.assertTrue(name.startswith("password-hashing"))
+
+    def test_inline_without_workers(self):
+        """Test workers=0 runs jobs on the calling thread"""
+        pool = hashers.HashingPool(workers=0, queue=0, timeout=1)
+
+        self.assertEqual(pool.run(threading.current_thread), threading.current_thread())
+
+    def test_saturated_pool_raises(self):
+        """Test jobs waiting longer than the timeout are rejected"""
+        pool = hashers.HashingPool(workers=1, queue=0, timeout=0.05)
+        self.addCleanup(pool.shutdown)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=pool.run, args=(block,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(hashers.PasswordHashingBusy):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            worker.join()
+        # the slot is released once the job is done
+        self.assertEqual(pool.run(lambda: 1), 1)
@@ -0,0 +1,66 @@
+"""
+tests for the liveness and readiness endpoints
+"""
+
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.health import Readiness, readiness
+
+
+class HealthEndpointTests(TestCase):
+    """Test /healthz and /readyz"""
+
+    def setUp(self):
+        # answer from a fresh state in every test
+        readiness._checked = None
+
+    def test_healthz(self):
+        """Test liveness does not touch the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("healthz"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {"status": "ok"})
+
+    def test_readyz_cached(self):
+        """Test readiness probes the database once per interval"""
+        with patch("core.health.probe_database") as probe:
+            for _ in range(3):
+                res = self.client.get(reverse("readyz"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()["ready"])
+        self.assertEqual(probe.call_count, 1)
+
+    @override_settings(HEALTH_CHECK_INTERVAL=0)
+    def test_readyz_database_down(self):
+        """Test readiness fails while the database is unavailable"""
+        error = OperationalError('could not connect to server "db-1" as user "app"')
+        with patch("core.health.probe_database", side_effect=error):
+            with self.assertLogs("core.health", "WARNING") as logs:
+                res = self.client.get(reverse("readyz"))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()["database"], "unavailable")
+        self.assertNotIn("db-1", res.content.decode())
+        self.assertIn("db-1", logs.output[0])
+
+        res = self.client.get(reverse("readyz"))
+        self.assertEqual(res.status_code, 200)
+
+    def test_pending_migrations(self):
+        """Test readiness waits for migrations and stops checking once applied"""
+        state = Readiness()
+        with patch("core.health.pending_migrations", return_value=["core.0099"]):
+            self.assertFalse(state.check()["ready"])
+            self.assertEqual(state.check()["migrations"], "1 pending")
+
+        with patch("core.health.pending_migrations", return_value=[]) as pending:
+            self.assertTrue(state.check()["ready"])
+            self.assertTrue(state.check()["ready"])
+
+        self.assertEqual(pending.call_count, 1)
@@ -0,0 +1,168 @@
+"""
+tests for Idempotency-Key replay of recipe creation
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import IdempotencyKey, Recipe
+
+VIEWSET_URL = "/api/recipe/recipes/"
+FBV_URL = "/api/recipe/fbv/recipes/"
+
+PAYLOAD = {"title": "Soup", "time_minutes": 10, "price": Decimal("2.50")}
+
+
+class IdempotencyTests(TestCase):
+    """test retried POSTs create one recipe"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="retry@example.com", password="test123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, url=VIEWSET_URL, key="key-1", payload=PAYLOAD):
+        return self.client.post(
+            url, payload, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_response(self):
+        """test a retry gets the first response without creating a recipe"""
+        for url in (VIEWSET_URL, FBV_URL):
+            with self.subTest(url=url):
+                first = self.post(url, key=url)
+                with patch(
+                    "recipe.serializers.RecipeDetailSerializer.create"
+                ) as create:
+                    retry = self.post(url, key=url)
+
+                create.assert_not_called()
+                self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+                self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+                self.assertEqual(retry.json(), first.json())
+                self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_without_key_creates_every_time(self):
+        """test requests without the header are not deduplicated"""
+        self.client.post(VIEWSET_URL, PAYLOAD, format="json")
+        self.client.post(VIEWSET_URL, PAYLOAD, format="json")
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_keys_are_per_user(self):
+        """test another user's key does not replay"""
+        self.post()
+        other = get_user_model().objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+
+        res = self.post()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        """test a key sent with another body is rejected"""
+        self.post()
+
+        res = self.post(payload={**PAYLOAD, "title": "Stew"})
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_request_in_progress(self):
+        """test a retry while the first request runs gets 409"""
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="key-1",
+            request_hash="running",
+            expires=timezone.now() + timedelta(hours=1),
+        )
+        with patch("core.idempotency.request_hash", return_value="running"):
+            res = self.post()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_stale_and_expired_keys_are_taken_over(self):
+        """test keys of dead requests and expired keys run again"""
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="dead",
+            request_hash="dead",
+            created=now - timedelta(hours=1),
+            expires=now + timedelta(hours=1),
+        )
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="expired",
+            request_hash="other",
+            status_code=201,
+            response={},
+            expires=now - timedelta(seconds=1),
+        )
+
+        self.assertEqual(self.post(key="dead").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self.post(key="expired").status_code, status.HTTP_201_CREATED
+        )
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertFalse(
+            IdempotencyKey.objects.filter(status_code__isnull=True).exists()
+        )
+
+    def test_errors_release_the_key(self):
+        """test invalid requests are not stored and can be retried"""
+        res = self.post(payload={"title": "Soup"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+
+    def test_key_too_long(self):
+        """test keys longer than the column are rejected"""
+        res = self.post(key="k" * 256)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class PurgeIdempotencyKeysCommandTests(TestCase):
+    """Test the purge_idempotency_keys command"""
+
+    def test_purge_expired_keys(self):
+        """Test expired keys are deleted and valid ones kept"""
+        user = get_user_model().objects.create_user(email="user@example.com")
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create(
+            [
+                IdempotencyKey(
+                    user=user, key=f"old{i}", expires=now - timedelta(hours=i)
+                )
+                for i in range(3)
+            ]
+            + [IdempotencyKey(user=user, key="valid", expires=now + timedelta(hours=1))]
+        )
+        out = StringIO()
+
+        call_command("purge_idempotency_keys", batch_size=2, stdout=out)
+
+        keys = IdempotencyKey.objects.values_list("key", flat=True)
+        self.assertEqual(list(keys), ["valid"])
+        self.assertIn("Deleted 3 expired keys", out.getvalue())
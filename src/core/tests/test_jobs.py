@@ -0,0 +1,311 @@
+"""
+tests for the background jobs and their admin actions
+"""
+
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs
+from core.models import (
+    AuthToken,
+    Ingredient,
+    IngredientAlias,
+    Job,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+
+def create_content(user, count=3):
+    """create recipes linked to a tag and an ingredient of user"""
+    tag = Tag.objects.create(user=user, name="tag")
+    ingredient = IngredientAlias.objects.add(user, f"ingredient {user.pk}").ingredient
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user, title=f"recipe {i}", price=1, time_minutes=5
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+
+@override_settings(JOBS_BATCH_SIZE=2)
+class JobTests(TestCase):
+    """Test the chunked job handlers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="user@example.com")
+        self.other = get_user_model().objects.create_user(email="other@example.com")
+        create_content(self.user)
+        create_content(self.other, count=1)
+
+    def run_jobs(self):
+        call_command("runworker", burst=True, pool="inline", stdout=StringIO())
+
+    def test_delete_users(self):
+        """Test users are deleted with their content and progress is kept"""
+        AuthToken.objects.issue(self.user)
+        job = jobs.enqueue("delete_users", {"ids": [self.user.id]})
+
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        # 6 recipe links, 3 recipes, a tag, an alias, a token and the user
+        self.assertEqual((job.progress, job.total), (13, 13))
+        self.assertFalse(get_user_model().objects.filter(id=self.user.id).exists())
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 1)
+        # the catalog keeps the ingredient, only the alias is gone
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(IngredientAlias.objects.get().user, self.other)
+
+    def test_delete_recipes(self):
+        """Test only the selected recipes are deleted"""
+        ids = list(Recipe.objects.filter(user=self.user).values_list("id", flat=True))
+        job = jobs.enqueue("delete_recipes", {"ids": ids})
+
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (Job.Status.DONE, 3))
+        self.assertEqual(Recipe.objects.get().user, self.other)
+
+    def test_reassign_content(self):
+        """Test recipes, tags and ingredient aliases move to the target user"""
+        IngredientAlias.objects.add(self.user, "salt", unit_cost=2)
+        IngredientAlias.objects.add(self.other, "salt", unit_cost=1)
+        job = jobs.enqueue(
+            "reassign_content", {"ids": [self.user.id], "to": self.other.id}
+        )
+
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (Job.Status.DONE, 12))
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 4)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertFalse(RecipeTag.objects.filter(user=self.user).exists())
+        self.assertEqual(RecipeIngredient.objects.filter(user=self.other).count(), 4)
+        # the target keeps its own alias of a shared ingredient
+        self.assertFalse(IngredientAlias.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            sorted(
+                IngredientAlias.objects.filter(user=self.other).values_list(
+                    "name", "unit_cost"
+                )
+            ),
+            sorted(
+                [
+                    (f"ingredient {self.other.pk}", None),
+                    (f"ingredient {self.user.pk}", None),
+                    ("salt", 1),
+                ]
+            ),
+        )
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    @override_settings(JOBS_MAX_ATTEMPTS=1)
+    def test_failed_job(self):
+        """Test errors are stored on the job"""
+        job = jobs.enqueue("reassign_content", {"ids": [self.user.id], "to": 0})
+
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn("DoesNotExist", job.error)
+
+
+class JobAdminActionTests(TestCase):
+    """Test admin actions enqueue jobs instead of deleting inline"""
+
+    def setUp(self):
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com", password="example123"
+        )
+        self.client = Client()
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(email="user@example.com")
+        create_content(self.user)
+
+    def test_delete_users_action(self):
+        """Test deleting users queues a job"""
+        res = self.client.post(
+            reverse("admin:core_user_changelist"),
+            {"action": "delete_in_background", "_selected_action": [self.user.id]},
+        )
+
+        self.assertEqual(res.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual(
+            (job.name, job.payload), ("delete_users", {"ids": [self.user.id]})
+        )
+        self.assertEqual(job.created_by, self.admin_user)
+        self.assertTrue(get_user_model().objects.filter(id=self.user.id).exists())
+
+    def test_reassign_action_needs_target(self):
+        """Test reassigning requires an existing target user"""
+        url = reverse("admin:core_user_changelist")
+        data = {"action": "reassign_content", "_selected_action": [self.user.id]}
+
+        self.client.post(url, data)
+        self.assertFalse(Job.objects.exists())
+
+        self.client.post(url, {**data, "target_user": self.admin_user.id})
+        self.assertEqual(Job.objects.get().payload["to"], self.admin_user.id)
+
+    def test_delete_recipes_action_and_job_list(self):
+        """Test deleting recipes queues a job listed with its progress"""
+        ids = list(Recipe.objects.values_list("id", flat=True))
+        self.client.post(
+            reverse("admin:core_recipe_changelist"),
+            {"action": "delete_in_background", "_selected_action": ids},
+        )
+        call_command("runworker", burst=True, pool="inline", stdout=StringIO())
+
+        res = self.client.get(reverse("admin:core_job_changelist"))
+
+        self.assertContains(res, "3 / 3 (100%)")
+        self.assertFalse(Recipe.objects.exists())
+
+
+@jobs.register("test_flaky", queue="test", max_attempts=2)
+def flaky(job):
+    """fails until the payload says otherwise"""
+    if job.payload.get("fail"):
+        raise RuntimeError("flaky")
+    jobs.advance(job, 1)
+
+
+class JobQueueTests(TestCase):
+    """Test claiming, retries and leases"""
+
+    def test_retry_with_backoff(self):
+        """Test failed jobs are retried later until attempts run out"""
+        job = jobs.enqueue("test_flaky", {"fail": True})
+        self.assertEqual((job.queue, job.max_attempts), ("test", 2))
+
+        jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        # not due yet
+        self.assertIsNone(jobs.claim_next())
+
+        Job.objects.update(run_at=timezone.now())
+        jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertIn("RuntimeError: flaky", job.error)
+
+    def test_retry_delay_grows(self):
+        """Test the backoff doubles per attempt"""
+        with override_settings(JOBS_RETRY_BACKOFF=10):
+            delays = [jobs.retry_delay(attempt) for attempt in (1, 2, 3)]
+        for delay, expected in zip(delays, (10, 20, 40)):
+            self.assertGreaterEqual(delay, expected)
+            self.assertLessEqual(delay, expected * 1.1)
+
+    def test_claim_by_queue(self):
+        """Test workers only claim jobs of their queues"""
+        job = jobs.enqueue("test_flaky")
+
+        self.assertIsNone(jobs.claim_next(["default"]))
+        claimed = jobs.claim_next(["test"])
+
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertIsNotNone(claimed.lease_expires)
+        self.assertIsNone(jobs.claim_next(["test"]))
+
+    def test_expired_lease_requeued(self):
+        """Test jobs of a dead worker go back to the queue"""
+        job = jobs.enqueue("test_flaky")
+        jobs.claim_next()
+        Job.objects.update(lease_expires=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(jobs.requeue_expired(), 1)
+        self.assertEqual(jobs.claim_next(), job)
+
+    def test_expired_last_attempt_failed(self):
+        """Test a job whose worker died on its last attempt is not requeued"""
+        job = jobs.enqueue("test_flaky")
+        jobs.claim_next()
+        Job.objects.update(
+            attempts=2, lease_expires=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(jobs.requeue_expired(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIsNotNone(job.finished)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_expired_attempt_outcome_dropped(self):
+        """Test a worker whose lease expired does not overwrite the new attempt"""
+        job = jobs.enqueue("test_flaky")
+        stale = jobs.claim_next()
+        Job.objects.update(lease_expires=timezone.now() - timedelta(seconds=1))
+        jobs.requeue_expired()
+        jobs.claim_next()
+
+        with self.assertLogs("core.jobs", "WARNING"):
+            jobs.run(stale)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.RUNNING, 2))
+        self.assertIsNone(job.finished)
+
+    def test_retry_restarts_progress(self):
+        """Test a retried job counts its progress from zero"""
+        job = jobs.enqueue("test_flaky")
+        jobs.run(jobs.claim_next())
+        Job.objects.update(status=Job.Status.QUEUED)
+
+        job = jobs.run(jobs.claim_next())
+
+        self.assertEqual((job.attempts, job.progress), (2, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.progress, 1)
+
+    def test_queue_concurrency_limit(self):
+        """Test full queues are skipped when claiming"""
+        worker = jobs.Worker(queues={"default": 1, "test": 2}, concurrency=4)
+        worker.running = {mock.Mock(): "default", mock.Mock(): "test"}
+
+        self.assertEqual(worker._free_queues(), ["test"])
+
+
+class JobThreadPoolTests(TestCase):
+    """Test jobs run on the worker thread pool"""
+
+    def test_thread_pool(self):
+        """Test a thread pool worker hands every claimed job to the pool"""
+        queued = [jobs.enqueue("test_flaky") for _ in range(3)]
+        executed = []
+
+        def execute(job_id):
+            # the pool threads would use their own connection, which does
+            # not see the test transaction
+            executed.append((job_id, threading.current_thread().name))
+
+        worker = jobs.Worker(queues={"test": 2}, concurrency=2, pool="thread")
+        with mock.patch("core.jobs.execute", side_effect=execute):
+            processed = worker.run(burst=True, sleep=0.01)
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(
+            sorted(job_id for job_id, _ in executed), [j.id for j in queued]
+        )
+        self.assertTrue(all(name.startswith("job") for _, name in executed))
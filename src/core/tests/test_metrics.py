@@ -0,0 +1,152 @@
+"""
+tests for the metrics registry and the /metrics endpoint
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.metrics import Registry
+
+
+METRICS_URL = reverse("metrics")
+
+
+def build_registry(worker_id):
+    """create a registry with one counter and one histogram"""
+    registry = Registry(worker_id=worker_id)
+    registry.counter("jobs_total", "Jobs.", ("queue",))
+    registry.histogram("job_seconds", "Job time.", buckets=(0.1, 1))
+    return registry
+
+
+class RegistryTests(SimpleTestCase):
+    """Test metrics rendering and merging"""
+
+    def test_render_text_format(self):
+        """test counters and histograms render in the exposition format"""
+        registry = build_registry("a")
+        registry._metrics["jobs_total"].inc(queue='de"fault')
+        registry._metrics["job_seconds"].observe(0.05)
+        registry._metrics["job_seconds"].observe(0.5)
+        registry._metrics["job_seconds"].observe(3)
+
+        text = registry.render()
+
+        self.assertIn("# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{queue="de\\"fault"} 1', text)
+        self.assertIn('job_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('job_seconds_bucket{le="1"} 2', text)
+        self.assertIn('job_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("job_seconds_count 3", text)
+        self.assertIn("job_seconds_sum 3.55", text)
+
+    def test_wrong_labels_raise_error(self):
+        """test observing with unexpected labels fails"""
+        registry = build_registry("a")
+        with self.assertRaises(ValueError):
+            registry._metrics["jobs_total"].inc(view="x")
+
+    def test_workers_merged_through_metrics_dir(self):
+        """test each worker sees the values flushed by the others"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                worker1 = build_registry("1")
+                worker2 = build_registry("2")
+                worker1._metrics["jobs_total"].inc(2, queue="default")
+                worker1._metrics["job_seconds"].observe(0.5)
+                worker2._metrics["jobs_total"].inc(queue="default")
+                worker1.flush(force=True)
+
+                text = worker2.render()
+
+        self.assertIn('jobs_total{queue="default"} 3', text)
+        self.assertIn("job_seconds_count 1", text)
+
+    def test_worker_files_unique_per_process(self):
+        """test a reused pid does not write to the file of an earlier process"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                first = build_registry(None)
+                second = build_registry(None)
+
+                self.assertNotEqual(
+                    first._worker_file(directory), second._worker_file(directory)
+                )
+                self.assertTrue(
+                    os.path.basename(first._worker_file(directory)).startswith(
+                        f"metrics_{os.getpid()}-"
+                    )
+                )
+
+    def test_stale_worker_files_removed(self):
+        """test snapshots of exited processes and of our old pid are pruned"""
+        exited = subprocess.run(
+            [sys.executable, "-c", "import os; print(os.getpid())"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        dead_pid = int(exited.stdout)
+        with tempfile.TemporaryDirectory() as directory:
+            stale = [f"metrics_{dead_pid}-aa.json", f"metrics_{os.getpid()}-bb.json"]
+            for filename in [*stale, "metrics_1-cc.json"]:
+                with open(os.path.join(directory, filename), "w") as f:
+                    json.dump({"jobs_total": [[["default"], 1]]}, f)
+
+            with override_settings(METRICS_DIR=directory):
+                text = build_registry(None).render()
+
+            remaining = os.listdir(directory)
+
+        self.assertIn('jobs_total{queue="default"} 1', text)
+        self.assertEqual(remaining, ["metrics_1-cc.json"])
+
+
+class MetricsEndpointTests(TestCase):
+    """Test the /metrics endpoint"""
+
+    def test_request_metrics_exposed(self):
+        """test api requests are counted by view name, method and status"""
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="test123"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get(reverse("recipe:recipe-list"))
+
+        res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = res.content.decode()
+        self.assertIn(
+            'http_requests_total{view="recipe-list",method="GET",status="200"}', text
+        )
+        self.assertIn(
+            'http_request_db_queries_count{view="recipe-list",method="GET"}', text
+        )
+
+    def test_unknown_methods_grouped(self):
+        """test methods outside the http standard share the "other" label"""
+        client = APIClient()
+        client.generic("FOO123", reverse("recipe:recipe-list"))
+
+        res = client.get(METRICS_URL)
+
+        text = res.content.decode()
+        self.assertIn('method="other"', text)
+        self.assertNotIn("FOO123", text)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_can_be_disabled(self):
+        """test the endpoint is hidden when disabled"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,62 @@
+"""
+tests for the performance instrumentation middleware
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Test request timings are reported"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="test123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        """test db, app, render and total timings are sent"""
+        res = self.client.get(RECIPES_URL)
+
+        timing = res["Server-Timing"]
+        for metric in ("db;dur=", "app;dur=", "render;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1.0, PERFORMANCE_SLOW_REQUEST_MS=None)
+    def test_sampled_request_logged(self):
+        """test sampled requests emit a structured log line"""
+        with self.assertLogs("core.performance", "INFO") as logs:
+            self.client.get(RECIPES_URL)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "recipe:recipe-list")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["response_bytes"], 0)
+        self.assertNotIn("sql", record)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0.0, PERFORMANCE_SLOW_REQUEST_MS=None)
+    def test_unsampled_request_not_logged(self):
+        """test requests outside the sample are not logged"""
+        with self.assertNoLogs("core.performance"):
+            self.client.get(RECIPES_URL)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0.0, PERFORMANCE_SLOW_REQUEST_MS=0)
+    def test_slow_request_dumps_sql(self):
+        """test slow requests are always logged with their sql"""
+        with self.assertLogs("core.performance", "WARNING") as logs:
+            self.client.get(RECIPES_URL)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record["slow"])
+        self.assertEqual(len(record["sql"]), record["db_queries"])
+        self.assertIn("core_recipe", " ".join(q["sql"] for q in record["sql"]))
@@ -4,7 +4,9 @@
 from unittest.mock import patch
 from decimal import Decimal
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 
@@ -71,9 +73,44 @@ class TestCoreModel(TestCase):
         """test create an ingredient"""
         user = create_new_user(email="test@example.com", password="test123")
         
-        ingredient = models.Ingredient.objects.create(user=user, name="ingredient1")
+        alias = models.IngredientAlias.objects.add(user, "Ingredient1", calories=2)
         
-        self.assertEqual(str(ingredient), ingredient.name)
+        self.assertEqual(str(alias.ingredient), "Ingredient1")
+        self.assertEqual(alias.ingredient.normalized_name, "ingredient1")
+        self.assertEqual(alias.calories, 2)
+
+    def test_recipe_links_carry_user(self):
+        """Test tags and ingredients added to a recipe store its user"""
+        user = create_new_user(email="test@example.com", password="test123")
+        other = create_new_user(email="other@example.com", password="test123")
+        recipe = models.Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1")
+        )
+        tag = models.Tag.objects.create(user=user, name="Tag1")
+        # catalog ingredients are shared between users
+        ingredient = models.IngredientAlias.objects.add(other, "salt").ingredient
+
+        recipe.tags.add(tag)
+        recipe.ingredients.set([ingredient])
+
+        self.assertEqual(models.RecipeTag.objects.get().user, user)
+        self.assertEqual(models.RecipeIngredient.objects.get().user, user)
+
+    def test_recipe_links_filter_partition_key(self):
+        """Test reads, prefetches and removals of links filter on the user"""
+        user = create_new_user(email="test@example.com", password="test123")
+        recipe = models.Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1")
+        )
+        recipe.tags.add(models.Tag.objects.create(user=user, name="Tag1"))
+        condition = f'"core_recipe_tags"."user_id" IN ({user.id})'
+
+        self.assertIn(condition, str(recipe.tags.all().query))
+        with CaptureQueriesContext(connection) as queries:
+            list(models.Recipe.objects.prefetch_related("tags"))
+            recipe.tags.clear()
+        self.assertIn(condition, queries[1]["sql"])
+        self.assertIn(f'"core_recipe_tags"."user_id" = {user.id}', queries[-1]["sql"])
 
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name(self, mock_uuid):
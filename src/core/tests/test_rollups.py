@@ -0,0 +1,118 @@
+"""
+tests for the cost and nutrient totals of recipes
+"""
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import jobs
+from core.models import IngredientAlias, Job, Recipe, RecipeIngredient
+
+
+class RollupTests(TestCase):
+    """test recipe totals follow their lines and the values of the aliases"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="rollup@example.com", password="test123"
+        )
+        self.flour = IngredientAlias.objects.add(
+            self.user, "flour", unit_cost=Decimal("0.002"), calories=3
+        )
+        self.egg = IngredientAlias.objects.add(
+            self.user, "egg", unit_cost=Decimal("0.25"), protein=6
+        )
+        self.recipe = self.create_recipe()
+
+    def create_recipe(self, title="cake"):
+        recipe = Recipe.objects.create(
+            user=self.user, title=title, price=5, time_minutes=30
+        )
+        recipe.ingredients.add_links(
+            [
+                RecipeIngredient(
+                    ingredient=self.flour.ingredient, quantity=500, unit="g"
+                ),
+                RecipeIngredient(ingredient=self.egg.ingredient, quantity=None),
+            ]
+        )
+        return recipe
+
+    def assertTotals(self, recipe, cost, calories, protein):
+        for obj in (recipe, Recipe.objects.get(pk=recipe.pk)):
+            self.assertEqual(obj.ingredient_cost, Decimal(cost))
+            self.assertEqual(obj.calories, Decimal(calories))
+            self.assertEqual(obj.protein, Decimal(protein))
+
+    def test_lines_change_totals(self):
+        """test adding, removing and clearing lines update the totals"""
+        self.assertTotals(self.recipe, "1.25", "1500", "6")
+
+        self.recipe.ingredients.remove(self.flour.ingredient)
+        self.assertTotals(self.recipe, "0.25", "0", "6")
+
+        self.recipe.ingredients.clear()
+        self.assertTotals(self.recipe, "0", "0", "0")
+
+    def test_ingredient_change_queues_refresh(self):
+        """test changed alias values refresh the user's recipes in a job"""
+        other = self.create_recipe("bread")
+        # the refreshes queued by the new aliases of setUp
+        Job.objects.all().delete()
+        self.flour.name = "wheat flour"
+        self.flour.save()
+        self.assertFalse(Job.objects.exists())
+
+        flour = IngredientAlias.objects.get(pk=self.flour.pk)
+        flour.unit_cost = Decimal("0.004")
+        flour.save()
+
+        job = jobs.claim_next()
+        self.assertEqual(
+            job.payload, {"ingredient": flour.ingredient_id, "user": self.user.pk}
+        )
+        jobs.run(job)
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.total, 2)
+        other.refresh_from_db()
+        self.assertTotals(other, "2.25", "1500", "6")
+
+    def test_ingredient_delete_queues_refresh(self):
+        """test deleting an alias with values refreshes its recipes"""
+        self.egg.delete()
+
+        jobs.run(jobs.claim_next())
+        self.recipe.refresh_from_db()
+        self.assertTotals(self.recipe, "1", "1500", "0")
+
+    def test_rebuild_command(self):
+        """test the command recomputes the totals of every recipe"""
+        other = self.create_recipe("bread")
+        Recipe.objects.update(ingredient_cost=0, calories=0, protein=0)
+
+        out = StringIO()
+        call_command("rebuild_rollups", "--batch-size", "1", stdout=out)
+
+        self.assertIn("2 recipes", out.getvalue())
+        for recipe in (self.recipe, other):
+            self.assertTotals(recipe, "1.25", "1500", "6")
+
+    def test_values_are_per_user(self):
+        """test recipes add up the values of their user's aliases only"""
+        other_user = get_user_model().objects.create_user(
+            email="other@example.com", password="test123"
+        )
+        IngredientAlias.objects.add(other_user, "flour", unit_cost=1, calories=9)
+        recipe = Recipe.objects.create(
+            user=other_user, title="bread", price=5, time_minutes=30
+        )
+        recipe.ingredients.add_links(
+            [RecipeIngredient(ingredient=self.flour.ingredient, quantity=2)]
+        )
+
+        self.assertTotals(recipe, "2", "18", "0")
+        self.assertTotals(self.recipe, "1.25", "1500", "6")
@@ -0,0 +1,140 @@
+"""
+tests for read replica routing, with a separate database as the replica
+"""
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import SystemCheckError
+from django.db import router, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.checks import check_shared_caches, fail_on_cache_errors
+from core.models import AuthToken, Tag
+from core.routers import replica_reads
+
+TAGS_URL = reverse("recipe:tag-list")
+ME_URL = reverse("user:me")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    """Test reads go to the replica unless the client just wrote"""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="test123"
+        )
+        self.token = AuthToken.objects.issue(self.user)
+        # replicated rows
+        self.user.save(using="replica", force_insert=True)
+        self.token.save(using="replica", force_insert=True)
+        # replication lag: each database has its own tag
+        Tag.objects.create(user=self.user, name="primary")
+        Tag.objects.using("replica").create(user=self.user, name="replica")
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tag_names(self, client=None):
+        res = (client or self.client).get(TAGS_URL)
+        self.assertEqual(res.status_code, 200)
+        return [tag["name"] for tag in res.data]
+
+    def test_get_reads_replica(self):
+        """Test GET requests read from the replica"""
+        with self.assertNumQueries(0, using="default"):
+            self.assertEqual(self.tag_names(), ["replica"])
+
+    def test_write_pins_primary(self):
+        """Test a client reads its own writes until the pin expires"""
+        res = self.client.post(TAGS_URL, {"name": "new"})
+        self.assertEqual(res.status_code, 201)
+
+        self.assertEqual(sorted(self.tag_names()), ["new", "primary"])
+
+        cache.clear()
+        self.assertEqual(self.tag_names(), ["replica"])
+
+    def test_pin_per_client(self):
+        """Test other clients keep reading from the replica"""
+        other = APIClient()
+        other.force_authenticate(self.user)
+        other.credentials(HTTP_AUTHORIZATION="Token other")
+
+        self.client.post(TAGS_URL, {"name": "new"})
+
+        self.assertEqual(self.tag_names(other), ["replica"])
+
+    def test_new_token_falls_back_to_primary(self):
+        """Test a token not replicated yet is found on the primary"""
+        AuthToken.objects.filter(user=self.user).delete()
+        token = AuthToken.objects.issue(self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        res = client.get(ME_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_router(self):
+        """Test writes, transactions and code outside requests use the primary"""
+        self.assertEqual(router.db_for_read(Tag), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Tag), "replica")
+            self.assertEqual(router.db_for_write(Tag), "default")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Tag), "default")
+
+        tag = Tag.objects.using("replica").get(name="replica")
+        self.assertEqual(router.db_for_write(Tag, instance=tag), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica1", "replica2", "replica3"])
+    def test_one_replica_per_block(self):
+        """Test the replica is chosen once, not for every query"""
+        with replica_reads():
+            chosen = {router.db_for_read(Tag) for _ in range(30)}
+
+        self.assertEqual(len(chosen), 1)
+
+
+class NoReplicaTests(TestCase):
+    """Test nothing changes without replicas"""
+
+    def test_reads_primary(self):
+        """Test replica reads fall back to the primary"""
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Tag), "default")
+
+
+class SharedPinCacheTests(TestCase):
+    """Test the pins need a shared cache with several workers"""
+
+    @override_settings(DATABASE_REPLICAS=["replica"], WEB_CONCURRENCY=4)
+    def test_local_cache_with_workers(self):
+        """Test the deploy check and the web workers fail with a local cache"""
+        errors = {error.id: error for error in check_shared_caches()}
+
+        self.assertIn("REPLICA_PIN_CACHE", errors["core.E001"].msg)
+        with self.assertRaisesMessage(SystemCheckError, "core.E001"):
+            fail_on_cache_errors()
+
+    @override_settings(DATABASE_REPLICAS=["replica"], WEB_CONCURRENCY=4)
+    def test_commands_still_run(self):
+        """Test only deploy checks report it, other commands are not blocked"""
+        call_command("check", stdout=StringIO())
+        with self.assertRaisesMessage(SystemCheckError, "core.E001"):
+            call_command("check", "--deploy", stdout=StringIO())
+
+    @override_settings(DATABASE_REPLICAS=["replica"], WEB_CONCURRENCY=1)
+    def test_local_cache_with_one_worker(self):
+        """Test a single worker can keep the pins in memory"""
+        self.assertEqual(check_shared_caches(), [])
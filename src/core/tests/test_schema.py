@@ -0,0 +1,111 @@
+"""
+tests for the committed OpenAPI schema and its endpoint
+"""
+
+import gzip
+import json
+
+import yaml
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core.schema import generate_schema, render_schema, schema_cache
+
+OUT_OF_DATE = "project/openapi.yml is out of date, run `python manage.py update_schema`"
+
+
+def _outline(schema):
+    """the operations and component fields, independent of the db backend"""
+    return {
+        "paths": {path: sorted(ops) for path, ops in schema["paths"].items()},
+        "components": {
+            name: sorted(component.get("properties", {}))
+            for name, component in schema["components"]["schemas"].items()
+        },
+    }
+
+
+class SchemaDriftTests(SimpleTestCase):
+    """Test the committed schema matches the code"""
+
+    def test_schema_up_to_date(self):
+        """Test regenerating the schema gives the committed file"""
+        committed = settings.SCHEMA_FILE.read_bytes()
+
+        if connection.vendor == "postgresql":
+            self.assertEqual(render_schema(), committed, OUT_OF_DATE)
+        else:
+            # integer ranges in the file depend on postgres
+            self.assertEqual(
+                _outline(generate_schema()),
+                _outline(yaml.safe_load(committed)),
+                OUT_OF_DATE,
+            )
+
+
+class SchemaViewTests(SimpleTestCase):
+    """Test serving the schema from memory"""
+
+    def setUp(self):
+        schema_cache.clear()
+        self.addCleanup(schema_cache.clear)
+        self.url = reverse("schema")
+
+    def test_yaml_default(self):
+        """Test the committed yaml is served with an ETag"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, settings.SCHEMA_FILE.read_bytes())
+        self.assertEqual(res["Content-Type"], "application/vnd.oai.openapi")
+        self.assertTrue(res["ETag"])
+        self.assertIn("public", res["Cache-Control"])
+
+    def test_json(self):
+        """Test json is picked by format and by Accept"""
+        by_format = self.client.get(self.url, {"format": "json"})
+        by_accept = self.client.get(self.url, HTTP_ACCEPT="application/json")
+
+        self.assertEqual(by_format.content, by_accept.content)
+        self.assertEqual(
+            json.loads(by_format.content),
+            yaml.safe_load(settings.SCHEMA_FILE.read_bytes()),
+        )
+
+    def test_gzip(self):
+        """Test gzip is sent when accepted"""
+        res = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(
+            gzip.decompress(res.content), settings.SCHEMA_FILE.read_bytes()
+        )
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    def test_gzip_refused(self):
+        """Test gzip is not sent when refused or only named in other tokens"""
+        for accept_encoding in ("gzip;q=0, identity", "x-gzip-foo"):
+            with self.subTest(accept_encoding=accept_encoding):
+                res = self.client.get(self.url, HTTP_ACCEPT_ENCODING=accept_encoding)
+
+                self.assertNotIn("Content-Encoding", res)
+                self.assertEqual(res.content, settings.SCHEMA_FILE.read_bytes())
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304"""
+        etag = self.client.get(self.url)["ETag"]
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b"")
+
+    def test_generated_when_missing(self):
+        """Test the schema is generated when the file is missing"""
+        with self.settings(SCHEMA_FILE=settings.BASE_DIR / "missing.yml"):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b"/api/recipe/recipes/", res.content)
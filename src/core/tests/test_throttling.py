@@ -0,0 +1,109 @@
+"""
+tests for the token bucket throttle
+"""
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core import throttling
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+RATES = {"read": "3/min", "write": "2/min", "upload": "1/min"}
+
+
+class BucketStoreTests(SimpleTestCase):
+    """Test the in-process token buckets"""
+
+    def test_consume_and_refill(self):
+        """Test tokens run out and come back at the refill rate"""
+        store = throttling.BucketStore()
+
+        waits = [store.consume("key", 2, 1.0, now=100.0) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 1.0)
+        self.assertEqual(store.consume("key", 2, 1.0, now=101.0), 0)
+
+    def test_prune_idle_buckets(self):
+        """Test idle buckets are dropped when the store is full"""
+        store = throttling.BucketStore(max_buckets=2)
+        store.consume("a", 1, 1.0, now=0.0)
+        store.consume("b", 1, 1.0, now=throttling.IDLE_SECONDS + 1)
+
+        store.consume("c", 1, 1.0, now=throttling.IDLE_SECONDS + 2)
+
+        self.assertEqual(sorted(store._buckets), ["b", "c"])
+
+    @override_settings(
+        THROTTLE_CACHE="default",
+        THROTTLE_SYNC_INTERVAL=0,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "throttle-tests",
+            }
+        },
+    )
+    def test_cache_sync(self):
+        """Test processes take the tokens used by the others off their bucket"""
+        caches["default"].clear()
+        worker_a, worker_b = throttling.BucketStore(), throttling.BucketStore()
+
+        # tokens spent reach the other process with the next sync
+        for worker in (worker_a, worker_b, worker_a, worker_b):
+            self.assertEqual(worker.consume("key", 3, 0.001, now=1.0), 0)
+
+        self.assertGreater(worker_a.consume("key", 3, 0.001, now=1.0), 0)
+        self.assertGreater(worker_b.consume("key", 3, 0.001, now=1.0), 0)
+
+
+@override_settings(THROTTLE_ENABLED=True)
+@mock.patch.object(api_settings, "DEFAULT_THROTTLE_RATES", RATES)
+class ThrottleApiTests(TestCase):
+    """Test requests over the rate are rejected"""
+
+    def setUp(self):
+        throttling.store.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="test123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_read_limit_retry_after(self):
+        """Test reads over the limit get 429 with Retry-After"""
+        for _ in range(3):
+            self.assertEqual(self.client.get(RECIPES_URL).status_code, 200)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res["Retry-After"], "20")
+
+    def test_scopes_are_separate(self):
+        """Test writes and uploads have their own buckets"""
+        for _ in range(3):
+            self.client.get(RECIPES_URL)
+        # reads used up do not throttle writes
+        self.assertEqual(self.client.post(RECIPES_URL, {}).status_code, 400)
+
+        url = reverse("recipe:recipe-upload-image", args=[1])
+        self.assertEqual(self.client.post(url, {}).status_code, 404)
+        self.assertEqual(self.client.post(url, {}).status_code, 429)
+
+    def test_users_are_separate(self):
+        """Test one user using up the limit does not throttle another"""
+        for _ in range(4):
+            self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, 200)
@@ -0,0 +1,74 @@
+"""
+tests for the worker warm-up and the import profile command
+"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import warmup
+from core.management.commands.profile_imports import parse_importtime
+
+
+class WarmupTests(TestCase):
+    """Test the warm-up steps"""
+
+    def test_warm_up(self):
+        """Test every step runs and the database connection is open"""
+        timings = warmup.warm_up()
+
+        self.assertEqual(
+            list(timings), ["urls", "serializers", "schema", "catalog", "database"]
+        )
+        self.assertIsNotNone(connection.connection)
+
+    def test_steps(self):
+        """Test the url patterns and serializers of the apps are found"""
+        self.assertGreater(warmup.compile_urls(), 20)
+        names = {cls.__name__ for cls in warmup._serializer_classes()}
+        self.assertTrue(
+            {"RecipeSerializer", "RecipeDetailSerializer", "UserSerializer"} <= names
+        )
+
+    def test_serializers_without_errors(self):
+        """Test list serializers and bases are skipped instead of failing"""
+        with self.assertNoLogs("core.warmup", level="ERROR"):
+            count = warmup.build_serializers()
+
+        names = {cls.__name__ for cls in warmup._serializer_classes()}
+        self.assertEqual(count, len(names))
+        self.assertNotIn("LineIngredientsSerializer", names)
+
+    @override_settings(WARMUP_ENABLED=False)
+    def test_disabled(self):
+        """Test WARMUP_ENABLED turns the wsgi warm-up off"""
+        self.assertEqual(warmup.warm_up_on_load(), {})
+
+
+class ProfileImportsTests(SimpleTestCase):
+    """Test the profile_imports command"""
+
+    def test_parse_importtime(self):
+        """Test -X importtime lines are parsed with their nesting"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     json.decoder\n"
+            "import time:      1500 |       1620 |   json\n"
+            "some other stderr line\n"
+        )
+
+        self.assertEqual(
+            parse_importtime(output),
+            [("json.decoder", 0.12, 0.12, 2), ("json", 1.5, 1.62, 1)],
+        )
+
+    def test_report(self):
+        """Test the report lists modules and the warm-up steps"""
+        out = StringIO()
+
+        call_command("profile_imports", top=5, stdout=out)
+
+        self.assertIn("modules imported in", out.getvalue())
+        self.assertIn("django.setup", out.getvalue())
+        self.assertIn("serializers", out.getvalue())
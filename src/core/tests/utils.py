@@ -0,0 +1,62 @@
+"""
+shared helpers for the test suites of all apps
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting the number of sql queries of a request,
+    use `assertQueryBudget` for a fixed budget and `assertQueriesConstant`
+    to fail when the query count grows with the number of rows
+    """
+
+    ROW_SCALES = (1, 10, 100)
+
+    def count_queries(self, request):
+        """call request() and return (response, number of queries)"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = request()
+        return res, ctx
+
+    def _queries_message(self, ctx):
+        return "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(ctx.captured_queries, 1)
+        )
+
+    def assertQueryBudget(self, budget, request):
+        """assert request() runs at most `budget` queries and succeeds"""
+        res, ctx = self.count_queries(request)
+        self.assertLess(res.status_code, 400, getattr(res, "data", res))
+        self.assertLessEqual(
+            len(ctx),
+            budget,
+            f"{len(ctx)} queries, budget is {budget}:\n{self._queries_message(ctx)}",
+        )
+        return res
+
+    def assertQueriesConstant(self, create_rows, request, budget=None):
+        """
+        grow the data set to each of ROW_SCALES rows with create_rows(n)
+        and assert request() runs the same number of queries every time
+        """
+        counts = {}
+        created = 0
+        for rows in self.ROW_SCALES:
+            create_rows(rows - created)
+            created = rows
+            res, ctx = self.count_queries(request)
+            self.assertLess(res.status_code, 400, getattr(res, "data", res))
+            counts[rows] = len(ctx)
+
+        self.assertEqual(
+            len(set(counts.values())),
+            1,
+            f"query count grows with rows {counts}:\n{self._queries_message(ctx)}",
+        )
+        if budget is not None:
+            self.assertLessEqual(
+                counts[created], budget, f"{counts[created]} queries, budget {budget}"
+            )
@@ -0,0 +1,142 @@
+"""
+per-user token bucket throttling
+
+every process keeps its buckets in memory, so checking a request costs no
+query or cache round trip. Bucket state is replaced as a whole tuple
+without a lock, concurrent requests of one user can race and get one
+extra token each, which is fine for rate limiting.
+
+With THROTTLE_CACHE set to a cache alias the processes share their usage:
+at most every THROTTLE_SYNC_INTERVAL seconds a bucket adds the tokens it
+spent to a counter in that cache and takes the tokens spent by the other
+processes out of its own bucket.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# buckets idle for longer than this are dropped when the store is full
+IDLE_SECONDS = 3600
+
+
+def parse_rate(rate):
+    """return (capacity, tokens per second) of a rate like "100/min" """
+    num, period = rate.split("/")
+    seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+    return int(num), int(num) / seconds
+
+
+class BucketStore:
+    """
+    token buckets of one process, {key: (tokens, updated, spent, synced,
+    seen)} where `spent` are the tokens used since the last cache sync and
+    `seen` the shared counter value after it
+    """
+
+    def __init__(self, max_buckets=100_000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+
+    def clear(self):
+        self._buckets = {}
+
+    def _prune(self, now):
+        buckets = self._buckets
+        for key in [k for k, v in list(buckets.items()) if now - v[1] > IDLE_SECONDS]:
+            buckets.pop(key, None)
+
+    def consume(self, key, capacity, refill, now=None):
+        """take a token, return 0 when allowed or the seconds to wait"""
+        now = time.monotonic() if now is None else now
+        state = self._buckets.get(key)
+        if state is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            state = (float(capacity), now, 0, now, None)
+        tokens, updated, spent, synced, seen = state
+        tokens = min(capacity, tokens + (now - updated) * refill)
+
+        sync = self._sync_cache()
+        if sync is not None and now - synced >= self._sync_interval():
+            tokens, spent, seen = self._sync(sync, key, tokens, spent, seen)
+            synced = now
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, spent, synced, seen)
+            return (1 - tokens) / refill
+        self._buckets[key] = (tokens - 1, now, spent + 1, synced, seen)
+        return 0
+
+    def _sync_cache(self):
+        alias = getattr(settings, "THROTTLE_CACHE", None)
+        return caches[alias] if alias else None
+
+    def _sync_interval(self):
+        return getattr(settings, "THROTTLE_SYNC_INTERVAL", 1.0)
+
+    def _sync(self, cache, key, tokens, spent, seen):
+        cache_key = f"throttle:{key}"
+        cache.add(cache_key, 0, IDLE_SECONDS)
+        try:
+            total = cache.incr(cache_key, spent) if spent else cache.get(cache_key)
+        except ValueError:
+            # expired between add and incr
+            cache.add(cache_key, spent, IDLE_SECONDS)
+            total = spent
+        if total is None:
+            return tokens, 0, None
+        if seen is not None and total >= seen + spent:
+            tokens -= total - seen - spent
+        return tokens, 0, total
+
+
+store = BucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    throttle by user (or ip for anonymous requests) with the
+    DEFAULT_THROTTLE_RATES of `scope`, "read" for safe methods and
+    "write" for the others when no scope is set
+    """
+
+    scope = None
+
+    def get_scope(self, request):
+        if self.scope:
+            return self.scope
+        return "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+
+    def get_ident(self, request):
+        user = request.user
+        if user and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        if not getattr(settings, "THROTTLE_ENABLED", True):
+            return True
+        scope = self.get_scope(request)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        self._wait = store.consume(
+            f"{scope}:{self.get_ident(request)}", capacity, refill
+        )
+        return not self._wait
+
+    def wait(self):
+        """seconds until a token is available, sent as Retry-After"""
+        return self._wait
+
+
+class UploadThrottle(TokenBucketThrottle):
+    """throttle for image uploads"""
+
+    scope = "upload"
@@ -0,0 +1,74 @@
+from django.http import HttpResponse, HttpResponseNotModified, Http404, JsonResponse
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from core import metrics
+from core.compression import choose_encoding
+from core.files import serve_file
+from core.health import readiness
+from core.schema import schema_cache
+
+
+def metrics_view(request):
+    """expose the metrics registry in the prometheus text format"""
+    if not getattr(settings, "METRICS_ENABLED", True):
+        raise Http404
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def healthz_view(request):
+    """liveness probe, the process answers requests"""
+    return JsonResponse({"status": "ok"})
+
+
+def readyz_view(request):
+    """readiness probe from the cached database and migration state"""
+    state = readiness.get()
+    return JsonResponse(state, status=200 if state["ready"] else 503)
+
+
+@require_safe
+def schema_view(request):
+    """
+    the OpenAPI schema from memory, yaml or json by `?format=` or the
+    Accept header, gzipped when accepted and revalidated by ETag
+    """
+    fmt = request.GET.get("format")
+    if fmt not in ("yaml", "json"):
+        fmt = "json" if "json" in request.headers.get("Accept", "") else "yaml"
+    document = schema_cache.get(fmt)
+
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    use_gzip = choose_encoding(accept_encoding, ("gzip",)) == "gzip"
+    etag = document.gzip_etag if use_gzip else document.etag
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(document.gzipped, content_type=document.content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(document.content, content_type=document.content_type)
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, "SCHEMA_CACHE_MAX_AGE", 300)
+    )
+    return response
+
+
+@require_safe
+def media_view(request, path):
+    """uploaded files, names are unique so they are cached as immutable"""
+    return serve_file(
+        request,
+        settings.MEDIA_ROOT,
+        path,
+        max_age=getattr(settings, "MEDIA_CACHE_MAX_AGE", 31536000),
+        immutable=True,
+        accel_prefix=getattr(settings, "MEDIA_ACCEL_PREFIX", None),
+    )
@@ -0,0 +1,150 @@
+"""
+application warm-up run before the first request is served
+
+`project/wsgi.py` calls `warm_up()` when the worker loads the application,
+so the first request of a fresh worker does not pay for the imports,
+url pattern compilation, serializer field maps, the schema file, the
+ingredient name catalog and the first database connection. Connections are
+only kept for the request that follows when CONN_MAX_AGE is set. Do not
+combine with `gunicorn --preload`, the forked workers would share the
+connection opened here.
+"""
+
+import importlib
+import inspect
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+from rest_framework import serializers
+
+logger = logging.getLogger("core.warmup")
+
+
+def _walk_patterns(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk_patterns(pattern)
+        else:
+            yield pattern
+
+
+def compile_urls():
+    """compile every url regex and build the reverse lookup tables"""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    count = 0
+    for pattern in _walk_patterns(resolver):
+        pattern.pattern.regex
+        count += 1
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+    return count
+
+
+def _serializer_classes():
+    for app_config in apps.get_app_configs():
+        if not app_config.path.startswith(str(settings.BASE_DIR)):
+            # third party serializers modules hold abstract base classes
+            continue
+        try:
+            module = importlib.import_module(f"{app_config.name}.serializers")
+        except ImportError:
+            continue
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if (
+                issubclass(cls, serializers.BaseSerializer)
+                and cls.__module__ == module.__name__
+                and _can_build(cls)
+            ):
+                yield cls
+
+
+def _can_build(cls):
+    """
+    whether cls can be built without arguments: list serializers need their
+    `child`, abstract classes and model serializers without a model are bases
+    """
+    if issubclass(cls, serializers.ListSerializer) or inspect.isabstract(cls):
+        return False
+    if issubclass(cls, serializers.ModelSerializer):
+        return getattr(getattr(cls, "Meta", None), "model", None) is not None
+    return True
+
+
+def build_serializers():
+    """import the serializers of every app and build their field maps"""
+    count = 0
+    for cls in _serializer_classes():
+        try:
+            cls().fields
+            count += 1
+        except Exception:
+            logger.exception("could not warm up %s", cls.__name__)
+    return count
+
+
+def load_schema():
+    """read the OpenAPI schema into memory"""
+    from core.schema import schema_cache
+
+    return len(schema_cache.get().content)
+
+
+def load_catalog():
+    """read the ingredient names into the in-process catalog"""
+    from core.catalog import catalog
+
+    return catalog.warm()
+
+
+def connect_databases():
+    """open a connection to every database"""
+    for connection in connections.all():
+        connection.ensure_connection()
+    return len(connections.all())
+
+
+STEPS = {
+    "urls": compile_urls,
+    "serializers": build_serializers,
+    "schema": load_schema,
+    "catalog": load_catalog,
+    "database": connect_databases,
+}
+
+
+# steps that open a database connection
+DATABASE_STEPS = ("catalog", "database")
+
+
+def warm_up(database=True):
+    """run the warm-up steps, return {step: seconds}"""
+    timings = {}
+    for name, step in STEPS.items():
+        if name in DATABASE_STEPS and not database:
+            continue
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # the worker must start anyway, the request will retry
+            logger.exception("warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+    logger.info(
+        "warm-up done in %.3fs (%s)",
+        sum(timings.values()),
+        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()),
+    )
+    return timings
+
+
+def warm_up_on_load():
+    """`warm_up` from the wsgi module, unless WARMUP_ENABLED is off"""
+    if getattr(settings, "WARMUP_ENABLED", True):
+        return warm_up(database=getattr(settings, "WARMUP_DATABASE", True))
+    return {}
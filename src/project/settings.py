@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 # from decouple import config
 
@@ -50,6 +51,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "core.middleware.PerformanceMiddleware",
+    "core.compression.CompressionMiddleware",
+    "core.routers.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -98,9 +102,64 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # keep connections between requests, the warm-up opens the first one
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas (core/routers.py), DB_REPLICA_HOSTS=host1,host2 adds the
+# aliases replica1, replica2 with the other settings of the primary
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{number}")
+if sys.argv[1:2] == ["test"]:
+    # a separate database standing in for a replica in core/tests/test_routers.py
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "TEST": {"NAME": f"test_{DATABASES['default']['NAME']}_replica"},
+    }
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+# reads stay on the primary this long after a client wrote
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+REPLICA_PIN_CACHE = "default"
+
+# Cache shared by the workers, CACHE_URL=redis://host:6379/0 (needs the redis
+# package), each process keeps its own in memory otherwise. The caches
+# holding state of all workers are checked against WEB_CONCURRENCY, the
+# number of gunicorn workers, at startup (core/checks.py)
+if os.environ.get("CACHE_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["CACHE_URL"],
+        }
+    }
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Hash partitions of core_recipe and its link tables on postgres
+# (core/partitioning.py), migration core.0015 only partitions with
+# RECIPE_PARTITIONING=1, `manage.py partition_recipes` does it later
+RECIPE_PARTITIONING = os.environ.get("RECIPE_PARTITIONING", "0") == "1"
+RECIPE_PARTITIONS = int(os.environ.get("RECIPE_PARTITIONS", 16))
+
+# In-process ingredient name catalog (core/catalog.py), renames and deletes
+# are announced per user through INGREDIENT_CATALOG_CACHE, which has to be
+# shared (CACHE_URL) when WEB_CONCURRENCY is above 1 (deploy check core.E002)
+INGREDIENT_CATALOG_SIZE = int(os.environ.get("INGREDIENT_CATALOG_SIZE", 100_000))
+INGREDIENT_CATALOG_CACHE = "default"
+
+# Worker warm-up from project/wsgi.py (core/warmup.py)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_DATABASE = True
+
 
 
 # Password validation
@@ -121,6 +180,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (core/hashers.py), PASSWORD_HASHER=argon2 needs argon2-cffi,
+# the other hashers only verify old passwords, which are rehashed on login
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "scrypt")
+PASSWORD_HASHERS = [
+    "core.hashers.ScryptPasswordHasher",
+    "core.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+if PASSWORD_HASHER == "argon2":
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get("PASSWORD_SCRYPT_WORK_FACTOR", 2**14))
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 65536))
+PASSWORD_ARGON2_PARALLELISM = 2
+
+# hashing runs on at most PASSWORD_HASHING_WORKERS threads per process,
+# 0 hashes on the request thread
+PASSWORD_HASHING_WORKERS = int(os.environ.get("PASSWORD_HASHING_WORKERS", 2))
+PASSWORD_HASHING_QUEUE = int(os.environ.get("PASSWORD_HASHING_QUEUE", 16))
+PASSWORD_HASHING_TIMEOUT = float(os.environ.get("PASSWORD_HASHING_TIMEOUT", 5.0))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -143,6 +227,24 @@ MEDIA_URL = 'static/media/'
 MEDIA_ROOT = 'media'
 STATIC_ROOT = 'static'
 
+# collectstatic writes .gz / .br siblings of text assets (core/storage.py)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.storage.CompressedStaticFilesStorage"},
+}
+
+# Media served by django (core/files.py), set FILES_SENDFILE_HEADER to
+# "X-Accel-Redirect" (nginx, internal location MEDIA_ACCEL_PREFIX) or
+# "X-Sendfile" (apache) to let the web server stream the files
+MEDIA_SERVE = os.environ.get("MEDIA_SERVE", "1") == "1"
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", 31536000))
+FILES_SENDFILE_HEADER = os.environ.get("FILES_SENDFILE_HEADER") or None
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+# Response compression (core/compression.py), brotli needs the brotli package
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 5))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -150,10 +252,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
 
+# Api tokens (core.models.AuthToken), lifetime in seconds and how long
+# ExpiringTokenAuthentication caches a token and its user per process
+AUTH_TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", 7 * 24 * 3600))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get("AUTH_TOKEN_CACHE_TIMEOUT", 60))
+
+# Idempotency-Key of recipe creation (core.idempotency), seconds a key and
+# its response are kept and after which a request still running with it
+# counts as dead
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 60))
+
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': ['core.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.environ.get("THROTTLE_RATE_READ", "600/min"),
+        'write': os.environ.get("THROTTLE_RATE_WRITE", "120/min"),
+        'upload': os.environ.get("THROTTLE_RATE_UPLOAD", "20/min"),
+    },
 }
 
+# Rate limiting (core/throttling.py), off while running the test suite,
+# set THROTTLE_CACHE to a shared cache alias to sync the workers' buckets
+THROTTLE_ENABLED = (
+    os.environ.get("THROTTLE_ENABLED", "1") == "1" and sys.argv[1:2] != ["test"]
+)
+THROTTLE_CACHE = os.environ.get("THROTTLE_CACHE")
+THROTTLE_SYNC_INTERVAL = float(os.environ.get("THROTTLE_SYNC_INTERVAL", 1.0))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Recipe API Documentation',
     'DESCRIPTION': 'Documenting your APIs',
@@ -161,3 +288,55 @@ SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True, # to upload image through the browser
     'SERVE_INCLUDE_SCHEMA': False,
 }
+
+# OpenAPI schema served from this file (core/schema.py), regenerate it with
+# `python manage.py update_schema` after changing the api
+SCHEMA_FILE = BASE_DIR / "project" / "openapi.yml"
+SCHEMA_CACHE_MAX_AGE = int(os.environ.get("SCHEMA_CACHE_MAX_AGE", 300))
+
+# Similar recipes index (recipe/similarity.py)
+RECIPE_SIMILARITY_INDEX_TTL = int(os.environ.get("RECIPE_SIMILARITY_INDEX_TTL", 300))
+RECIPE_SIMILARITY_MAX_USERS = int(os.environ.get("RECIPE_SIMILARITY_MAX_USERS", 1000))
+RECIPE_SIMILARITY_WEIGHTS = {"ingredients": 0.7, "tags": 0.3}
+
+# Request performance instrumentation (core/middleware.py)
+PERFORMANCE_SAMPLE_RATE = float(os.environ.get("PERFORMANCE_SAMPLE_RATE", 0.1))
+PERFORMANCE_SLOW_REQUEST_MS = int(os.environ.get("PERFORMANCE_SLOW_REQUEST_MS", 500))
+PERFORMANCE_SERVER_TIMING = True
+
+# Prometheus metrics (core/metrics.py), METRICS_DIR must be shared by the
+# gunicorn workers of one instance
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+
+# Background jobs (core/jobs.py), rows per chunk of the bulk delete and
+# reassign jobs, retries, the lease of a running job and the concurrency
+# limit of every queue per `runworker` process
+JOBS_BATCH_SIZE = int(os.environ.get("JOBS_BATCH_SIZE", 1000))
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_BACKOFF = 10
+JOBS_LEASE_SECONDS = 600
+JOBS_QUEUES = {"default": 4}
+
+# seconds /readyz answers from its last database check
+HEALTH_CHECK_INTERVAL = int(os.environ.get("HEALTH_CHECK_INTERVAL", 10))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "null": {"class": "logging.NullHandler"},
+    },
+    "loggers": {
+        "core.performance": {
+            "handlers": ["console"],
+            "level": os.environ.get("PERFORMANCE_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+if sys.argv[1:2] == ["test"]:
+    # the request log of every test request would bury the test output
+    LOGGING["loggers"]["core.performance"]["handlers"] = ["null"]
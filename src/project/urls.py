@@ -1,22 +1,35 @@
+import re
+
 from rest_framework import permissions
 from drf_spectacular.views import (
-    SpectacularAPIView,
     SpectacularRedocView,
     SpectacularSwaggerView,
 )
 
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import (
+    healthz_view,
+    media_view,
+    metrics_view,
+    readyz_view,
+    schema_view,
+)
 
 
 urlpatterns = [
     # admin pannal path
     path("admin/", admin.site.urls),
-    # api documentation
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    # prometheus metrics
+    path("metrics", metrics_view, name="metrics"),
+    # liveness / readiness probes
+    path("healthz", healthz_view, name="healthz"),
+    path("readyz", readyz_view, name="readyz"),
+    # api documentation, the schema is generated by `manage.py update_schema`
+    path("api/schema/", schema_view, name="schema"),
     path(
         "api/doc/",
         SpectacularSwaggerView.as_view(url_name="schema"),
@@ -29,8 +42,12 @@ urlpatterns = [
     path("api/recipe/", include("recipe.urls")),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
\ No newline at end of file
+if settings.MEDIA_SERVE:
+    # uploaded images, see core/files.py for handing off to the web server
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")),
+            media_view,
+            name="media",
+        ),
+    ]
\ No newline at end of file
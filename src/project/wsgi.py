@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 
 application = get_wsgi_application()
+
+# refuse to serve with settings the workers cannot share (core/checks.py)
+from core.checks import fail_on_cache_errors  # noqa: E402
+
+fail_on_cache_errors()
+
+# pay for imports, url compilation and the first db connection before the
+# worker accepts traffic
+from core.warmup import warm_up_on_load  # noqa: E402
+
+warm_up_on_load()
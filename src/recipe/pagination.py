@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    keyset pagination for recipe lists,
+    it is only applied when the client sends `page_size` so plain
+    list requests keep returning the full list
+    """
+
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        """paginate on the ordering already applied to the queryset"""
+        return tuple(queryset.query.order_by)
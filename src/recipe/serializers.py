@@ -1,6 +1,14 @@
 from rest_framework import serializers
 
-from core.models import Recipe, Tag, Ingredient
+from core.catalog import catalog
+from core.models import (
+    Ingredient,
+    IngredientAlias,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    normalize_name,
+)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -17,7 +25,19 @@ class TagSerializer(serializers.ModelSerializer):
         return value
 
 
+class IngredientNameField(serializers.CharField):
+    """
+    name of a catalog ingredient as the user calls it, the `user_name`
+    loaded with it (see Ingredient.objects.named_for) when there is one
+    """
+
+    def get_attribute(self, instance):
+        return getattr(instance, "user_name", None) or super().get_attribute(instance)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
+    name = IngredientNameField(max_length=255)
+
     class Meta:
         model = Ingredient
         fields = ("id", "name")
@@ -29,6 +49,70 @@ class IngredientSerializer(serializers.ModelSerializer):
         return value
 
 
+class IngredientDetailSerializer(serializers.ModelSerializer):
+    """
+    serializer for the ingredients of a user, their aliases of catalog
+    ingredients with their own name, cost and nutrients per unit
+    """
+
+    id = serializers.IntegerField(source="ingredient_id", read_only=True)
+
+    class Meta:
+        model = IngredientAlias
+        fields = ("id", "name", *IngredientAlias.ROLLUP_FIELDS)
+        extra_kwargs = {
+            name: {"min_value": 0} for name in IngredientAlias.ROLLUP_FIELDS
+        }
+
+    def validate_name(self, value):
+        if len(value) < 3:
+            raise serializers.ValidationError("This name is very short")
+        if self.instance is not None:
+            others = IngredientAlias.objects.filter(
+                user_id=self.instance.user_id, normalized_name=normalize_name(value)
+            ).exclude(pk=self.instance.pk)
+            if others.exists():
+                raise serializers.ValidationError("An ingredient with this name exists")
+        return value
+
+    def create(self, validated_data):
+        """
+        add the ingredient to the user's, a name the catalog has already
+        becomes an alias of the existing catalog ingredient
+        """
+        return IngredientAlias.objects.add(**validated_data)
+
+
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    """serializer for the ingredient lines of a recipe, in list order"""
+
+    id = serializers.IntegerField(source="ingredient_id", read_only=True)
+    name = IngredientNameField(source="ingredient.name", max_length=255)
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ("id", "name", "quantity", "unit", "position")
+        read_only_fields = ("position",)
+        extra_kwargs = {"quantity": {"min_value": 0}}
+
+    def validate_name(self, value):
+        if len(value) < 3:
+            raise serializers.ValidationError("This name is very short")
+        return value
+
+
+class LineIngredientsSerializer(serializers.ListSerializer):
+    """ingredients of a recipe read from its (prefetched) ingredient lines"""
+
+    def get_attribute(self, instance):
+        ingredients = []
+        for line in instance.ingredient_lines():
+            # the name of the recipe user's alias, loaded with the line
+            line.ingredient.user_name = getattr(line, "user_name", None)
+            ingredients.append(line.ingredient)
+        return ingredients
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """serializer for recipes"""
 
@@ -37,15 +121,31 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ["id", "title", "price", "time_minutes", "link", "tags", "ingredients"]
-        read_only_fields = ("id",)
+        fields = [
+            "id",
+            "title",
+            "price",
+            "time_minutes",
+            "link",
+            "tags",
+            "ingredients",
+            *IngredientAlias.ROLLUP_FIELDS.values(),
+        ]
+        read_only_fields = ("id", *IngredientAlias.ROLLUP_FIELDS.values())
 
     def _get_or_create_tags(self, tags, recipe):
         """handle getting or creating tags as needed"""
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        names = list(dict.fromkeys(tag["name"] for tag in tags))
+        if not names:
+            return
+        existing = {
+            tag.name: tag for tag in Tag.objects.filter(user=auth_user, name__in=names)
+        }
+        created = Tag.objects.bulk_create(
+            [Tag(user=auth_user, name=name) for name in names if name not in existing]
+        )
+        recipe.tags.add(*existing.values(), *created)
 
     # def _get_or_create_ingredients(self, ingredients, recipe):
     #     """handle getting or creating ingredients as needed"""
@@ -56,24 +156,71 @@ class RecipeSerializer(serializers.ModelSerializer):
     #         )
     #         recipe.ingredients.add(ingredient_obj)
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, lines, recipe):
         """
-        handle getting or creating ingredients as needed,
-        when using ingredient from anther users
+        link the ingredients of `lines` ({"name", "quantity", "unit"}) in
+        their order with one insert, the names are resolved through the
+        ingredient catalog, the new ones added to it, and the user gets an
+        alias of the ingredients they had none of
         """
         auth_user = self.context["request"].user
-        for ing in ingredients:
-            try:
-                ing_obj = Ingredient.objects.get(**ing)
-            except Ingredient.DoesNotExist:
-                ing_obj = Ingredient.objects.create(user=auth_user, **ing)
-            finally:
-                recipe.ingredients.add(ing_obj)
+        unique = {}
+        for line in lines:
+            unique.setdefault(normalize_name(line["name"]), line)
+        if not unique:
+            return
+        aliased = set()
+        ids = catalog.resolve(auth_user.id, list(unique), aliased)
+        missing = [name for name in unique if name not in ids]
+        if missing:
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=unique[name]["name"]) for name in missing],
+                # another request may add the same name meanwhile
+                ignore_conflicts=True,
+            )
+            ids.update(catalog.resolve(auth_user.id, missing, aliased))
+        if len(aliased) < len(unique):
+            new_aliases = {
+                name: ids[name] for name in unique if name not in aliased
+            }
+            IngredientAlias.objects.bulk_create(
+                [
+                    IngredientAlias(
+                        user=auth_user,
+                        ingredient_id=ingredient_id,
+                        name=unique[name]["name"],
+                    )
+                    for name, ingredient_id in new_aliases.items()
+                ],
+                # the user may have an alias of the ingredient by another name
+                ignore_conflicts=True,
+            )
+            # either way the name resolves for the user without an insert
+            catalog.learn(
+                aliases={(auth_user.id, name): pk for name, pk in new_aliases.items()}
+            )
+        recipe.ingredients.add_links(
+            [
+                RecipeIngredient(
+                    ingredient_id=ids[name],
+                    quantity=line.get("quantity"),
+                    unit=line.get("unit", ""),
+                    position=position,
+                )
+                for position, (name, line) in enumerate(unique.items())
+            ]
+        )
+
+    def _pop_ingredient_lines(self, validated_data):
+        lines = validated_data.pop("ingredient_lines", None)
+        if lines is not None:
+            return [{"name": line.pop("ingredient")["name"], **line} for line in lines]
+        return validated_data.pop("ingredients", None)
 
     def create(self, validated_data):
         """create a recipe with tags and ingredients"""
         tags = validated_data.pop("tags", [])
-        ingredients = validated_data.pop("ingredients", [])
+        ingredients = self._pop_ingredient_lines(validated_data) or []
         recipe = Recipe.objects.create(**validated_data)
         self._get_or_create_tags(tags, recipe)
         self._get_or_create_ingredients(ingredients, recipe)
@@ -82,7 +229,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """update a recipe with tags and ingredients"""
         tags = validated_data.pop("tags", None)
-        ingredients = validated_data.pop("ingredients", None)
+        ingredients = self._pop_ingredient_lines(validated_data)
         if tags is not None:
             instance.tags.clear()
             self._get_or_create_tags(tags, instance)
@@ -101,8 +248,52 @@ class RecipeSerializer(serializers.ModelSerializer):
 class RecipeDetailSerializer(RecipeSerializer):
     """serializer for recipe detail view."""
 
+    # the ingredients and their lines come from one `ingredient_links` prefetch
+    ingredients = LineIngredientsSerializer(
+        child=IngredientSerializer(), required=False
+    )
+    ingredient_lines = RecipeIngredientSerializer(many=True, required=False)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            "ingredient_lines",
+            "description",
+            "image",
+        ]
+
+    def validate(self, attrs):
+        if "ingredients" in attrs and "ingredient_lines" in attrs:
+            raise serializers.ValidationError(
+                {"ingredient_lines": "send either ingredients or ingredient_lines"}
+            )
+        return attrs
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    """serializer for recipes ranked by similarity to another recipe"""
+
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ["similarity"]
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """serializer for recipes matched against the ingredients a user has"""
+
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+    coverage = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + [
+            "matched_ingredients",
+            "missing_ingredients",
+            "coverage",
+        ]
+
+    def get_coverage(self, obj) -> float:
+        return round(obj.matched_ingredients / obj.total_ingredients, 4)
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -117,3 +308,49 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ("id", "image")
         read_only_fields = ("id",)
         extra_kwargs = {"image": {"required": "True"}}
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """
+    validate the query params used to filter and sort recipes,
+    ordering is limited to the fields that have a (user, field, id) index
+    """
+
+    ORDERING_FIELDS = ("id", "price", "time_minutes")
+
+    price_min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, required=False
+    )
+    price_max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, required=False
+    )
+    time_max = serializers.IntegerField(min_value=0, required=False)
+    ordering = serializers.ChoiceField(
+        choices=[prefix + field for field in ORDERING_FIELDS for prefix in ("", "-")],
+        default="-id",
+    )
+
+    def validate(self, attrs):
+        price_min = attrs.get("price_min")
+        price_max = attrs.get("price_max")
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise serializers.ValidationError(
+                {"price_min": "price_min must not be greater than price_max"}
+            )
+        return attrs
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """validate the query params of the pantry matching endpoint"""
+
+    ingredients = serializers.CharField()
+    min_coverage = serializers.FloatField(min_value=0, max_value=1, default=0.5)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=50)
+
+    def validate_ingredients(self, value):
+        try:
+            return sorted({int(str_id) for str_id in value.split(",")})
+        except ValueError:
+            raise serializers.ValidationError(
+                "comma separated list of ingredients ids expected"
+            )
@@ -0,0 +1,238 @@
+"""
+queries and writes shared by the recipe viewsets and function based views
+
+querysets are scoped to the user in sql and filter the link tables on the
+user as well, so postgres only reads the user's partitions of them. Reads
+get their prefetches here per action; writes get none, saving the links
+drops the prefetch cache anyway.
+
+Single objects are looked up on id and user in one query (`get_owned`), a
+row of another user is a 404 without being loaded. The user's ingredients
+are their aliases of catalog ingredients, looked up by the ingredient id.
+Actions in LOCKING_ACTIONS lock the row with `SELECT ... FOR UPDATE` so
+concurrent updates of it run one after the other, their view has to run
+them in a transaction.
+"""
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+)
+
+from rest_framework.generics import get_object_or_404
+
+from core import metrics, rollups
+from core.models import Ingredient, IngredientAlias, Recipe, RecipeIngredient, Tag
+
+from . import serializers
+from .similarity import index as similarity_index
+
+# actions reading recipes, with the relations their serializer needs
+LIST = "list"
+RETRIEVE = "retrieve"
+
+# actions (viewset names, shared by the function views) writing the row
+LOCKING_ACTIONS = ("update", "partial_update", "upload_image")
+
+
+def params_to_ints(value):
+    """convert a comma separated string of ids to integers"""
+    return [int(str_id) for str_id in value.split(",")]
+
+
+def filter_recipes_by_range(queryset, query_params):
+    """filter recipes by price and time ranges and apply the requested ordering"""
+    ser = serializers.RecipeFilterSerializer(data=query_params)
+    ser.is_valid(raise_exception=True)
+    params = ser.validated_data
+
+    if "price_min" in params:
+        queryset = queryset.filter(price__gte=params["price_min"])
+    if "price_max" in params:
+        queryset = queryset.filter(price__lte=params["price_max"])
+    if "time_max" in params:
+        queryset = queryset.filter(time_minutes__lte=params["time_max"])
+
+    ordering = params["ordering"]
+    if ordering.lstrip("-") == "id":
+        return queryset.order_by(ordering)
+    # break ties on id in the same direction to match the (user, field, id) index
+    tiebreak = "-id" if ordering.startswith("-") else "id"
+    return queryset.order_by(ordering, tiebreak)
+
+
+def prefetch_ingredients(user):
+    """the recipes' ingredients, named as the user calls them"""
+    return Prefetch("ingredients", queryset=Ingredient.objects.named_for(user))
+
+
+def prefetch_recipes(queryset, user, action):
+    """prefetch what the serializer of `action` reads"""
+    if action == LIST:
+        return queryset.prefetch_related("tags", prefetch_ingredients(user))
+    if action == RETRIEVE:
+        return queryset.prefetch_related(
+            "tags",
+            Prefetch(
+                "ingredient_links",
+                queryset=RecipeIngredient.objects.filter(user=user)
+                .with_aliases()
+                .select_related("ingredient"),
+            ),
+        )
+    return queryset
+
+
+def lock_for(queryset, action):
+    """lock the selected rows when action writes them"""
+    if action in LOCKING_ACTIONS:
+        # only the row itself, not the rows of joined relations
+        return queryset.select_for_update(of=("self",))
+    return queryset
+
+
+def get_owned(queryset, pk):
+    """the row pk of a user scoped queryset, 404 for a missing or invalid id"""
+    return get_object_or_404(queryset, pk=pk)
+
+
+def recipe_queryset(user, action=None):
+    """the user's recipes for object lookups, prefetched or locked for action"""
+    return lock_for(
+        prefetch_recipes(Recipe.objects.filter(user=user), user, action), action
+    )
+
+
+def recipes(user, query_params, action=None):
+    """
+    the user's recipes filtered by the `tags`, `ingredients`, range and
+    ordering params, prefetched for `action`
+    """
+    queryset = Recipe.objects.filter(user=user)
+    tag_ids = query_params.get("tags")
+    ingredient_ids = query_params.get("ingredients")
+    if tag_ids:
+        queryset = queryset.filter(
+            tag_links__tag_id__in=params_to_ints(tag_ids), tag_links__user=user
+        )
+    if ingredient_ids:
+        queryset = queryset.filter(
+            ingredient_links__ingredient_id__in=params_to_ints(ingredient_ids),
+            ingredient_links__user=user,
+        )
+    queryset = filter_recipes_by_range(queryset, query_params)
+    return prefetch_recipes(queryset, user, action).distinct()
+
+
+def similar_recipes(recipe, user, limit):
+    """the user's recipes most similar to recipe, with a `similarity` score"""
+    ranked = similarity_index.similar(recipe, k=max(limit, 0))
+    found = Recipe.objects.filter(
+        user=user, id__in=[recipe_id for _, recipe_id in ranked]
+    ).prefetch_related("tags", prefetch_ingredients(user))
+    found = {r.id: r for r in found}
+
+    results = []
+    for score, recipe_id in ranked:
+        if recipe_id in found:
+            found[recipe_id].similarity = round(score, 4)
+            results.append(found[recipe_id])
+    return results
+
+
+def pantry_recipes(user, ingredient_ids, min_coverage, limit):
+    """
+    the user's recipes using at least `min_coverage` of their ingredients
+    from ingredient_ids, fewest missing ingredients first
+    """
+    # one grouped query over the recipe <-> ingredient through table
+    return (
+        Recipe.objects.filter(user=user)
+        .annotate(
+            total_ingredients=Count("ingredients"),
+            matched_ingredients=Count(
+                "ingredients", filter=Q(ingredients__id__in=ingredient_ids)
+            ),
+        )
+        .filter(
+            matched_ingredients__gt=0,
+            matched_ingredients__gte=ExpressionWrapper(
+                F("total_ingredients") * min_coverage, output_field=FloatField()
+            ),
+        )
+        .annotate(missing_ingredients=F("total_ingredients") - F("matched_ingredients"))
+        .order_by("missing_ingredients", "-matched_ingredients", "-id")
+        .prefetch_related("tags", prefetch_ingredients(user))
+    )[:limit]
+
+
+def save_image(serializer):
+    """store a validated RecipeImageSerializer and record the upload size"""
+    metrics.IMAGE_UPLOAD_BYTES.observe(serializer.validated_data["image"].size)
+    return serializer.save()
+
+
+def _assigned_only(query_params):
+    return bool(int(query_params.get("assigned_only", 0)))
+
+
+def tag_queryset(user, action=None):
+    """the user's tags for object lookups"""
+    return lock_for(Tag.objects.filter(user=user), action)
+
+
+def tags(user, query_params):
+    """the user's tags, only those used by recipes with `assigned_only=1`"""
+    queryset = Tag.objects.filter(user=user)
+    if _assigned_only(query_params):
+        queryset = queryset.filter(recipe__isnull=False)
+    return queryset.order_by("-name").distinct()
+
+
+def ingredients(user, query_params):
+    """
+    the user's ingredients, their aliases of catalog ingredients, only
+    those used by their recipes with `assigned_only=1`
+    """
+    queryset = IngredientAlias.objects.filter(user=user)
+    if _assigned_only(query_params):
+        queryset = queryset.filter(
+            Exists(
+                RecipeIngredient.objects.filter(
+                    user=user, ingredient_id=OuterRef("ingredient_id")
+                )
+            )
+        )
+    return queryset.order_by("-name")
+
+
+def ingredient_queryset(user, action=None):
+    """the user's aliases for object lookups by ingredient id"""
+    return lock_for(IngredientAlias.objects.filter(user=user), action)
+
+
+def get_ingredient(user, ingredient_id, action=None):
+    """the user's alias of the catalog ingredient, 404 without one"""
+    return get_object_or_404(
+        ingredient_queryset(user, action), ingredient_id=ingredient_id
+    )
+
+
+def delete_ingredient(alias):
+    """
+    delete an ingredient of the user, their alias and the lines of it in
+    their recipes, the catalog ingredient stays for the other users
+    """
+    with transaction.atomic():
+        recipe_ids = rollups.recipes_using(alias.ingredient_id, alias.user_id)
+        if recipe_ids:
+            # sends m2m_changed, refreshing the recipes' totals and indexes
+            alias.ingredient.recipe_set.remove(*recipe_ids)
+        alias.delete()
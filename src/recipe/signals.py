@@ -0,0 +1,65 @@
+"""
+    keep the in-process recipe indexes in sync with the database
+
+    the indexes are changed once the transaction commits, a rolled back
+    change never reaches them and a concurrent rebuild can't miss it
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+
+from .similarity import index as similarity_index
+
+
+def _on_commit(using, func, *args):
+    transaction.on_commit(partial(func, *args), using=using)
+
+
+def _sync_m2m(dim, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # tag.recipe_set / ingredient.recipe_set changes touch recipes of
+        # unknown owners, rebuilding is cheaper than looking them up
+        _on_commit(using, similarity_index.invalidate)
+        return
+    _on_commit(
+        using,
+        similarity_index.update,
+        instance.user_id,
+        action,
+        dim,
+        instance.id,
+        set(pk_set or ()),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, **kwargs):
+    _sync_m2m("ingredients", **kwargs)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, **kwargs):
+    _sync_m2m("tags", **kwargs)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    _on_commit(using, similarity_index.drop_recipe, instance.user_id, instance.id)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, using, **kwargs):
+    _on_commit(using, similarity_index.invalidate, instance.user_id)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, using, **kwargs):
+    # ingredients are shared between users
+    _on_commit(using, similarity_index.invalidate)
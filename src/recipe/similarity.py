@@ -0,0 +1,206 @@
+"""
+    in-process inverted index used to rank similar recipes
+
+    every user gets a lazily built index of
+    ingredient id -> sorted recipe ids and tag id -> sorted recipe ids,
+    stored as compact `array("q")` posting lists, which is kept up to date
+    from the m2m_changed / post_delete signals in `recipe.signals`.
+    Indexes are rebuilt after `RECIPE_SIMILARITY_INDEX_TTL` seconds so
+    changes made by other worker processes are picked up.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.models import RecipeIngredient, RecipeTag
+
+
+DIMENSIONS = ("ingredients", "tags")
+
+DEFAULT_WEIGHTS = {"ingredients": 0.7, "tags": 0.3}
+
+
+def _insert(postings, item_id, recipe_id):
+    """insert recipe_id into the sorted posting list of item_id"""
+    ids = postings.setdefault(item_id, array("q"))
+    pos = bisect_left(ids, recipe_id)
+    if pos == len(ids) or ids[pos] != recipe_id:
+        ids.insert(pos, recipe_id)
+
+
+def _remove(postings, item_id, recipe_id):
+    """remove recipe_id from the sorted posting list of item_id"""
+    ids = postings.get(item_id)
+    if ids is None:
+        return
+    pos = bisect_left(ids, recipe_id)
+    if pos < len(ids) and ids[pos] == recipe_id:
+        del ids[pos]
+    if not ids:
+        del postings[item_id]
+
+
+class UserIndex:
+    """posting lists and feature sets for the recipes of one user"""
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.postings = {dim: {} for dim in DIMENSIONS}
+        self.features = {}
+
+    def _features(self, recipe_id):
+        return self.features.setdefault(
+            recipe_id, {dim: set() for dim in DIMENSIONS}
+        )
+
+    def add(self, dim, recipe_id, item_ids):
+        features = self._features(recipe_id)[dim]
+        for item_id in item_ids:
+            features.add(item_id)
+            _insert(self.postings[dim], item_id, recipe_id)
+
+    def remove(self, dim, recipe_id, item_ids):
+        features = self.features.get(recipe_id)
+        if features is None:
+            return
+        for item_id in list(item_ids):
+            features[dim].discard(item_id)
+            _remove(self.postings[dim], item_id, recipe_id)
+
+    def clear(self, dim, recipe_id):
+        features = self.features.get(recipe_id)
+        if features is not None:
+            self.remove(dim, recipe_id, features[dim])
+
+    def drop(self, recipe_id):
+        for dim in DIMENSIONS:
+            self.clear(dim, recipe_id)
+        self.features.pop(recipe_id, None)
+
+    def top_k(self, recipe_id, k, weights):
+        """return [(score, recipe_id)] of the k recipes most similar to recipe_id"""
+        features = self.features.get(recipe_id)
+        if features is None:
+            return []
+
+        overlaps = {}
+        for dim in DIMENSIONS:
+            for item_id in features[dim]:
+                for other_id in self.postings[dim].get(item_id, ()):
+                    if other_id == recipe_id:
+                        continue
+                    counts = overlaps.get(other_id)
+                    if counts is None:
+                        counts = overlaps[other_id] = dict.fromkeys(DIMENSIONS, 0)
+                    counts[dim] += 1
+
+        sizes = {dim: len(features[dim]) for dim in DIMENSIONS}
+        scores = []
+        for other_id, counts in overlaps.items():
+            other = self.features[other_id]
+            score = 0.0
+            for dim in DIMENSIONS:
+                shared = counts[dim]
+                if shared:
+                    # jaccard = |A & B| / |A | B|
+                    union = sizes[dim] + len(other[dim]) - shared
+                    score += weights[dim] * shared / union
+            scores.append((score, other_id))
+
+        # highest score first, newest recipe first on ties
+        return heapq.nlargest(k, scores)
+
+
+class SimilarityIndex:
+    """per-user `UserIndex` cache with a ttl and a bounded number of users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    @property
+    def ttl(self):
+        return getattr(settings, "RECIPE_SIMILARITY_INDEX_TTL", 300)
+
+    @property
+    def max_users(self):
+        return getattr(settings, "RECIPE_SIMILARITY_MAX_USERS", 1000)
+
+    @property
+    def weights(self):
+        return getattr(settings, "RECIPE_SIMILARITY_WEIGHTS", DEFAULT_WEIGHTS)
+
+    def _build(self, user_id):
+        index = UserIndex()
+        through_models = {
+            "ingredients": (RecipeIngredient, "ingredient_id"),
+            "tags": (RecipeTag, "tag_id"),
+        }
+        for dim, (through, column) in through_models.items():
+            # the links carry the user, one partition and no join
+            rows = (
+                through.objects.filter(user_id=user_id)
+                .order_by("recipe_id")
+                .values_list("recipe_id", column)
+            )
+            for recipe_id, item_id in rows.iterator(chunk_size=5000):
+                index.add(dim, recipe_id, (item_id,))
+        return index
+
+    def get(self, user_id):
+        """return the index for user_id, building it when missing or stale"""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None and time.monotonic() - index.built_at < self.ttl:
+                self._users.move_to_end(user_id)
+                return index
+
+        index = self._build(user_id)
+        with self._lock:
+            self._users[user_id] = index
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return index
+
+    def similar(self, recipe, k=10):
+        """rank the owner's recipes by weighted jaccard overlap with recipe"""
+        index = self.get(recipe.user_id)
+        with self._lock:
+            return index.top_k(recipe.id, k, self.weights)
+
+    def update(self, user_id, action, dim, recipe_id, item_ids=()):
+        """apply an m2m change to an already built index"""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return
+            if action == "post_add":
+                index.add(dim, recipe_id, item_ids)
+            elif action == "post_remove":
+                index.remove(dim, recipe_id, item_ids)
+            elif action == "post_clear":
+                index.clear(dim, recipe_id)
+
+    def drop_recipe(self, user_id, recipe_id):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.drop(recipe_id)
+
+    def invalidate(self, user_id=None):
+        """forget the index of user_id, or of every user"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+
+index = SimilarityIndex()
@@ -8,9 +8,9 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 
-from core.models import Recipe, Ingredient
+from core.models import Recipe, Ingredient, IngredientAlias
 
-from recipe.serializers import IngredientSerializer
+from recipe.serializers import IngredientDetailSerializer
 
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
@@ -132,28 +132,28 @@ class PrivateIngredientsApiTest(TestCase):
 
     def test_filter_ingredients_assigned_to_recipes(self):
         """test listing ingredients by those assigned to recipes."""
-        ing1 = Ingredient.objects.create(user=self.user, name="ing one")
-        ing2 = Ingredient.objects.create(user=self.user, name="ing two")
+        ing1 = IngredientAlias.objects.add(self.user, "ing one")
+        ing2 = IngredientAlias.objects.add(self.user, "ing two")
         recipe = Recipe.objects.create(
             user=self.user,
             title="test recipe",
             price=Decimal("12.3"),
             time_minutes=15,
         )
-        recipe.ingredients.add(ing1)
+        recipe.ingredients.add(ing1.ingredient)
 
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
-        ser1 = IngredientSerializer(ing1)
-        ser2 = IngredientSerializer(ing2)
+        ser1 = IngredientDetailSerializer(ing1)
+        ser2 = IngredientDetailSerializer(ing2)
 
         self.assertIn(ser1.data, res.data)
         self.assertNotIn(ser2.data, res.data)
 
     def test_filter_ingredients_unique(self):
         """test filted ingredients retuens a unique list"""
-        ing = Ingredient.objects.create(user=self.user, name="ing one")
-        Ingredient.objects.create(user=self.user, name="ing two")
+        ing = IngredientAlias.objects.add(self.user, "ing one").ingredient
+        IngredientAlias.objects.add(self.user, "ing two")
 
         recipe1 = Recipe.objects.create(
             user=self.user,
@@ -174,3 +174,60 @@ class PrivateIngredientsApiTest(TestCase):
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_create_existing_name_adds_alias(self):
+        """test creating a name of the catalog lists the existing ingredient"""
+        other = create_user(email="other@example.xyz")
+        salt = IngredientAlias.objects.add(other, "Sea Salt", unit_cost=3).ingredient
+
+        res = self.client.post(INGREDIENTS_URL, {"name": "sea  salt"})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["id"], salt.id)
+        self.assertEqual(res.data["name"], "sea  salt")
+        self.assertIsNone(res.data["unit_cost"])
+        self.assertEqual(Ingredient.objects.count(), 1)
+        res = self.client.get(INGREDIENTS_URL)
+        self.assertEqual([ing["id"] for ing in res.data], [salt.id])
+
+        res = self.client.delete(f"{INGREDIENTS_URL}{salt.id}/")
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(Ingredient.objects.filter(id=salt.id).exists())
+        self.assertTrue(IngredientAlias.objects.filter(user=other).exists())
+        self.assertEqual(self.client.get(INGREDIENTS_URL).data, [])
+
+    def test_changes_stay_with_the_user(self):
+        """test renaming and pricing a shared ingredient only changes the user's"""
+        other = create_user(email="other@example.xyz")
+        salt = IngredientAlias.objects.add(other, "salt", unit_cost=1)
+        IngredientAlias.objects.add(self.user, "salt")
+
+        res = self.client.patch(
+            detail_url(salt.ingredient_id), {"name": "sea salt", "unit_cost": 5}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["name"], "sea salt")
+        salt.refresh_from_db()
+        self.assertEqual((salt.name, salt.unit_cost), ("salt", 1))
+        self.assertEqual(salt.ingredient.name, "salt")
+
+    def test_catalog_not_listed_without_alias(self):
+        """test other users' ingredients are neither listed nor found"""
+        other = create_user(email="other@example.xyz")
+        salt = IngredientAlias.objects.add(other, "salt").ingredient
+
+        self.assertEqual(self.client.get(INGREDIENTS_URL).data, [])
+        for method in ("get", "patch", "delete"):
+            res = getattr(self.client, method)(detail_url(salt.id), {"name": "x"})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND, method)
+
+    def test_rename_to_existing_name_error(self):
+        """test an ingredient cannot take the name of another one"""
+        IngredientAlias.objects.add(self.user, "sugar")
+        ing = IngredientAlias.objects.add(self.user, "honey").ingredient
+
+        res = self.client.patch(f"{INGREDIENTS_URL}{ing.id}/", {"name": "Sugar"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,269 @@
+"""
+query count budgets for the recipe api endpoints
+"""
+
+from decimal import Decimal
+
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient, IngredientAlias
+from core.tests.utils import QueryBudgetMixin
+
+from recipe.similarity import index as similarity_index
+
+# ViewSet routes, `reverse("recipe:recipe-list")` resolves to the FBV ones
+RECIPES_URL = "/api/recipe/recipes/"
+TAGS_URL = "/api/recipe/tags/"
+INGREDIENTS_URL = "/api/recipe/ingredients/"
+
+
+def recipe_url(recipe_id, action=""):
+    """return the viewset url of a recipe or one of its actions"""
+    return f"{RECIPES_URL}{recipe_id}/{action}"
+
+
+def create_user(email="budget@example.com", password="test123"):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def image_payload():
+    """return a multipart payload with a small jpeg"""
+    image_file = tempfile.NamedTemporaryFile(suffix=".jpg")
+    Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+    image_file.seek(0)
+    return {"image": image_file}
+
+
+RECIPE_PAYLOAD = {
+    "title": "budget recipe",
+    "price": "5.50",
+    "time_minutes": 10,
+    "tags": [{"name": "tag one"}, {"name": "tag two"}],
+    "ingredients": [{"name": "ing one"}, {"name": "ing two"}],
+}
+
+
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """test recipe endpoints stay within their query budgets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f"tag {i}") for i in range(2)
+        ]
+        self.ings = [
+            IngredientAlias.objects.add(self.user, f"ing {i}").ingredient
+            for i in range(2)
+        ]
+
+    def create_recipes(self, count):
+        """create recipes linked to two tags and two ingredients each"""
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"recipe {i}",
+                price=Decimal("1.00") + i % 5,
+                time_minutes=5 + i % 30,
+            )
+            recipe.tags.add(*self.tags)
+            recipe.ingredients.add(*self.ings)
+
+    def test_recipe_list(self):
+        """test list endpoints do not grow with the number of recipes"""
+        for url in (RECIPES_URL, reverse("recipe:recipe-list")):
+            with self.subTest(url=url):
+                Recipe.objects.all().delete()
+                self.assertQueriesConstant(
+                    self.create_recipes, lambda: self.client.get(url), budget=3
+                )
+
+    def test_recipe_list_filtered_and_paginated(self):
+        """test filtered and keyset paginated lists"""
+        params = {
+            "tags": f"{self.tags[0].id}",
+            "ingredients": f"{self.ings[0].id}",
+            "price_max": "4",
+            "ordering": "price",
+            "page_size": 20,
+        }
+        self.assertQueriesConstant(
+            self.create_recipes,
+            lambda: self.client.get(RECIPES_URL, params),
+            budget=3,
+        )
+
+    def test_recipe_similar_and_pantry(self):
+        """test similar and pantry do not grow with the number of recipes"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.first()
+
+        def similar():
+            # measure the index build as well
+            similarity_index.invalidate()
+            return self.client.get(recipe_url(recipe.id, "similar/"))
+
+        self.assertQueriesConstant(self.create_recipes, similar, budget=6)
+        self.assertQueriesConstant(
+            self.create_recipes,
+            lambda: self.client.get(
+                reverse("recipe:recipe-pantry"),
+                {"ingredients": f"{self.ings[0].id},{self.ings[1].id}"},
+            ),
+            budget=3,
+        )
+
+    def test_recipe_detail(self):
+        """test retrieve, update and delete budgets on both route families"""
+        self.create_recipes(2)
+        first, second = Recipe.objects.all()
+        fbv_url = reverse("recipe:recipe-detail", args=[first.id])
+        for url in (recipe_url(first.id), fbv_url):
+            with self.subTest(url=url):
+                self.assertQueryBudget(3, lambda: self.client.get(url))
+                # updates lock the recipe in a transaction, a savepoint and
+                # its release inside the test case
+                self.assertQueryBudget(
+                    6, lambda: self.client.patch(url, {"title": "new title"})
+                )
+                # new ingredient names are looked up again after the insert
+                # that skips the names added concurrently, then the user's
+                # aliases of them are added
+                self.assertQueryBudget(
+                    18, lambda: self.client.put(url, RECIPE_PAYLOAD, format="json")
+                )
+        self.assertQueryBudget(5, lambda: self.client.delete(recipe_url(first.id)))
+        self.assertQueryBudget(
+            5,
+            lambda: self.client.delete(
+                reverse("recipe:recipe-detail", args=[second.id])
+            ),
+        )
+
+    def test_recipe_create(self):
+        """test creating a recipe with nested tags and ingredients"""
+        for url in (RECIPES_URL, reverse("recipe:recipe-list")):
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    13, lambda: self.client.post(url, RECIPE_PAYLOAD, format="json")
+                )
+
+    def test_recipe_create_nested_items(self):
+        """test nested tags and ingredients are written in bulk"""
+        payload = {**RECIPE_PAYLOAD, "tags": [], "ingredients": []}
+
+        def add_nested(count):
+            for _ in range(count):
+                n = len(payload["tags"])
+                payload["tags"].append({"name": f"nested tag {n}"})
+                payload["ingredients"].append({"name": f"nested ing {n}"})
+
+        self.assertQueriesConstant(
+            add_nested,
+            lambda: self.client.post(RECIPES_URL, payload, format="json"),
+            budget=13,
+        )
+
+    def test_recipe_upload_image(self):
+        """test uploading an image to a recipe"""
+        self.create_recipes(1)
+        recipe = Recipe.objects.first()
+        fbv_url = reverse("recipe:recipe-upload-image", args=[recipe.id])
+        for url in (recipe_url(recipe.id, "upload-image/"), fbv_url):
+            with self.subTest(url=url):
+                # the recipe is locked in a transaction
+                self.assertQueryBudget(
+                    4,
+                    lambda: self.client.post(url, image_payload(), format="multipart"),
+                )
+                recipe.refresh_from_db()
+                recipe.image.delete()
+
+
+class TagIngredientQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """test tag and ingredient endpoints stay within their query budgets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def create_tags(self, count):
+        offset = Tag.objects.count()
+        Tag.objects.bulk_create(
+            [Tag(user=self.user, name=f"tag {offset + i}") for i in range(count)]
+        )
+
+    def create_ingredients(self, count):
+        offset = Ingredient.objects.count()
+        ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(name=f"ing {offset + i}") for i in range(count)]
+        )
+        IngredientAlias.objects.bulk_create(
+            [
+                IngredientAlias(user=self.user, ingredient=ing, name=ing.name)
+                for ing in ingredients
+            ]
+        )
+
+    def test_lists(self):
+        """test tag and ingredient lists do not grow with the number of rows"""
+        cases = (
+            (TAGS_URL, self.create_tags, Tag),
+            (reverse("recipe:tag-list"), self.create_tags, Tag),
+            (INGREDIENTS_URL, self.create_ingredients, Ingredient),
+            (reverse("recipe:ingredient-list"), self.create_ingredients, Ingredient),
+        )
+        for url, create_rows, model in cases:
+            with self.subTest(url=url):
+                model.objects.all().delete()
+                self.assertQueriesConstant(
+                    create_rows,
+                    lambda: self.client.get(url, {"assigned_only": 0}),
+                    budget=1,
+                )
+
+    def test_details_and_writes(self):
+        """test create, retrieve, update and delete budgets"""
+        # budgets of (create, update, delete): a new ingredient adds the
+        # catalog row in a savepoint and the user's alias of it, renames
+        # check the user's other aliases, deletes drop the user's lines of
+        # it in a transaction
+        cases = (
+            (TAGS_URL, reverse("recipe:tag-list"), "recipe:tag-detail", (1, 4, 3)),
+            (
+                INGREDIENTS_URL,
+                reverse("recipe:ingredient-list"),
+                "recipe:ingredient-detail",
+                (6, 5, 5),
+            ),
+        )
+        for viewset_url, fbv_url, detail_name, budgets in cases:
+            create, update, delete = budgets
+            for list_url in (viewset_url, fbv_url):
+                with self.subTest(url=list_url):
+                    res = self.assertQueryBudget(
+                        create,
+                        lambda: self.client.post(list_url, {"name": "new item"}),
+                    )
+                    obj_id = res.data["id"]
+                    if list_url == viewset_url:
+                        url = f"{viewset_url}{obj_id}/"
+                    else:
+                        url = reverse(detail_name, args=[obj_id])
+                    self.assertQueryBudget(1, lambda: self.client.get(url))
+                    # 2 for the transaction of the update
+                    self.assertQueryBudget(
+                        update, lambda: self.client.patch(url, {"name": "renamed"})
+                    )
+                    self.assertQueryBudget(delete, lambda: self.client.delete(url))
@@ -8,12 +8,14 @@ from PIL import Image
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, RecipeIngredient, Tag, Ingredient, IngredientAlias
 
 from recipe.serializers import (
     RecipeSerializer,
@@ -32,6 +34,11 @@ def image_upload_url(recipe_id):
     """Create and return an image detail url"""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
+def pantry_url():
+    """Create and return the pantry matching url"""
+    return reverse("recipe:recipe-pantry")
+
+
 def create_recipe(user, **params):
     """Create and return a simple recipe"""
     defaults = {
@@ -46,6 +53,11 @@ def create_recipe(user, **params):
     return recipe
 
 
+def create_ingredient(user, name, **values):
+    """Add an ingredient of user and return its catalog row"""
+    return IngredientAlias.objects.add(user, name, **values).ingredient
+
+
 def create_user(**params):
     """Create and return a new user"""
     return get_user_model().objects.create_user(**params)
@@ -336,13 +348,13 @@ class PrivateRecipeAPITest(TestCase):
 
         for ingredient in paylaod["ingredients"]:
             exists = recipe.ingredients.filter(
-                user=self.user, name=ingredient["name"]
+                aliases__user=self.user, aliases__name=ingredient["name"]
             ).exists()
             self.assertTrue(exists)
 
     def test_create_recipe_with_existing_ingredient(self):
         """test create a new recipe with existing ingredient"""
-        ing = Ingredient.objects.create(name="test ing", user=self.user)
+        ing = create_ingredient(self.user, "test ing")
         payload = {
             "title": "test recipe",
             "price": Decimal("2.12"),
@@ -363,7 +375,7 @@ class PrivateRecipeAPITest(TestCase):
 
         for ingredient in payload["ingredients"]:
             exists = recipe.ingredients.filter(
-                user=self.user, name=ingredient["name"]
+                aliases__user=self.user, aliases__name=ingredient["name"]
             ).exists()
 
             self.assertTrue(exists)
@@ -390,18 +402,18 @@ class PrivateRecipeAPITest(TestCase):
         res = self.client.patch(url, payload, format="json")
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        ing = Ingredient.objects.get(name="test ing", user=self.user)
+        ing = IngredientAlias.objects.get(name="test ing", user=self.user).ingredient
         self.assertIn(ing, recipe.ingredients.all())
 
     def test_update_recipe_assign_ingredient(self):
         """test assigning an existing ingredient when updating a recipe with new ingredient"""
 
-        ingredient1 = Ingredient.objects.create(user=self.user, name="test ing1")
+        ingredient1 = create_ingredient(self.user, "test ing1")
 
         recipe = create_recipe(user=self.user)
         recipe.ingredients.add(ingredient1)
 
-        ingredient2 = Ingredient.objects.create(user=self.user, name="test ing2")
+        ingredient2 = create_ingredient(self.user, "test ing2")
 
         payload = {"ingredients": [{"name": "test ing2"}]}
         url = detail_url(recipe.id)
@@ -413,7 +425,7 @@ class PrivateRecipeAPITest(TestCase):
 
     def test_clear_recipe_ingredient(self):
         """test clearing a recipe ingredients"""
-        ingredient = Ingredient.objects.create(user=self.user, name="test ing")
+        ingredient = create_ingredient(self.user, "test ing")
 
         recipe = create_recipe(user=self.user)
         recipe.ingredients.add(ingredient)
@@ -429,8 +441,8 @@ class PrivateRecipeAPITest(TestCase):
         """test add ingredient to recipe, this ingredient created by another auth user"""
 
         another_user = create_user(email="otheruser@example.com", password="pass123@")
-        another_user_ingredient = Ingredient.objects.create(
-            user=another_user, name="another user ing"
+        another_user_ingredient = create_ingredient(
+            another_user, "another user ing"
         )
         
         auth_user_recipe = create_recipe(user=self.user)
@@ -448,7 +460,117 @@ class PrivateRecipeAPITest(TestCase):
         self.assertEqual(ing, another_user_ingredient)
         
         self.assertIn(another_user_ingredient, auth_user_recipe.ingredients.all())
+        self.assertEqual(IngredientAlias.objects.filter(ingredient=ing).count(), 2)
     
+    def test_create_recipe_with_ingredient_lines(self):
+        """test ingredient lines keep their quantity, unit and order"""
+        create_ingredient(self.user, "flour")
+        payload = {
+            "title": "bread",
+            "price": Decimal("3.50"),
+            "time_minutes": 90,
+            "ingredient_lines": [
+                {"name": "water", "quantity": "0.325", "unit": "l"},
+                {"name": "flour", "quantity": "500", "unit": "g"},
+                {"name": "salt"},
+            ],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        lines = list(recipe.ingredient_links.select_related("ingredient"))
+        self.assertEqual(
+            [(line.ingredient.name, line.position) for line in lines],
+            [("water", 0), ("flour", 1), ("salt", 2)],
+        )
+        self.assertEqual(lines[0].quantity, Decimal("0.325"))
+        self.assertEqual(lines[1].unit, "g")
+        self.assertIsNone(lines[2].quantity)
+        self.assertEqual(
+            [ing["name"] for ing in res.data["ingredients"]],
+            ["water", "flour", "salt"],
+        )
+        self.assertEqual(res.data["ingredient_lines"][1]["quantity"], "500.000")
+
+    def test_update_ingredient_lines_reorders(self):
+        """test replacing the ingredient lines of a recipe"""
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(
+            create_ingredient(self.user, "sugar"),
+            create_ingredient(self.user, "butter"),
+        )
+        payload = {
+            "ingredient_lines": [
+                {"name": "butter", "quantity": "2", "unit": "tbsp"},
+                {"name": "sugar", "quantity": "100", "unit": "g"},
+            ]
+        }
+        res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(line["name"], line["position"]) for line in res.data["ingredient_lines"]],
+            [("butter", 0), ("sugar", 1)],
+        )
+        self.assertEqual(RecipeIngredient.objects.filter(recipe=recipe).count(), 2)
+
+    def test_create_recipe_reuses_catalog_ingredient(self):
+        """test names differing in case and spaces resolve to one ingredient"""
+        other_user = create_user(email="otheruser@example.com", password="pass123@")
+        salt = create_ingredient(other_user, "Sea Salt")
+        payload = {
+            "title": "fries",
+            "price": Decimal("2.00"),
+            "time_minutes": 20,
+            "ingredients": [{"name": "sea  salt"}, {"name": "SEA SALT"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(list(recipe.ingredients.all()), [salt])
+        # the user gets an alias named as they sent it, the owner keeps theirs
+        self.assertEqual(res.data["ingredients"][0]["name"], "sea  salt")
+        self.assertEqual(
+            sorted(IngredientAlias.objects.values_list("user__email", "name")),
+            [
+                ("example@example.com", "sea  salt"),
+                ("otheruser@example.com", "Sea Salt"),
+            ],
+        )
+
+    def test_known_aliases_not_inserted_again(self):
+        """test names the user got an alias of resolve without another insert"""
+        payload = {
+            "title": "fries",
+            "price": Decimal("2.00"),
+            "time_minutes": 20,
+            "ingredients": [{"name": "salt"}, {"name": "oil"}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, payload, format="json")
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        inserts = [q for q in queries if '"core_ingredientalias" (' in q["sql"]]
+        self.assertEqual(inserts, [])
+        self.assertEqual(IngredientAlias.objects.filter(user=self.user).count(), 2)
+
+    def test_ingredients_and_lines_are_exclusive(self):
+        """test sending both ingredients and ingredient lines is rejected"""
+        recipe = create_recipe(user=self.user)
+        payload = {
+            "ingredients": [{"name": "sugar"}],
+            "ingredient_lines": [{"name": "salt"}],
+        }
+        res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_filter_by_tag(self):
         """test filter recipes by tag"""
         recipe1 = create_recipe(user=self.user, title="recipe one")
@@ -478,8 +600,8 @@ class PrivateRecipeAPITest(TestCase):
         recipe1 = create_recipe(user=self.user, title="recipe one")
         recipe2 = create_recipe(user=self.user, title="recipe two")
         
-        ing1 = Ingredient.objects.create(user=self.user, name="ingredient one")
-        ing2 = Ingredient.objects.create(user=self.user, name="ingredient two")
+        ing1 = create_ingredient(self.user, "ingredient one")
+        ing2 = create_ingredient(self.user, "ingredient two")
         
         recipe1.ingredients.add(ing1)
         recipe2.ingredients.add(ing2)
@@ -497,6 +619,119 @@ class PrivateRecipeAPITest(TestCase):
         self.assertIn(ser2.data, res.data)
         self.assertNotIn(ser3.data, res.data)
 
+    def test_filter_by_price_and_time_range(self):
+        """test filter recipes by price range and max time"""
+        cheap_fast = create_recipe(
+            user=self.user, price=Decimal("5.00"), time_minutes=20
+        )
+        create_recipe(user=self.user, price=Decimal("5.00"), time_minutes=45)
+        create_recipe(user=self.user, price=Decimal("15.00"), time_minutes=10)
+        create_recipe(user=self.user, price=Decimal("1.00"), time_minutes=10)
+
+        params = {"price_min": "2", "price_max": "10", "time_max": 30}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [RecipeSerializer(cheap_fast).data])
+
+    def test_order_by_price(self):
+        """test ordering recipes cheapest first with id as tiebreak"""
+        r1 = create_recipe(user=self.user, price=Decimal("9.00"))
+        r2 = create_recipe(user=self.user, price=Decimal("3.00"))
+        r3 = create_recipe(user=self.user, price=Decimal("9.00"))
+
+        res = self.client.get(RECIPES_URL, {"ordering": "price"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [r2.id, r1.id, r3.id])
+
+    def test_invalid_filter_params_return_error(self):
+        """test unknown ordering fields and bad ranges are rejected"""
+        for params in (
+            {"ordering": "title"},
+            {"price_min": "abc"},
+            {"price_min": "10", "price_max": "2"},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination_on_each_ordering(self):
+        """test paging through every sort order returns each recipe once"""
+        for i in range(7):
+            create_recipe(
+                user=self.user, price=Decimal(i % 3), time_minutes=10 + i % 2
+            )
+
+        for ordering in ("-id", "price", "-price", "time_minutes", "-time_minutes"):
+            expected = RecipeSerializer(
+                Recipe.objects.order_by(ordering, "-id" if ordering[0] == "-" else "id"),
+                many=True,
+            ).data
+            params = {"ordering": ordering, "page_size": 3}
+            res = self.client.get(RECIPES_URL, params)
+            seen = []
+            while True:
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                seen.extend(res.data["results"])
+                if not res.data["next"]:
+                    break
+                res = self.client.get(res.data["next"])
+
+            self.assertEqual(seen, expected)
+
+
+class PantryRecipeApiTest(TestCase):
+    """test matching recipes against the ingredients on hand"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="pantry@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        self.ings = [
+            create_ingredient(self.user, f"ingredient {i}")
+            for i in range(4)
+        ]
+
+    def test_recipes_ranked_by_missing_ingredients(self):
+        """test fully covered recipes come first and uncovered are dropped"""
+        full = create_recipe(user=self.user, title="full")
+        full.ingredients.add(self.ings[0], self.ings[1])
+        mostly = create_recipe(user=self.user, title="mostly")
+        mostly.ingredients.add(*self.ings[:3])
+        barely = create_recipe(user=self.user, title="barely")
+        barely.ingredients.add(self.ings[0], self.ings[2], self.ings[3])
+        none = create_recipe(user=self.user, title="none")
+        none.ingredients.add(self.ings[3])
+
+        params = {"ingredients": f"{self.ings[0].id},{self.ings[1].id}"}
+        res = self.client.get(pantry_url(), params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [full.id, mostly.id])
+        self.assertEqual(res.data[0]["coverage"], 1.0)
+        self.assertEqual(res.data[1]["missing_ingredients"], 1)
+
+        params["min_coverage"] = 0
+        res = self.client.get(pantry_url(), params)
+        self.assertEqual([r["id"] for r in res.data], [full.id, mostly.id, barely.id])
+
+    def test_pantry_limited_to_user(self):
+        """test other users recipes are not matched"""
+        other = create_user(email="other@example.com", password="test123")
+        recipe = create_recipe(user=other)
+        recipe.ingredients.add(self.ings[0])
+
+        res = self.client.get(pantry_url(), {"ingredients": str(self.ings[0].id)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_pantry_requires_valid_ingredients(self):
+        """test missing or invalid ingredient ids are rejected"""
+        for params in ({}, {"ingredients": "1,abc"}):
+            res = self.client.get(pantry_url(), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """test upload recipe image"""
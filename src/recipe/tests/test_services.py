@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, IngredientAlias, Recipe, Tag
+
+from recipe import services
+
+
+def create_user(email="test@example.com", password="test123"):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """create and return a simple recipe"""
+    defaults = {"title": "test recipe", "price": Decimal("4.21"), "time_minutes": 15}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ServicesTest(TestCase):
+    """test the querysets shared by the viewsets and function views"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email="other@example.com")
+
+    def test_recipes_scoped_and_filtered(self):
+        """test only the user's recipes matching the params are returned"""
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        cheap = create_recipe(self.user, title="cheap", price=Decimal("2.00"))
+        cheap.tags.add(tag)
+        create_recipe(self.user, title="dear", price=Decimal("20.00")).tags.add(tag)
+        create_recipe(self.user, title="untagged", price=Decimal("1.00"))
+        create_recipe(self.other, title="foreign", price=Decimal("1.00"))
+
+        params = QueryDict(f"tags={tag.id}&price_max=5")
+        recipes = services.recipes(self.user, params, services.LIST)
+
+        self.assertEqual(list(recipes), [cheap])
+
+    def test_viewset_and_function_view_agree(self):
+        """test both routes list the same recipes for the same params"""
+        for i in range(3):
+            create_recipe(self.user, title=f"r{i}", time_minutes=10 * i)
+        create_recipe(self.other)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        params = {"time_max": 15, "ordering": "-time_minutes"}
+        viewset = client.get("/api/recipe/recipes/", params)
+        function_view = client.get("/api/recipe/fbv/recipes/", params)
+
+        self.assertEqual(viewset.json(), function_view.json())
+        self.assertEqual([r["title"] for r in viewset.json()], ["r1", "r0"])
+
+    def test_ingredients_are_the_users_aliases(self):
+        """test only the user's aliases are listed, used ones with assigned_only"""
+        salt = IngredientAlias.objects.add(self.user, "salt")
+        pepper = IngredientAlias.objects.add(self.user, "pepper")
+        IngredientAlias.objects.add(self.other, "salt")
+        create_recipe(self.other).ingredients.add(salt.ingredient)
+        create_recipe(self.user).ingredients.add(pepper.ingredient)
+
+        self.assertEqual(list(services.ingredients(self.user, {})), [salt, pepper])
+        self.assertEqual(
+            list(services.ingredients(self.user, {"assigned_only": "1"})), [pepper]
+        )
+
+    def test_delete_ingredient_keeps_it_for_others(self):
+        """test deleting an ingredient removes the user's alias and lines"""
+        mine = IngredientAlias.objects.add(self.user, "pepper", unit_cost=1)
+        IngredientAlias.objects.add(self.other, "pepper")
+        recipe = create_recipe(self.user)
+        other_recipe = create_recipe(self.other)
+        recipe.ingredients.add(mine.ingredient)
+        other_recipe.ingredients.add(mine.ingredient)
+
+        services.delete_ingredient(mine)
+
+        self.assertTrue(Ingredient.objects.filter(pk=mine.ingredient_id).exists())
+        self.assertEqual(IngredientAlias.objects.get().user, self.other)
+        self.assertFalse(recipe.ingredients.exists())
+        self.assertTrue(other_recipe.ingredients.exists())
+
+
+class OwnerScopedLookupTest(TestCase):
+    """test detail routes only find the rows of the user"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email="other@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_other_users_rows_not_found(self):
+        """test reading or changing another user's rows gives 404"""
+        recipe = create_recipe(self.other, title="foreign")
+        tag = Tag.objects.create(user=self.other, name="foreign")
+        ingredient = IngredientAlias.objects.add(self.other, "foreign").ingredient
+        urls = (
+            f"/api/recipe/fbv/recipes/{recipe.id}/",
+            f"/api/recipe/recipes/{recipe.id}/",
+            f"/api/recipe/fbv/tag/{tag.id}/",
+            f"/api/recipe/tags/{tag.id}/",
+            f"/api/recipe/fbv/ingredients/{ingredient.id}/",
+            f"/api/recipe/ingredients/{ingredient.id}/",
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                for method in ("get", "patch", "put", "delete"):
+                    res = getattr(self.client, method)(url, {"name": "x"})
+                    self.assertEqual(res.status_code, 404, method)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "foreign")
+        self.assertTrue(Tag.objects.filter(pk=tag.pk).exists())
+        self.assertTrue(Ingredient.objects.filter(pk=ingredient.pk).exists())
+
+    def test_catalog_ingredient_read_only(self):
+        """test changing a shared ingredient only changes the user's alias"""
+        theirs = IngredientAlias.objects.add(self.other, "pepper", calories=1)
+        IngredientAlias.objects.add(self.user, "pepper")
+        url = f"/api/recipe/fbv/ingredients/{theirs.ingredient_id}/"
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+        res = self.client.patch(url, {"name": "black pepper", "calories": 2})
+
+        self.assertEqual(res.status_code, 200)
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.name, theirs.calories), ("pepper", 1))
+        self.assertEqual(theirs.ingredient.name, "pepper")
+
+    def test_function_view_put_ingredient(self):
+        """test PUT replaces an ingredient of the user"""
+        alias = IngredientAlias.objects.add(self.user, "salt")
+
+        res = self.client.put(
+            f"/api/recipe/fbv/ingredients/{alias.ingredient_id}/", {"name": "sea salt"}
+        )
+
+        self.assertEqual(res.status_code, 200)
+        alias.refresh_from_db()
+        self.assertEqual(alias.name, "sea salt")
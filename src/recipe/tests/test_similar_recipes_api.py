@@ -0,0 +1,121 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, IngredientAlias
+
+from recipe.similarity import index as similarity_index
+
+
+def similar_url(recipe_id):
+    """create and return the similar recipes url"""
+    return reverse("recipe:recipe-similar", args=[recipe_id])
+
+
+def create_user(email="test@example.com", password="test123"):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """create and return a simple recipe"""
+    defaults = {"title": "test recipe", "price": Decimal("4.21"), "time_minutes": 15}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class SimilarRecipesApiTest(TestCase):
+    """test ranking recipes by shared ingredients and tags"""
+
+    def setUp(self):
+        similarity_index.invalidate()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+        self.ings = [
+            IngredientAlias.objects.add(self.user, f"ing {i}").ingredient
+            for i in range(4)
+        ]
+        self.tag = Tag.objects.create(user=self.user, name="dinner")
+
+    def test_similar_recipes_ranked_by_overlap(self):
+        """test recipes sharing more ingredients and tags rank first"""
+        base = create_recipe(self.user, title="base")
+        base.ingredients.add(*self.ings[:3])
+        base.tags.add(self.tag)
+
+        close = create_recipe(self.user, title="close")
+        close.ingredients.add(*self.ings[:3])
+        close.tags.add(self.tag)
+
+        far = create_recipe(self.user, title="far")
+        far.ingredients.add(self.ings[0], self.ings[3])
+
+        unrelated = create_recipe(self.user, title="unrelated")
+        unrelated.ingredients.add(self.ings[3])
+
+        res = self.client.get(similar_url(base.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [close.id, far.id])
+        self.assertEqual(res.data[0]["similarity"], 1.0)
+        self.assertLess(res.data[1]["similarity"], res.data[0]["similarity"])
+
+    def test_index_follows_m2m_changes(self):
+        """test the index is updated incrementally after it was built"""
+        base = create_recipe(self.user, title="base")
+        base.ingredients.add(self.ings[0])
+        other = create_recipe(self.user, title="other")
+
+        res = self.client.get(similar_url(base.id))
+        self.assertEqual(res.data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.ingredients.add(self.ings[0])
+        res = self.client.get(similar_url(base.id))
+        self.assertEqual([r["id"] for r in res.data], [other.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.ingredients.clear()
+        res = self.client.get(similar_url(base.id))
+        self.assertEqual(res.data, [])
+
+    def test_index_ignores_rolled_back_changes(self):
+        """test m2m changes reach the index only when they are committed"""
+        base = create_recipe(self.user, title="base")
+        base.ingredients.add(self.ings[0])
+        other = create_recipe(self.user, title="other")
+        self.client.get(similar_url(base.id))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    other.ingredients.add(self.ings[0])
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        res = self.client.get(similar_url(base.id))
+        self.assertEqual(res.data, [])
+
+    def test_similar_limited_to_user(self):
+        """test other users recipes are never returned or ranked"""
+        other_user = create_user(email="other@example.com")
+        base = create_recipe(self.user)
+        base.ingredients.add(self.ings[0])
+        foreign = create_recipe(other_user)
+        foreign.ingredients.add(self.ings[0])
+
+        res = self.client.get(similar_url(base.id))
+        self.assertEqual(res.data, [])
+
+        res = self.client.get(similar_url(foreign.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,12 +1,12 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import (
     api_view,
     permission_classes,
     authentication_classes,
+    throttle_classes,
     action,
 )
 
@@ -19,8 +19,64 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
-from core.models import Recipe, Tag, Ingredient
-from . import serializers
+from core import idempotency
+from core.authentication import ExpiringTokenAuthentication
+from core.throttling import UploadThrottle
+from core.models import IngredientAlias, Recipe, Tag
+from . import serializers, services
+from .pagination import RecipeCursorPagination
+
+
+RECIPE_RANGE_PARAMETERS = [
+    OpenApiParameter(
+        "price_min", OpenApiTypes.DECIMAL, description="minimum recipe price"
+    ),
+    OpenApiParameter(
+        "price_max", OpenApiTypes.DECIMAL, description="maximum recipe price"
+    ),
+    OpenApiParameter(
+        "time_max", OpenApiTypes.INT, description="maximum preparation time in minutes"
+    ),
+    OpenApiParameter(
+        "ordering",
+        OpenApiTypes.STR,
+        enum=serializers.RecipeFilterSerializer().fields["ordering"].choices,
+        description="sort field, prefix with '-' for descending order",
+    ),
+    OpenApiParameter(
+        "page_size",
+        OpenApiTypes.INT,
+        description="enable keyset pagination with this many recipes per page",
+    ),
+]
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    idempotency.HEADER,
+    OpenApiTypes.STR,
+    OpenApiParameter.HEADER,
+    description="unique key of the request, a retry with the same key "
+    "returns the stored response instead of creating another recipe",
+)
+
+# ingredient routes take the id of the catalog ingredient, not of the alias
+INGREDIENT_ID_PARAMETER = OpenApiParameter(
+    "id",
+    OpenApiTypes.INT,
+    OpenApiParameter.PATH,
+    description="id of the catalog ingredient",
+)
+INGREDIENT_DETAIL_SCHEMA = extend_schema(parameters=[INGREDIENT_ID_PARAMETER])
+
+
+class AtomicUpdateMixin:
+    """
+    run updates in a transaction, the object locked by the queryset of the
+    action (see services.LOCKING_ACTIONS) stays locked until it is saved
+    """
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
 
 @extend_schema_view(
@@ -36,37 +92,54 @@ from . import serializers
                 OpenApiTypes.STR,
                 description="comma separated list of ingredients ids to filter",
             ),
+            *RECIPE_RANGE_PARAMETERS,
         ],
-    )
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description="number of similar recipes to return (max 50)",
+            )
+        ]
+    ),
+    create=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    pantry=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "ingredients",
+                OpenApiTypes.STR,
+                required=True,
+                description="comma separated list of ingredients ids on hand",
+            ),
+            OpenApiParameter(
+                "min_coverage",
+                OpenApiTypes.FLOAT,
+                description="minimum share of a recipe's ingredients on hand (0-1)",
+            ),
+            OpenApiParameter(
+                "limit", OpenApiTypes.INT, description="max recipes to return"
+            ),
+        ]
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AtomicUpdateMixin, viewsets.ModelViewSet):
     """View for manage recipe api"""
 
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
-
-    def _params_to_ints(self, qs):
-        """convert a list of strings to integers"""
-        return [int(str_id) for str_id in qs.split(",")]
+    authentication_classes = [ExpiringTokenAuthentication]
+    pagination_class = RecipeCursorPagination
 
     def get_queryset(self):
         """Retrive recipes for authenticated user"""
-        # return self.queryset.filter(user=self.request.user).order_by("-id")
-
-        tags = self.request.query_params.get("tags")
-        ingredients = self.request.query_params.get("ingredients")
-        queryset = self.queryset
-
-        if tags:
-            tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
-        if ingredients:
-            ingredients_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredients_ids)
-
-        return queryset.filter(user=self.request.user).order_by("-id").distinct()
+        if self.detail:
+            return services.recipe_queryset(self.request.user, self.action)
+        return services.recipes(
+            self.request.user, self.request.query_params, self.action
+        )
 
     def get_serializer_class(self):
         """return a serializer class request.
@@ -77,22 +150,66 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        elif self.action == "similar":
+            return serializers.SimilarRecipeSerializer
+        elif self.action == "pantry":
+            return serializers.PantryRecipeSerializer
         return self.serializer_class
 
+    # no docstring, it would replace the operation description in the schema
+    def create(self, request, *args, **kwargs):
+        create = super().create
+        return idempotency.run(request, lambda: create(request, *args, **kwargs))
+
     def perform_create(self, serializer):
         """Create new recipe"""
         serializer.save(user=self.request.user)
 
-    @action(methods=["POST"], detail=True, url_path="upload-image")
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="upload-image",
+        throttle_classes=[UploadThrottle],
+    )
+    @transaction.atomic
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            services.save_image(serializer)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=["GET"], detail=True)
+    def similar(self, request, pk=None):
+        """List the user's recipes sharing the most ingredients and tags."""
+        recipe = self.get_object()
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            limit = 10
+
+        results = services.similar_recipes(recipe, request.user, limit)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False)
+    def pantry(self, request):
+        """List recipes that can be cooked with the ingredients on hand,
+        fewest missing ingredients first."""
+        params = serializers.PantryQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        recipes = services.pantry_recipes(
+            request.user,
+            params.validated_data["ingredients"],
+            params.validated_data["min_coverage"],
+            params.validated_data["limit"],
+        )
+
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -107,6 +224,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
 )
 class TagViewSet(
+    AtomicUpdateMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
     mixins.RetrieveModelMixin,
@@ -118,16 +236,13 @@ class TagViewSet(
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [ExpiringTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = self.queryset.filter(user=self.request.user)
-        assigned_only = bool(int(self.request.query_params.get("assigned_only")))
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        queryset = queryset.order_by("-name").distinct()
-        return queryset
+        if self.detail:
+            return services.tag_queryset(self.request.user, self.action)
+        return services.tags(self.request.user, self.request.query_params)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -143,48 +258,37 @@ class TagViewSet(
                 description="Filter by items assigned to recipes.",
             )
         ]
-    )
+    ),
+    retrieve=INGREDIENT_DETAIL_SCHEMA,
+    update=INGREDIENT_DETAIL_SCHEMA,
+    partial_update=INGREDIENT_DETAIL_SCHEMA,
+    destroy=INGREDIENT_DETAIL_SCHEMA,
 )
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(AtomicUpdateMixin, viewsets.ModelViewSet):
     """view for manage ingredient api"""
 
-    queryset = Ingredient.objects.all()
-    serializer_class = serializers.IngredientSerializer
-    authentication_classes = [TokenAuthentication]
+    queryset = IngredientAlias.objects.all()
+    serializer_class = serializers.IngredientDetailSerializer
+    authentication_classes = [ExpiringTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    # the user's aliases are found by the id of their catalog ingredient
+    lookup_field = "ingredient_id"
+    lookup_url_kwarg = "pk"
 
     def get_queryset(self):
         """filter queryset to authenticate user"""
-        # qs = self.queryset.filter(user=self.request.user).order_by("-name")
-        assigned_only = bool(int(self.request.query_params.get("assigned_only", 0)))
-        queryset = self.queryset.filter(user=self.request.user)
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        queryset = queryset.order_by("-name").distinct()
-        return queryset
+        if self.detail:
+            return services.ingredient_queryset(self.request.user, self.action)
+        return services.ingredients(self.request.user, self.request.query_params)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-
-# -------------------------- FBV ---------------------------------------
-# ----------------start help functions---------------------
-def params_to_ints(qs):
-    """convert string params to integer type"""
-    return [int(str_id) for str_id in qs.split(",")]
-
-
-def get_queryset(request, Klass):
-    """filter queryset to authenticate user"""
-    queryset = Klass.objects.filter(user=request.user)
-    assigned_only = bool(int(request.query_params.get("assigned_only", 0)))
-    if assigned_only:
-        queryset = queryset.filter(recipe__isnull=False)
-    queryset = queryset.order_by("-name").distinct()
-    return queryset
+    def perform_destroy(self, instance):
+        services.delete_ingredient(instance)
 
 
-# ------------------ end help functions -------------------
+# -------------------------- FBV ---------------------------------------
 
 
 @extend_schema(
@@ -201,42 +305,48 @@ def get_queryset(request, Klass):
             OpenApiTypes.STR,
             description="comma separated list of ingredients ids to filter",
         ),
+        *RECIPE_RANGE_PARAMETERS,
     ],
     methods=["GET"],
 )
+@extend_schema(
+    request=serializers.RecipeDetailSerializer,
+    responses=None,
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
+    methods=["POST"],
+)
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([ExpiringTokenAuthentication])
 def recipe_view(request):
     """A view to list recipes"""
     if request.method == "GET":
-        user = request.user
-        # recipes = Recipe.objects.filter(user=user).order_by("-id")
-        recipes = Recipe.objects.all()
-        tags = request.query_params.get("tags")
-        ingredients = request.query_params.get("ingredients")
-        if tags:
-            tags_ids = params_to_ints(tags)
-            recipes = recipes.filter(tags__id__in=tags_ids)
-        if ingredients:
-            ingredients_ids = params_to_ints(ingredients)
-            recipes = recipes.filter(ingredients__id__in=ingredients_ids)
-
-        recipes = recipes.filter(user=user).order_by("-id").distinct()
-        # print(recipes)
+        recipes = services.recipes(request.user, request.query_params, services.LIST)
+        paginator = RecipeCursorPagination()
+        page = paginator.paginate_queryset(recipes, request)
+        if page is not None:
+            ser = serializers.RecipeSerializer(
+                page, many=True, context={"request": request}
+            )
+            return paginator.get_paginated_response(ser.data)
+
         ser = serializers.RecipeSerializer(
             recipes, many=True, context={"request": request}
         )
         return Response(ser.data, status=status.HTTP_200_OK)
 
     elif request.method == "POST":
-        ser = serializers.RecipeDetailSerializer(
-            data=request.data, context={"request": request}
-        )
-        if ser.is_valid(raise_exception=True):
-            ser.save(user=request.user)
-            return Response(ser.data, status=status.HTTP_201_CREATED)
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        def create():
+            ser = serializers.RecipeDetailSerializer(
+                data=request.data, context={"request": request}
+            )
+            if ser.is_valid(raise_exception=True):
+                ser.save(user=request.user)
+                return Response(ser.data, status=status.HTTP_201_CREATED)
+            return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return idempotency.run(request, create)
 
     return Response(
         {"error": "In-valid method"}, status=status.HTTP_405_METHOD_NOT_ALLOWED
@@ -244,16 +354,20 @@ def recipe_view(request):
 
 
 @extend_schema(request=serializers.RecipeImageSerializer, responses=None)
-@authentication_classes([TokenAuthentication])
-@permission_classes([IsAuthenticated])
 @api_view(["POST"])
+@authentication_classes([ExpiringTokenAuthentication])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UploadThrottle])
+@transaction.atomic
 def recipe_image_view(request, recipe_id):
     """upload a recipe image view"""
-    recipe = get_object_or_404(Recipe, id=recipe_id)
+    recipe = services.get_owned(
+        services.recipe_queryset(request.user, "upload_image"), recipe_id
+    )
     if request.method == "POST":
         ser = serializers.RecipeImageSerializer(recipe, request.data)
         if ser.is_valid():
-            ser.save()
+            services.save_image(ser)
             return Response(ser.data, status=status.HTTP_200_OK)
         return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -261,45 +375,36 @@ def recipe_image_view(request, recipe_id):
 @extend_schema(request=serializers.RecipeDetailSerializer, responses=None)
 @api_view(["GET", "PATCH", "PUT", "DELETE"])
 @permission_classes([IsAuthenticated])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([ExpiringTokenAuthentication])
 def recipe_detail_view(request, recipe_id=None):
     """A view to detail recipe"""
-    data = request.data
-    try:
-        id = int(recipe_id)
-    except ValueError:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    recipe = get_object_or_404(Recipe, id=id)
-
     if request.method == "GET":
+        recipe = services.get_owned(
+            services.recipe_queryset(request.user, services.RETRIEVE), recipe_id
+        )
         ser = serializers.RecipeDetailSerializer(recipe, context={"request": request})
         return Response(ser.data, status=status.HTTP_200_OK)
 
-    if request.method == "PATCH":
-        # Don't update all data [part of data]
-        ser = serializers.RecipeDetailSerializer(
-            recipe, data=data, context={"request": request}, partial=True
-        )
-        if ser.is_valid(raise_exception=True):
-            ser.save()
-            return Response(ser.data, status=status.HTTP_200_OK)
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    if request.method == "PUT":
-        # update all data record
-        ser = serializers.RecipeDetailSerializer(
-            recipe, data=data, context={"request": request}
-        )
-        if ser.is_valid(raise_exception=True):
+    if request.method in ("PATCH", "PUT"):
+        # PATCH updates part of the data, PUT all of it
+        with transaction.atomic():
+            recipe = services.get_owned(
+                services.recipe_queryset(request.user, "update"), recipe_id
+            )
+            ser = serializers.RecipeDetailSerializer(
+                recipe,
+                data=request.data,
+                context={"request": request},
+                partial=request.method == "PATCH",
+            )
+            ser.is_valid(raise_exception=True)
             ser.save()
-            return Response(ser.data, status=status.HTTP_200_OK)
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ser.data, status=status.HTTP_200_OK)
 
     if request.method == "DELETE":
-        # update recipe
-        if recipe.user != request.user:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+        recipe = services.get_owned(
+            services.recipe_queryset(request.user), recipe_id
+        )
         recipe.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -318,12 +423,12 @@ def recipe_detail_view(request, recipe_id=None):
     ],
 )
 @api_view(["GET", "POST"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def tag_view(request):
     """vew for mange tag list api and create new tag api"""
     if request.method == "GET":
-        queryset = get_queryset(request, Tag)
+        queryset = services.tags(request.user, request.query_params)
         ser = serializers.TagSerializer(
             queryset, many=True, context={"request": request}
         )
@@ -339,42 +444,38 @@ def tag_view(request):
 
 @extend_schema(request=serializers.TagSerializer, responses=None)
 @api_view(["GET", "PATCH", "PUT", "DELETE"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def tag_detail_view(request, tag_id=None):
     """view for manage one tag"""
-    data = request.data
-    tag = get_object_or_404(Tag, id=tag_id)
-
     if request.method == "GET":
+        tag = services.get_owned(services.tag_queryset(request.user), tag_id)
         ser = serializers.TagSerializer(tag, context={"request": request})
         return Response(ser.data, status=status.HTTP_200_OK)
 
-    if request.method == "PATCH":
-        ser = serializers.TagSerializer(
-            tag, data=data, context={"request": request}, partial=True
-        )
-        if ser.is_valid(raise_exception=True):
+    if request.method in ("PATCH", "PUT"):
+        with transaction.atomic():
+            tag = services.get_owned(
+                services.tag_queryset(request.user, "update"), tag_id
+            )
+            ser = serializers.TagSerializer(
+                tag,
+                data=request.data,
+                context={"request": request},
+                partial=request.method == "PATCH",
+            )
+            ser.is_valid(raise_exception=True)
             ser.save()
-            return Response(ser.data, status=status.HTTP_200_OK)
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ser.data, status=status.HTTP_200_OK)
 
     if request.method == "DELETE":
+        tag = services.get_owned(services.tag_queryset(request.user), tag_id)
         tag.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    if request.method == "PUT":
-        ser = serializers.TagSerializer(
-            tag, data=request.data, context={"request": request}
-        )
-        if ser.is_valid(raise_exception=True):
-            ser.save()
-            return Response(ser.data, status=status.HTTP_200_OK)
-        return Response(ser.errors, status.HTTP_400_BAD_REQUEST)
-
 
 @extend_schema(
-    request=serializers.IngredientSerializer,
+    request=serializers.IngredientDetailSerializer,
     responses=None,
     methods=["GET"],
     parameters=[
@@ -387,19 +488,19 @@ def tag_detail_view(request, tag_id=None):
     ],
 )
 @api_view(["GET", "POST"])
-@authentication_classes([TokenAuthentication])
+@authentication_classes([ExpiringTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def ingredient_view(request):
     """function view for manage ingredient api ==> [list and create]"""
     if request.method == "GET":
-        queryset = get_queryset(request, Ingredient)
-        ser = serializers.IngredientSerializer(
+        queryset = services.ingredients(request.user, request.query_params)
+        ser = serializers.IngredientDetailSerializer(
             queryset, many=True, context={"request": request}
         )
         return Response(ser.data, status=status.HTTP_200_OK)
 
     if request.method == "POST":
-        ser = serializers.IngredientSerializer(
+        ser = serializers.IngredientDetailSerializer(
             data=request.data, context={"request": request}
         )
         if ser.is_valid():
@@ -408,27 +509,35 @@ def ingredient_view(request):
         return Response(ser.errors, status.HTTP_400_BAD_REQUEST)
 
 
-@extend_schema(request=serializers.IngredientSerializer, responses=None)
-@permission_classes([IsAuthenticated])
-@authentication_classes([TokenAuthentication])
+@extend_schema(request=serializers.IngredientDetailSerializer, responses=None)
 @api_view(["GET", "PATCH", "PUT", "DELETE"])
+@permission_classes([IsAuthenticated])
+@authentication_classes([ExpiringTokenAuthentication])
 def ingredient_detail_view(request, ingredient_id=None):
     """fbv for manage an ingredient ==> [retrive, update, delete]"""
-    ingredient = get_object_or_404(Ingredient, id=ingredient_id)
-
     if request.method == "GET":
-        ser = serializers.IngredientSerializer(ingredient, context={"request": request})
+        ingredient = services.get_ingredient(request.user, ingredient_id)
+        ser = serializers.IngredientDetailSerializer(
+            ingredient, context={"request": request}
+        )
         return Response(ser.data, status=status.HTTP_200_OK)
 
-    if request.method == "PATCH":
-        ser = serializers.IngredientSerializer(
-            ingredient, data=request.data, context={"request": request}, partial=True
-        )
-        if ser.is_valid():
+    if request.method in ("PATCH", "PUT"):
+        with transaction.atomic():
+            ingredient = services.get_ingredient(
+                request.user, ingredient_id, "update"
+            )
+            ser = serializers.IngredientDetailSerializer(
+                ingredient,
+                data=request.data,
+                context={"request": request},
+                partial=request.method == "PATCH",
+            )
+            ser.is_valid(raise_exception=True)
             ser.save(user=request.user)
-            return Response(ser.data, status=status.HTTP_200_OK)
-        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ser.data, status=status.HTTP_200_OK)
 
     if request.method == "DELETE":
-        ingredient.delete()
+        ingredient = services.get_ingredient(request.user, ingredient_id)
+        services.delete_ingredient(ingredient)
         return Response(status=status.HTTP_204_NO_CONTENT)
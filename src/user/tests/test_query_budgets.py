@@ -0,0 +1,42 @@
+"""
+query count budgets for the user api endpoints
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.tests.utils import QueryBudgetMixin
+
+CREATE_USER_URL = reverse("user:create")
+TOKEN_URL = reverse("user:token")
+ME_URL = reverse("user:me")
+
+USER_PAYLOAD = {"email": "budget@example.com", "password": "test123", "name": "budget"}
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """test user endpoints stay within their query budgets"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_create_user_and_token(self):
+        """test creating a user and obtaining a token"""
+        self.assertQueryBudget(
+            2, lambda: self.client.post(CREATE_USER_URL, USER_PAYLOAD)
+        )
+        credentials = {k: USER_PAYLOAD[k] for k in ("email", "password")}
+        self.assertQueryBudget(3, lambda: self.client.post(TOKEN_URL, credentials))
+        # the token is reused now
+        self.assertQueryBudget(2, lambda: self.client.post(TOKEN_URL, credentials))
+
+    def test_me(self):
+        """test retrieving and updating the authenticated user"""
+        user = get_user_model().objects.create_user(**USER_PAYLOAD)
+        self.client.force_authenticate(user)
+
+        self.assertQueryBudget(0, lambda: self.client.get(ME_URL))
+        self.assertQueryBudget(1, lambda: self.client.patch(ME_URL, {"name": "new"}))
@@ -78,6 +78,21 @@ class PublicUserAPITest(TestCase):
         self.assertIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_reused(self):
+        """test logging in again returns the still valid token"""
+        create_user(email="test@example.com", password="test123")
+        pay_load = {"email": "test@example.com", "password": "test123"}
+
+        first = self.client.post(TOKEN_URL, pay_load)
+        second = self.client.post(TOKEN_URL, pay_load)
+
+        self.assertEqual(first.data["token"], second.data["token"])
+        self.assertIn("expires", second.data)
+        res = self.client.get(
+            ME_URL, HTTP_AUTHORIZATION=f"Token {second.data['token']}"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_create_bad_token_credantails(self):
         """test return error if credantails invalid"""
         user_details = {
@@ -3,7 +3,11 @@
 from rest_framework.generics import CreateAPIView, RetrieveUpdateAPIView
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from rest_framework import authentication, permissions
+from rest_framework import permissions
+from rest_framework.response import Response
+
+from core.authentication import ExpiringTokenAuthentication
+from core.models import AuthToken
 
 from .serializers import (
     UserSerializer,
@@ -19,11 +23,18 @@ class CreateTokenView(ObtainAuthToken):
     """create a new authtoken for the user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        """return a still valid token of the user or a new one"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = AuthToken.objects.issue(serializer.validated_data["user"])
+        return Response({"token": token.key, "expires": token.expires})
     
 class ManageUserView(RetrieveUpdateAPIView):
     """Manage theauthenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [ExpiringTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):